@@ -1,13 +1,30 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
 import os
+import csv
+import math
+import base64
+import zlib
 import xlsxwriter
 import io
 import re
+import time
+import uuid
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import inspect
+try:
+    # 可选依赖：orjson解析评级详情更快，未安装时使用标准库json
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+from sqlalchemy.exc import IntegrityError
 from external_data_service import ExternalDataService
 from company_autocomplete_service import autocomplete_service
+from department_autocomplete_service import department_service
 
 app = Flask(__name__)
 
@@ -26,8 +43,8 @@ mysql_uri = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NA
 basedir = os.path.abspath(os.path.dirname(__file__))
 sqlite_uri = f'sqlite:///{os.path.join(basedir, "customer_rating.db")}'
 
-# 暂时使用SQLite数据库（MySQL服务未启动）
-app.config['SQLALCHEMY_DATABASE_URI'] = sqlite_uri
+# 暂时使用SQLite数据库（MySQL服务未启动）；设置DATABASE_URL时使用共享数据库（多副本部署必需）
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', sqlite_uri)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_pre_ping': True,
@@ -39,6 +56,14 @@ db = SQLAlchemy(app)
 
 # 数据模型
 class CustomerRating(db.Model):
+    # 复合索引对应常用查询：按是否删除筛选后按时间排序/游标分页，以及部门统计
+    # 已有数据库由版本化迁移补建（见 run_schema_migrations）
+    __table_args__ = (
+        db.Index('ix_customer_rating_deleted_created', 'is_deleted', 'created_at'),
+        db.Index('ix_customer_rating_deleted_deleted_at', 'is_deleted', 'deleted_at'),
+        db.Index('ix_customer_rating_deleted_department', 'is_deleted', 'submitter_department'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     customer_name = db.Column(db.String(200), nullable=False)
     customer_type = db.Column(db.String(50), nullable=False)
@@ -64,7 +89,11 @@ class CustomerRating(db.Model):
     deleted_at = db.Column(db.DateTime)  # 标记删除时间
     deleted_reason = db.Column(db.String(500))  # 删除原因
     
-    def to_dict(self):
+    # 资信评分子项（一对一），审批通过删除记录时一并删除
+    credit_detail = db.relationship('RatingCreditDetail', uselist=False, cascade='all, delete-orphan')
+    
+    def to_dict(self, include_details=True):
+        """转换为字典；列表接口传include_details=False，不加载也不解析rating_details"""
         result = {
             'id': self.id,
             'customer_name': self.customer_name,
@@ -80,25 +109,731 @@ class CustomerRating(db.Model):
             'profit_estimate_score': self.profit_estimate_score,
             'total_score': self.total_score,
             'grade': self.grade,
-            'rating_details': json.loads(self.rating_details) if self.rating_details else {},
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'is_deleted': self.is_deleted,
             'deleted_at': self.deleted_at.strftime('%Y-%m-%d %H:%M:%S') if self.deleted_at else None,
             'deleted_reason': self.deleted_reason
         }
+        if include_details:
+            result['rating_details'] = json_loads(self.rating_details) if self.rating_details else {}
         return result
 
+# 资信评分表各子项：前端表单字段名 -> rating_credit_detail表列名
+CREDIT_DETAIL_FIELDS = {
+    'enterpriseNature': 'enterprise_nature',
+    'registeredCapital': 'registered_capital',
+    'paidInCapital': 'paid_in_capital',
+    'isManufacturer': 'is_manufacturer',
+    'mainBusinessIncome': 'main_business_income',
+    'mainSupplier': 'main_supplier',
+    'paymentMethod': 'payment_method',
+    'accountPeriod': 'account_period',
+    'yearsEstablished': 'years_established',
+    'mortgageGuarantee': 'mortgage_guarantee',
+    'dishonestyRecord': 'dishonesty_record',
+    'penaltyRecord': 'penalty_record',
+    'paymentCredit': 'payment_credit',
+    'peerReview': 'peer_review'
+}
+
+class RatingCreditDetail(db.Model):
+    """评级记录的资信评分子项得分，由rating_details中的credit_details拆出，可直接用SQL汇总"""
+    __tablename__ = 'rating_credit_detail'
+    rating_id = db.Column(db.Integer, db.ForeignKey('customer_rating.id', ondelete='CASCADE'), primary_key=True)
+    enterprise_nature = db.Column(db.Integer)  # 企业性质
+    registered_capital = db.Column(db.Integer)  # 注册资本
+    paid_in_capital = db.Column(db.Integer)  # 实缴资本
+    is_manufacturer = db.Column(db.Integer)  # 是否生产厂家
+    main_business_income = db.Column(db.Integer)  # 主营业务收入
+    main_supplier = db.Column(db.Integer)  # 是否主要供应商
+    payment_method = db.Column(db.Integer)  # 付款方式
+    account_period = db.Column(db.Integer)  # 账期
+    years_established = db.Column(db.Integer)  # 成立年限
+    mortgage_guarantee = db.Column(db.Integer)  # 抵押担保
+    dishonesty_record = db.Column(db.Integer)  # 失信记录
+    penalty_record = db.Column(db.Integer)  # 处罚记录
+    payment_credit = db.Column(db.Integer)  # 付款信用
+    peer_review = db.Column(db.Integer)  # 同行评价
+
+def build_credit_detail(credit_details):
+    """由credit_details字典构造资信评分子项记录，没有可识别的子项时返回None"""
+    if not isinstance(credit_details, dict):
+        return None
+    values = {}
+    for field, column in CREDIT_DETAIL_FIELDS.items():
+        try:
+            values[column] = int(credit_details[field])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return RatingCreditDetail(**values) if values else None
+
+class CompanyCatalogChange(db.Model):
+    """企业名录变更日志，多副本共享；自增ID即名录版本号"""
+    __tablename__ = 'company_catalog_change'
+    id = db.Column(db.Integer, primary_key=True)
+    company_name = db.Column(db.String(200), nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # add / remove
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RatingChange(db.Model):
+    """评级记录变更日志，只追加不修改；自增ID不复用，即评级数据版本号"""
+    __tablename__ = 'rating_change'
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    rating_id = db.Column(db.Integer, nullable=False, index=True)
+    action = db.Column(db.String(10), nullable=False)  # create / delete / update / restore / purge
+    customer_name = db.Column(db.String(200), nullable=False)
+    submitter_department = db.Column(db.String(100), nullable=False)
+    rated_at = db.Column(db.DateTime)  # 评级记录的created_at
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def log_rating_change(rating, action):
+    """记录评级记录的变更，与评级记录的修改在同一事务中提交"""
+    db.session.add(RatingChange(
+        rating_id=rating.id,
+        action=action,
+        customer_name=rating.customer_name,
+        submitter_department=rating.submitter_department,
+        rated_at=rating.created_at
+    ))
+
+class SyncCheckpoint(db.Model):
+    """共享变更日志的检查点：记录检查点包含的最新变更ID，启动时从检查点恢复，只回放之后的变更"""
+    __tablename__ = 'sync_checkpoint'
+    stream = db.Column(db.String(20), primary_key=True)  # popularity：评级变更日志
+    version = db.Column(db.Integer, nullable=False)
+    popularity_epoch = db.Column(db.Double)  # 企业热度的衰减基准时间（Unix时间戳）
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CompanyPopularityCheckpoint(db.Model):
+    """检查点中各企业的热度（以popularity_epoch为基准的前向衰减累加值）"""
+    __tablename__ = 'company_popularity_checkpoint'
+    # 自增主键：MySQL默认排序规则不区分大小写，以名称为主键时大小写不同的企业会冲突
+    id = db.Column(db.Integer, primary_key=True)
+    company_name = db.Column(db.String(200), nullable=False)
+    popularity = db.Column(db.Double, nullable=False)
+
+class DepartmentCountCheckpoint(db.Model):
+    """检查点中各部门的使用次数"""
+    __tablename__ = 'department_count_checkpoint'
+    id = db.Column(db.Integer, primary_key=True)
+    submitter_department = db.Column(db.String(100), nullable=False)
+    usage_count = db.Column(db.Integer, nullable=False)
+
+class GeneratedCompanyData(db.Model):
+    """智能补充生成的企业信息，多副本共享，同一企业只生成一次"""
+    __tablename__ = 'generated_company_data'
+    company_name = db.Column(db.String(200), primary_key=True)
+    company_data = db.Column(db.Text, nullable=False)  # JSON存储企业信息
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CompanyInfoCacheEntry(db.Model):
+    """外部接口查询到的企业信息缓存（含未查到的负缓存），多副本共享"""
+    __tablename__ = 'company_info_cache'
+    cache_key = db.Column(db.String(255), primary_key=True)  # name:规范化企业名称 / code:统一社会信用代码
+    found = db.Column(db.Boolean, nullable=False)
+    company_data = db.Column(db.Text)  # JSON存储企业信息字段
+    fetched_at = db.Column(db.DateTime, nullable=False)  # 从外部接口获取的时间（UTC）
+
+class RateLimitBucket(db.Model):
+    """外部数据源调用的令牌桶，各副本共同扣减"""
+    __tablename__ = 'rate_limit_bucket'
+    name = db.Column(db.String(50), primary_key=True)  # 数据源名称
+    # 双精度：MySQL的FLOAT为单精度，Unix时间戳会被舍入到约128秒
+    tokens = db.Column(db.Double, nullable=False)  # 剩余令牌
+    updated_at = db.Column(db.Double, nullable=False)  # 上次补充令牌的时间（Unix时间戳）
+
+class DataSupplementTask(db.Model):
+    """智能数据补充任务，按查询词去重，避免各副本重复补充"""
+    __tablename__ = 'data_supplement_task'
+    query_text = db.Column(db.String(200), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running / done / failed
+    added_count = db.Column(db.Integer, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class RatingDailyRollup(db.Model):
+    """评级记录按天预汇总（只统计未删除的记录），统计接口对整天部分直接求和"""
+    __tablename__ = 'rating_daily_rollup'
+    day = db.Column(db.Date, primary_key=True)  # 按created_at（UTC）取日期
+    grade = db.Column(db.String(10), primary_key=True)
+    customer_type = db.Column(db.String(50), primary_key=True)
+    submitter_department = db.Column(db.String(100), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaMigration(db.Model):
+    """已应用的数据库结构迁移"""
+    __tablename__ = 'schema_migration'
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def update_rating_rollup(rating, delta):
+    """按评级记录增减每日汇总计数，与评级记录的修改在同一事务中提交"""
+    keys = {
+        'day': rating.created_at.date(),
+        'grade': rating.grade,
+        'customer_type': rating.customer_type,
+        'submitter_department': rating.submitter_department
+    }
+    dialect = db.engine.dialect.name
+    if dialect in ('mysql', 'sqlite'):
+        # 单条语句完成“不存在则插入、存在则累加”，并发提交也不会冲突
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(RatingDailyRollup).values(rating_count=delta, **keys)
+            stmt = stmt.on_duplicate_key_update(rating_count=RatingDailyRollup.rating_count + delta)
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(RatingDailyRollup).values(rating_count=delta, **keys)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={'rating_count': RatingDailyRollup.rating_count + delta}
+            )
+        db.session.execute(stmt)
+        return
+    
+    updated = RatingDailyRollup.query.filter_by(**keys).update(
+        {'rating_count': RatingDailyRollup.rating_count + delta}, synchronize_session=False)
+    if not updated:
+        db.session.add(RatingDailyRollup(rating_count=delta, **keys))
+
+def backfill_rating_rollup():
+    """由评级记录重建每日汇总表，返回写入的汇总行数"""
+    day_column = db.func.date(CustomerRating.created_at)
+    rows = db.session.query(
+        day_column, CustomerRating.grade, CustomerRating.customer_type,
+        CustomerRating.submitter_department, db.func.count(CustomerRating.id)
+    ).filter(
+        CustomerRating.is_deleted == False,
+        CustomerRating.created_at.isnot(None)
+    ).group_by(
+        day_column, CustomerRating.grade, CustomerRating.customer_type, CustomerRating.submitter_department
+    ).all()
+    
+    RatingDailyRollup.query.delete()
+    for day, grade, customer_type, department, count in rows:
+        # SQLite的date()返回字符串，MySQL返回date对象
+        if isinstance(day, str):
+            day = datetime.strptime(day, '%Y-%m-%d').date()
+        db.session.add(RatingDailyRollup(
+            day=day, grade=grade, customer_type=customer_type,
+            submitter_department=department, rating_count=count
+        ))
+    db.session.commit()
+    return len(rows)
+
+@app.cli.command('backfill-rollup')
+def backfill_rollup_command():
+    """重建评级每日汇总表：flask --app app backfill-rollup"""
+    count = backfill_rating_rollup()
+    print(f"✅ 评级每日汇总已重建，共 {count} 行")
+
+# ===========================================
+# 数据库结构迁移：db.create_all()只创建缺失的表，已有表的结构变更（如新增索引）按版本号依次迁移
+# ===========================================
+
+SCHEMA_MIGRATIONS = []  # (版本号, 名称, 迁移函数, 是否先占位)
+
+def schema_migration(version, name, claim=False):
+    """注册数据库结构迁移；多副本可能同时启动，迁移函数须可重复执行
+    
+    claim=True时先写入该版本的迁移记录占位，迁移函数的修改与占位在同一事务中提交（迁移函数不得自行提交），
+    版本号主键冲突的副本等待占位事务结束后跳过，适用于重复执行会写入重复数据的迁移。
+    """
+    def register(func):
+        SCHEMA_MIGRATIONS.append((version, name, func, claim))
+        return func
+    return register
+
+def _create_model_index(model, index_name):
+    """在已有表上创建模型中声明的索引，已存在时跳过"""
+    index = next(index for index in model.__table__.indexes if index.name == index_name)
+    try:
+        index.create(db.engine, checkfirst=True)
+    except Exception:
+        # 其他副本可能刚创建了同一索引
+        if index_name not in {item['name'] for item in inspect(db.engine).get_indexes(model.__tablename__)}:
+            raise
+
+@schema_migration(1, '评级记录表复合索引')
+def _add_customer_rating_indexes():
+    for index_name in ('ix_customer_rating_deleted_created',
+                       'ix_customer_rating_deleted_deleted_at',
+                       'ix_customer_rating_deleted_department'):
+        _create_model_index(CustomerRating, index_name)
+
+@schema_migration(2, '资信评分子项拆分到rating_credit_detail表')
+def _backfill_credit_details():
+    """由已有评级记录的rating_details回填资信评分子项，已有子项记录的评级跳过"""
+    batch_size = 1000
+    last_id = 0
+    while True:
+        rows = db.session.query(CustomerRating.id, CustomerRating.rating_details).outerjoin(
+            RatingCreditDetail, RatingCreditDetail.rating_id == CustomerRating.id
+        ).filter(
+            CustomerRating.id > last_id,
+            RatingCreditDetail.rating_id.is_(None)
+        ).order_by(CustomerRating.id).limit(batch_size).all()
+        if not rows:
+            break
+        
+        for rating_id, rating_details in rows:
+            try:
+                credit_details = json_loads(rating_details).get('credit_details') if rating_details else None
+            except (ValueError, AttributeError):
+                credit_details = None
+            credit_detail = build_credit_detail(credit_details)
+            if credit_detail:
+                credit_detail.rating_id = rating_id
+                db.session.add(credit_detail)
+        try:
+            db.session.commit()
+            last_id = rows[-1].id
+        except IntegrityError:
+            # 其他副本同时在回填，重新查询本批中仍未回填的记录
+            db.session.rollback()
+
+@schema_migration(3, '评级记录变更日志rating_change回填', claim=True)
+def _backfill_rating_changes():
+    """由已有评级记录生成变更日志：按ID顺序逐条记为create，再为已标记删除的记录追加delete
+    
+    已有create（或delete）记录的评级跳过：升级后新写入的评级已由接口记录，不再重复回填。
+    """
+    columns = ['rating_id', 'action', 'customer_name', 'submitter_department', 'rated_at', 'created_at']
+    for action, condition in (('create', None), ('delete', CustomerRating.is_deleted == True)):
+        logged = db.exists().where(RatingChange.rating_id == CustomerRating.id, RatingChange.action == action)
+        query = db.select(
+            CustomerRating.id, db.literal(action), CustomerRating.customer_name,
+            CustomerRating.submitter_department, CustomerRating.created_at, db.literal(datetime.utcnow())
+        ).where(~logged).order_by(CustomerRating.id)
+        if condition is not None:
+            query = query.where(condition)
+        db.session.execute(db.insert(RatingChange).from_select(columns, query))
+
+@schema_migration(4, '令牌桶表改为双精度列')
+def _widen_rate_limit_bucket_columns():
+    """早期版本以FLOAT建表，MySQL上为单精度，改为DOUBLE；SQLite的REAL本身即双精度"""
+    if db.engine.dialect.name == 'mysql':
+        with db.engine.begin() as connection:
+            connection.execute(db.text(
+                'ALTER TABLE rate_limit_bucket MODIFY tokens DOUBLE NOT NULL, MODIFY updated_at DOUBLE NOT NULL'
+            ))
+
+def run_schema_migrations():
+    """依次应用尚未执行的迁移，返回本次应用的 (版本号, 名称) 列表"""
+    applied_versions = {row.version for row in db.session.query(SchemaMigration.version)}
+    applied = []
+    for version, name, migrate, claim in sorted(SCHEMA_MIGRATIONS, key=lambda item: item[0]):
+        if version in applied_versions:
+            continue
+        if claim:
+            try:
+                db.session.add(SchemaMigration(version=version, name=name))
+                db.session.flush()
+            except IntegrityError:
+                # 其他副本已占位并完成该迁移
+                db.session.rollback()
+                continue
+            try:
+                migrate()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            applied.append((version, name))
+            continue
+        migrate()
+        try:
+            db.session.add(SchemaMigration(version=version, name=name))
+            db.session.commit()
+        except IntegrityError:
+            # 其他副本已记录该版本
+            db.session.rollback()
+        applied.append((version, name))
+    return applied
+
+@app.cli.command('migrate')
+def migrate_command():
+    """应用数据库结构迁移：flask --app app migrate（应用启动时也会自动执行）"""
+    for version, name in run_schema_migrations():
+        print(f"✅ 已应用迁移 {version}: {name}")
+    current = db.session.query(db.func.max(SchemaMigration.version)).scalar()
+    print(f"✅ 数据库结构版本: {current}")
+
+# 待审批删除记录总数的缓存时间（秒），翻页时不必每次COUNT
+DELETED_COUNT_CACHE_SECONDS = 30
+
+# 批量导出时每批从数据库读取的记录数
+EXPORT_BATCH_SIZE = 2000
+
+# 异步导出任务配置；导出文件写在本副本的本地目录，下载需回到提交任务的副本（Ingress会话保持）
+EXPORT_SPOOL_DIR = os.environ.get('EXPORT_SPOOL_DIR',
+                                  os.path.join(tempfile.gettempdir(), 'customer_rating_exports'))
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', '2'))  # 同时执行的导出任务数
+EXPORT_MAX_PENDING = 8  # 排队与执行中的任务上限，超出时拒绝新任务
+EXPORT_JOB_TTL = int(os.environ.get('EXPORT_JOB_TTL', '3600'))  # 导出完成后文件保留时间（秒）
+
+# 共享企业名录同步配置
+CATALOG_SYNC_INTERVAL = float(os.environ.get('CATALOG_SYNC_INTERVAL', '2'))  # 版本轮询间隔（秒）
+# 部门使用次数与数据库核对的间隔（秒），纠正变更日志之外对评级记录的修改（如手工修正数据）
+DEPARTMENT_RECONCILE_INTERVAL = float(os.environ.get('DEPARTMENT_RECONCILE_INTERVAL', '300'))
+# 保存评级变更检查点的间隔（秒）：启动时从检查点恢复企业热度和部门使用次数，只回放之后的评级变更
+SYNC_CHECKPOINT_INTERVAL = float(os.environ.get('SYNC_CHECKPOINT_INTERVAL', '600'))
+CATALOG_SYNC_BATCH = 1000
+# 共享名录变更日志中早于该时间（秒）、已被同一企业后续变更取代的记录在保存检查点时删除
+CATALOG_COMPACT_AGE = 3600
+CATALOG_GAP_GRACE = 5  # 自增ID空洞的等待时间（秒），超时视为事务已回滚
+SUPPLEMENT_STALE_SECONDS = 60  # 补充任务超过该时间仍未完成，视为所在副本已退出，可重新认领
+SUPPLEMENT_RETRY_SECONDS = 600  # 补充完成后该时间内不再重复补充
+
+# 评级变更对部门使用次数的影响；update（重复标记删除）和purge（审批通过删除，标记删除时已扣减）不影响
+DEPARTMENT_COUNT_DELTAS = {'create': 1, 'delete': -1, 'restore': 1}
+
+_catalog_sync_lock = threading.Lock()
+_catalog_sync_state = {'last_sync': 0.0, 'last_department_reconcile': time.monotonic(),
+                       'last_checkpoint': time.monotonic(), 'checkpoint_restored': False}
+# 各共享变更日志已应用到本副本的自增ID（版本号）
+_catalog_streams = {
+    'catalog': {'version': 0, 'gap_since': None},
+    'popularity': {'version': 0, 'gap_since': None}
+}
+
+def _read_new_rows(model, columns, stream, allow_gaps=False):
+    """按自增ID顺序读取新于stream版本的记录，并推进版本号"""
+    rows = db.session.query(model.id, *columns).filter(
+        model.id > stream['version']
+    ).order_by(model.id).limit(CATALOG_SYNC_BATCH).all()
+    
+    ready = []
+    for row in rows:
+        if row.id != stream['version'] + 1 and not allow_gaps:
+            # ID空洞可能是尚未提交的事务，稍后再读，避免越过它导致漏掉变更
+            if stream['gap_since'] is None:
+                stream['gap_since'] = time.monotonic()
+            if time.monotonic() - stream['gap_since'] < CATALOG_GAP_GRACE:
+                break
+        stream['gap_since'] = None
+        ready.append(row)
+        stream['version'] = row.id
+    return ready
+
+def sync_company_catalog(force=False, allow_gaps=False):
+    """拉取共享名录变更与评级变更日志，增量应用到自动补全索引、企业热度和部门使用次数"""
+    if not force and time.monotonic() - _catalog_sync_state['last_sync'] < CATALOG_SYNC_INTERVAL:
+        return 0
+    # 轮询时如有其他线程正在同步则直接跳过
+    if not _catalog_sync_lock.acquire(blocking=force):
+        return 0
+    try:
+        applied = 0
+        while True:
+            rows = _read_new_rows(CompanyCatalogChange,
+                                  (CompanyCatalogChange.action, CompanyCatalogChange.company_name),
+                                  _catalog_streams['catalog'], allow_gaps)
+            if rows:
+                autocomplete_service.apply_changes([
+                    ('-' if row.action == 'remove' else '+', row.company_name) for row in rows
+                ])
+                applied += len(rows)
+            if len(rows) < CATALOG_SYNC_BATCH:
+                break
+        
+        # 首次同步时先从检查点恢复（名录变更已应用，热度能对应到企业），之后只回放检查点之后的评级变更
+        if not _catalog_sync_state['checkpoint_restored']:
+            _catalog_sync_state['checkpoint_restored'] = True
+            try:
+                _restore_sync_checkpoint()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ 评级变更检查点恢复失败，回放全部评级变更: {e}")
+        
+        # 企业热度：每条新评级记录计一次，按评级时间衰减；部门使用次数随新增、标记删除、恢复增减
+        while True:
+            rows = _read_new_rows(RatingChange,
+                                  (RatingChange.action, RatingChange.customer_name,
+                                   RatingChange.submitter_department, RatingChange.rated_at),
+                                  _catalog_streams['popularity'], allow_gaps)
+            for row in rows:
+                if row.action == 'create':
+                    rated_at = row.rated_at.replace(tzinfo=timezone.utc).timestamp() if row.rated_at else None
+                    autocomplete_service.record_usage(row.customer_name, rated_at)
+                delta = DEPARTMENT_COUNT_DELTAS.get(row.action)
+                if delta:
+                    department_service.update(row.submitter_department, delta)
+            applied += len(rows)
+            if len(rows) < CATALOG_SYNC_BATCH:
+                break
+        
+        if time.monotonic() - _catalog_sync_state['last_department_reconcile'] >= DEPARTMENT_RECONCILE_INTERVAL:
+            # 统计期间有新的评级变更时本次不替换，下次同步再核对
+            if _reconcile_department_counts():
+                _catalog_sync_state['last_department_reconcile'] = time.monotonic()
+        
+        if time.monotonic() - _catalog_sync_state['last_checkpoint'] >= SYNC_CHECKPOINT_INTERVAL:
+            # 失败时同样等到下个间隔再重试
+            _catalog_sync_state['last_checkpoint'] = time.monotonic()
+            _save_sync_checkpoint()
+            _compact_catalog_changes()
+        
+        _catalog_sync_state['last_sync'] = time.monotonic()
+        return applied
+    finally:
+        _catalog_sync_lock.release()
+
+def _reconcile_department_counts():
+    """按数据库中未删除的评级记录重新统计各部门使用次数（调用方持有同步锁），返回是否已替换
+    
+    统计前后的最新变更ID都等于本副本已应用的版本时，统计结果与已应用的变更一致，才替换内存中的计数，
+    避免与尚未应用的变更重复计数。
+    """
+    version = _catalog_streams['popularity']['version']
+    latest = db.func.max(RatingChange.id)
+    if (db.session.query(latest).scalar() or 0) != version:
+        return False
+    rows = db.session.query(
+        CustomerRating.submitter_department, db.func.count(CustomerRating.id)
+    ).filter(CustomerRating.is_deleted == False).group_by(CustomerRating.submitter_department).all()
+    if (db.session.query(latest).scalar() or 0) != version:
+        return False
+    department_service.reset(dict(rows))
+    return True
+
+def _restore_sync_checkpoint():
+    """从检查点恢复企业热度和部门使用次数，并把评级变更版本推进到检查点（调用方持有同步锁），返回检查点版本"""
+    stream = _catalog_streams['popularity']
+    checkpoint = db.session.get(SyncCheckpoint, 'popularity')
+    if checkpoint is None or checkpoint.version <= stream['version']:
+        return 0
+    version, epoch = checkpoint.version, checkpoint.popularity_epoch
+    popularity = dict(db.session.query(CompanyPopularityCheckpoint.company_name,
+                                       CompanyPopularityCheckpoint.popularity).all())
+    departments = dict(db.session.query(DepartmentCountCheckpoint.submitter_department,
+                                        DepartmentCountCheckpoint.usage_count).all())
+    # 读取期间其他副本保存了新的检查点，读到的数据可能来自两个检查点，改为全部回放
+    current = db.session.query(SyncCheckpoint.version).filter(SyncCheckpoint.stream == 'popularity').scalar()
+    db.session.rollback()
+    if current != version:
+        return 0
+    autocomplete_service.restore_popularity(epoch, popularity)
+    department_service.reset(departments)
+    stream['version'] = version
+    print(f"✅ 已从检查点恢复评级变更版本 {version}（{len(popularity)} 家企业热度，{len(departments)} 个部门）")
+    return version
+
+def _save_sync_checkpoint():
+    """保存本副本已应用的评级变更版本及对应的企业热度和部门使用次数（调用方持有同步锁），返回是否已保存
+    
+    只有版本新于已有检查点时才替换；条件更新锁住检查点行，多个副本同时保存时以版本最新的为准。
+    """
+    version = _catalog_streams['popularity']['version']
+    if not version:
+        return False
+    now = datetime.utcnow()
+    epoch, popularity = autocomplete_service.export_popularity()
+    try:
+        updated = SyncCheckpoint.query.filter(
+            SyncCheckpoint.stream == 'popularity', SyncCheckpoint.version < version
+        ).update({'version': version, 'popularity_epoch': epoch, 'updated_at': now}, synchronize_session=False)
+        if not updated:
+            if db.session.get(SyncCheckpoint, 'popularity') is not None:
+                db.session.rollback()
+                return False
+            db.session.add(SyncCheckpoint(stream='popularity', version=version, popularity_epoch=epoch, updated_at=now))
+            db.session.flush()
+        
+        CompanyPopularityCheckpoint.query.delete(synchronize_session=False)
+        DepartmentCountCheckpoint.query.delete(synchronize_session=False)
+        if popularity:
+            db.session.execute(db.insert(CompanyPopularityCheckpoint), [
+                {'company_name': name, 'popularity': value} for name, value in popularity.items()
+            ])
+        departments = department_service.counts()
+        if departments:
+            db.session.execute(db.insert(DepartmentCountCheckpoint), [
+                {'submitter_department': name, 'usage_count': count} for name, count in departments.items()
+            ])
+        db.session.commit()
+    except IntegrityError:
+        # 其他副本同时创建了检查点
+        db.session.rollback()
+        return False
+    except Exception:
+        db.session.rollback()
+        raise
+    return True
+
+def _compact_catalog_changes():
+    """删除共享名录变更日志中已被同一企业后续变更取代的记录（调用方持有同步锁），返回删除的记录数
+    
+    回放时只有每家企业最新的一条变更决定其是否在名录中，压缩后启动回放的记录数不超过变更过的企业数。
+    只删除不超过本副本已应用版本、且早于CATALOG_COMPACT_AGE的记录，运行中的副本早已读过这些记录。
+    """
+    version = _catalog_streams['catalog']['version']
+    cutoff = datetime.utcnow() - timedelta(seconds=CATALOG_COMPACT_AGE)
+    later = db.aliased(CompanyCatalogChange)
+    name, later_name = CompanyCatalogChange.company_name, later.company_name
+    if db.engine.dialect.name == 'mysql':
+        # MySQL默认排序规则不区分大小写，按二进制比较企业名称
+        name, later_name = name.collate('utf8mb4_bin'), later_name.collate('utf8mb4_bin')
+    superseded = db.exists().where(later_name == name, later.id > CompanyCatalogChange.id, later.id <= version)
+    ids = [row.id for row in db.session.query(CompanyCatalogChange.id).filter(
+        CompanyCatalogChange.id <= version, CompanyCatalogChange.created_at < cutoff, superseded
+    ).order_by(CompanyCatalogChange.id).limit(CATALOG_SYNC_BATCH)]
+    if ids:
+        CompanyCatalogChange.query.filter(CompanyCatalogChange.id.in_(ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(ids)
+
+def _sync_rating_changes():
+    """评级记录变更提交后立即应用到本副本的企业热度和部门使用次数，失败时留待下次轮询"""
+    try:
+        sync_company_catalog(force=True)
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ 企业热度更新失败: {e}")
+
+def record_company_catalog_changes(company_names, action='add'):
+    """将企业名录变更写入共享日志并立即应用到本副本，返回写入的变更数量"""
+    if action == 'add':
+        names = [name for name in dict.fromkeys(company_names)
+                 if name and not autocomplete_service.has_company(name)]
+    else:
+        names = [name for name in dict.fromkeys(company_names)
+                 if autocomplete_service.has_company(name)]
+    if not names:
+        return 0
+    db.session.add_all([CompanyCatalogChange(company_name=name, action=action) for name in names])
+    db.session.commit()
+    sync_company_catalog(force=True)
+    return len(names)
+
+class SharedCompanyCache:
+    """基于数据库的企业信息缓存，替代ExternalDataService的进程内运行时缓存"""
+    
+    def get(self, company_name, default=None):
+        with app.app_context():
+            row = db.session.get(GeneratedCompanyData, company_name)
+            return json.loads(row.company_data) if row else default
+    
+    def __contains__(self, company_name):
+        return self.get(company_name) is not None
+    
+    def __setitem__(self, company_name, company_data):
+        with app.app_context():
+            try:
+                db.session.add(GeneratedCompanyData(
+                    company_name=company_name,
+                    company_data=json.dumps(company_data, ensure_ascii=False)
+                ))
+                db.session.commit()
+            except IntegrityError:
+                # 其他副本已写入同一企业，以先写入的为准
+                db.session.rollback()
+
+class SharedCompanyInfoStore:
+    """基于数据库的外部企业信息缓存存储，作为ExternalDataService进程内缓存的第二级"""
+    
+    def get(self, cache_key):
+        with app.app_context():
+            row = db.session.get(CompanyInfoCacheEntry, cache_key)
+            if row is None:
+                return None
+            return {
+                'found': row.found,
+                'fields': json_loads(row.company_data) if row.company_data else {},
+                'fetched_at': row.fetched_at.replace(tzinfo=timezone.utc).timestamp()
+            }
+    
+    def set(self, cache_key, entry):
+        with app.app_context():
+            try:
+                db.session.merge(CompanyInfoCacheEntry(
+                    cache_key=cache_key,
+                    found=entry['found'],
+                    company_data=json.dumps(entry['fields'], ensure_ascii=False),
+                    fetched_at=datetime.fromtimestamp(entry['fetched_at'], timezone.utc).replace(tzinfo=None)
+                ))
+                db.session.commit()
+            except IntegrityError:
+                # 其他副本同时写入了同一企业，保留先写入的结果
+                db.session.rollback()
+
+class SharedRateLimitStore:
+    """基于数据库的令牌桶存储，使外部数据源的rate_limit在所有副本间共享"""
+    
+    def try_acquire(self, name, capacity, refill_rate):
+        with app.app_context():
+            now = time.time()
+            # 补充令牌与扣减在同一条UPDATE中完成，并发扣减不会超发；时钟回拨时不补充
+            elapsed = db.case((RateLimitBucket.updated_at < now, now - RateLimitBucket.updated_at), else_=0.0)
+            refilled = db.case(
+                (RateLimitBucket.tokens + elapsed * refill_rate > capacity, capacity),
+                else_=RateLimitBucket.tokens + elapsed * refill_rate
+            )
+            for _ in range(2):
+                try:
+                    updated = RateLimitBucket.query.filter(
+                        RateLimitBucket.name == name, refilled >= 1
+                    ).update({
+                        'tokens': refilled - 1,
+                        'updated_at': db.case((RateLimitBucket.updated_at < now, now), else_=RateLimitBucket.updated_at)
+                    }, synchronize_session=False)
+                    if updated:
+                        db.session.commit()
+                        return True
+                    if db.session.get(RateLimitBucket, name) is not None:
+                        db.session.rollback()
+                        return False
+                    # 首次调用该数据源：创建满桶并取走一个令牌
+                    db.session.add(RateLimitBucket(name=name, tokens=capacity - 1, updated_at=now))
+                    db.session.commit()
+                    return True
+                except IntegrityError:
+                    # 其他副本同时创建了该桶，重新扣减
+                    db.session.rollback()
+            return False
+
 # 创建数据库表
 with app.app_context():
     try:
         db.create_all()
-        print(f"✅ SQLite数据库连接成功: {app.config['SQLALCHEMY_DATABASE_URI']}")
+        print(f"✅ 数据库连接成功: {app.config['SQLALCHEMY_DATABASE_URI']}")
     except Exception as e:
         print(f"❌ 数据库连接失败: {e}")
         raise
+    
+    try:
+        for version, name in run_schema_migrations():
+            print(f"✅ 已应用数据库迁移 {version}: {name}")
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+        raise
+    
+    # 升级后首次启动时汇总表为空，由已有评级记录回填
+    if RatingDailyRollup.query.first() is None and CustomerRating.query.first() is not None:
+        print(f"✅ 评级每日汇总表回填完成，共 {backfill_rating_rollup()} 行")
+    
+    # 启动时回放共享名录变更，评级变更从检查点之后开始回放，历史空洞无需等待
+    try:
+        applied = sync_company_catalog(force=True, allow_gaps=True)
+        print(f"✅ 共享企业名录同步完成，名录版本 {_catalog_streams['catalog']['version']}，"
+              f"评级变更版本 {_catalog_streams['popularity']['version']}（应用 {applied} 条记录）")
+    except Exception as e:
+        print(f"⚠️ 共享企业名录同步失败: {e}")
 
-# 初始化外部数据服务
-external_service = ExternalDataService()
+@app.before_request
+def poll_company_catalog():
+    """按固定间隔轮询共享名录和评级记录，使其他副本的变更在本副本可见"""
+    try:
+        sync_company_catalog()
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ 共享企业名录同步失败: {e}")
+
+# 初始化外部数据服务（智能补充的企业信息和外部接口查询结果在各副本间共享）
+external_service = ExternalDataService(company_cache=SharedCompanyCache(), info_store=SharedCompanyInfoStore(),
+                                       rate_limit_store=SharedRateLimitStore())
 
 def clean_filename(name):
     """清理文件名中的非法字符，保留中文、英文、数字"""
@@ -224,12 +959,19 @@ def calculate_rating():
             profit_estimate_score=profit_estimate_score,
             total_score=total_score,
             grade=grade,
-            rating_details=json.dumps(rating_details, ensure_ascii=False)
+            rating_details=json.dumps(rating_details, ensure_ascii=False),
+            credit_detail=build_credit_detail(rating_details['credit_details'])
         )
         
         db.session.add(new_rating)
+        db.session.flush()
+        update_rating_rollup(new_rating, 1)
+        log_rating_change(new_rating, 'create')
         db.session.commit()
         
+        # 更新企业热度（同时同步其他副本的评级变更），失败不影响评级结果
+        _sync_rating_changes()
+        
         return jsonify({
             'success': True,
             'data': {
@@ -256,28 +998,96 @@ def calculate_rating():
             'error': str(e)
         }), 400
 
+def _encode_page_cursor(direction, sort_value, row_id):
+    """将翻页方向和排序键编码为不透明的游标字符串"""
+    payload = json.dumps([direction, sort_value.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_page_cursor(cursor):
+    """解析游标，返回 (方向, 排序键, ID)；格式不正确时抛出ValueError"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, sort_value, row_id = json.loads(payload)
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise ValueError('无效的分页游标')
+
+def keyset_paginate(query, sort_column, cursor=None, per_page=10):
+    """按 (sort_column, id) 倒序做游标分页，每页查询代价与翻页深度无关
+    
+    游标由上一次返回的next_cursor/prev_cursor给出，为空时返回第一页。
+    返回 (记录列表, 下一页游标, 上一页游标)，没有更多记录时游标为None。
+    """
+    direction, sort_value, row_id = _decode_page_cursor(cursor) if cursor else ('next', None, None)
+    
+    if direction == 'next':
+        if sort_value is not None:
+            query = query.filter(db.or_(
+                sort_column < sort_value,
+                db.and_(sort_column == sort_value, CustomerRating.id < row_id)
+            ))
+        items = query.order_by(sort_column.desc(), CustomerRating.id.desc()).limit(per_page + 1).all()
+        has_next, has_prev = len(items) > per_page, sort_value is not None
+        items = items[:per_page]
+    else:
+        # 向前翻页：按升序取游标之前的记录，再翻转为倒序
+        query = query.filter(db.or_(
+            sort_column > sort_value,
+            db.and_(sort_column == sort_value, CustomerRating.id > row_id)
+        ))
+        items = query.order_by(sort_column.asc(), CustomerRating.id.asc()).limit(per_page + 1).all()
+        has_next, has_prev = True, len(items) > per_page
+        items = items[:per_page][::-1]
+    
+    next_cursor = prev_cursor = None
+    if items and has_next:
+        last = items[-1]
+        next_cursor = _encode_page_cursor('next', getattr(last, sort_column.key), last.id)
+    if items and has_prev:
+        first = items[0]
+        prev_cursor = _encode_page_cursor('prev', getattr(first, sort_column.key), first.id)
+    return items, next_cursor, prev_cursor
+
+_deleted_count_cache = {'value': None, 'expires': 0.0}
+
+def _deleted_records_count():
+    """待审批删除记录总数，短时缓存"""
+    if _deleted_count_cache['value'] is None or time.monotonic() >= _deleted_count_cache['expires']:
+        _deleted_count_cache['value'] = db.session.query(db.func.count(CustomerRating.id)).filter(
+            CustomerRating.is_deleted == True
+        ).scalar()
+        _deleted_count_cache['expires'] = time.monotonic() + DELETED_COUNT_CACHE_SECONDS
+    return _deleted_count_cache['value']
+
 @app.route('/api/history', methods=['GET'])
 def get_rating_history():
-    """获取评级历史记录"""
+    """获取评级历史记录（游标分页）"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        cursor = request.args.get('cursor')
+        per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
         
         # 只查询未删除的记录
-        ratings = CustomerRating.query.filter(
-            CustomerRating.is_deleted == False
-        ).order_by(CustomerRating.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        ratings, next_cursor, prev_cursor = keyset_paginate(
+            CustomerRating.query.filter(CustomerRating.is_deleted == False).options(
+                db.defer(CustomerRating.rating_details)
+            ),
+            CustomerRating.created_at, cursor, per_page
         )
         
+        # 总数由每日汇总表求和（汇总表只统计未删除的记录），不对评级表COUNT
+        total = int(db.session.query(db.func.sum(RatingDailyRollup.rating_count)).scalar() or 0)
+        
         return jsonify({
             'success': True,
             'data': {
-                'ratings': [rating.to_dict() for rating in ratings.items],
-                'total': ratings.total,
-                'pages': ratings.pages,
-                'current_page': page,
-                'per_page': per_page
+                'ratings': [rating.to_dict(include_details=False) for rating in ratings],
+                'total': total,
+                'pages': math.ceil(total / per_page),
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
             }
         })
         
@@ -313,12 +1123,18 @@ def mark_rating_deleted(rating_id):
         data = request.json or {}
         delete_reason = data.get('reason', '用户删除操作')
         
-        # 标记为删除
+        # 标记为删除（已删除的记录不再重复扣减汇总）
+        newly_deleted = not rating.is_deleted
+        if newly_deleted:
+            update_rating_rollup(rating, -1)
         rating.is_deleted = True
         rating.deleted_at = datetime.utcnow()
         rating.deleted_reason = delete_reason
+        log_rating_change(rating, 'delete' if newly_deleted else 'update')
         
         db.session.commit()
+        _deleted_count_cache['value'] = None
+        _sync_rating_changes()
         
         return jsonify({
             'success': True,
@@ -347,26 +1163,29 @@ def admin_panel():
 
 @app.route('/api/admin/deleted-records', methods=['GET'])
 def get_deleted_records():
-    """获取待审批的删除记录"""
+    """获取待审批的删除记录（游标分页）"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        cursor = request.args.get('cursor')
+        per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
         
         # 查询已标记删除的记录
-        deleted_ratings = CustomerRating.query.filter(
-            CustomerRating.is_deleted == True
-        ).order_by(CustomerRating.deleted_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        deleted_ratings, next_cursor, prev_cursor = keyset_paginate(
+            CustomerRating.query.filter(CustomerRating.is_deleted == True).options(
+                db.defer(CustomerRating.rating_details)
+            ),
+            CustomerRating.deleted_at, cursor, per_page
         )
+        total = _deleted_records_count()
         
         return jsonify({
             'success': True,
             'data': {
-                'records': [rating.to_dict() for rating in deleted_ratings.items],
-                'total': deleted_ratings.total,
-                'pages': deleted_ratings.pages,
-                'current_page': page,
-                'per_page': per_page
+                'records': [rating.to_dict(include_details=False) for rating in deleted_ratings],
+                'total': total,
+                'pages': math.ceil(total / per_page),
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
             }
         })
         
@@ -386,8 +1205,10 @@ def approve_delete(rating_id):
         ).first_or_404()
         
         # 真正删除记录
+        log_rating_change(rating, 'purge')
         db.session.delete(rating)
         db.session.commit()
+        _deleted_count_cache['value'] = None
         
         return jsonify({
             'success': True,
@@ -413,12 +1234,16 @@ def reject_delete(rating_id):
         data = request.json or {}
         reject_reason = data.get('reason', '管理员拒绝删除')
         
-        # 恢复记录
+        # 恢复记录，重新计入汇总（标记删除时已扣减，审批通过删除时无需再改）
+        update_rating_rollup(rating, 1)
         rating.is_deleted = False
         rating.deleted_at = None
         rating.deleted_reason = f"拒绝删除: {reject_reason}"
+        log_rating_change(rating, 'restore')
         
         db.session.commit()
+        _deleted_count_cache['value'] = None
+        _sync_rating_changes()
         
         return jsonify({
             'success': True,
@@ -455,6 +1280,21 @@ def get_admin_stats():
             'error': str(e)
         }), 400
 
+@app.route('/api/admin/data-sources', methods=['GET'])
+def get_data_source_status():
+    """外部企业数据源的熔断器状态及自适应超时（当前副本）"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': external_service.data_source_status()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
 @app.route('/api/statistics', methods=['GET'])
 def get_statistics():
     """获取统计信息"""
@@ -463,16 +1303,16 @@ def get_statistics():
         time_range = request.args.get('time_range', '1month')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        # 可选的分组明细：day（按天）/ department（按提交部门）
+        breakdown = request.args.get('breakdown')
         
-        # 构建查询条件 - 只查询未删除的记录
-        query = CustomerRating.query.filter(CustomerRating.is_deleted == False)
+        # 构建时间范围
+        start_datetime = end_datetime = None
         
         if time_range == 'custom' and start_date and end_date:
             # 自定义时间范围
             start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
             end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-            query = query.filter(CustomerRating.created_at >= start_datetime)
-            query = query.filter(CustomerRating.created_at < end_datetime)
         elif time_range != 'all':
             # 预设时间范围
             now = datetime.now()
@@ -484,22 +1324,19 @@ def get_statistics():
                 start_datetime = now - timedelta(days=180)
             elif time_range == '1year':
                 start_datetime = now - timedelta(days=365)
-            else:
-                start_datetime = None
-                
-            if start_datetime:
-                query = query.filter(CustomerRating.created_at >= start_datetime)
         
-        # 获取筛选后的记录
-        ratings = query.all()
+        # 由每日汇总表求和，不加载评级记录本身
+        grade_counts = {}
+        for (_, grade), count in _rating_counts(start_datetime, end_datetime).items():
+            grade_counts[grade] = grade_counts.get(grade, 0) + count
         
         # 计算统计信息
-        total_count = len(ratings)
-        aplus_count = len([r for r in ratings if r.grade == 'A+'])
-        a_count = len([r for r in ratings if r.grade == 'A'])
-        b_count = len([r for r in ratings if r.grade == 'B'])
-        c_count = len([r for r in ratings if r.grade == 'C'])
-        d_count = len([r for r in ratings if r.grade == 'D'])
+        total_count = sum(grade_counts.values())
+        aplus_count = grade_counts.get('A+', 0)
+        a_count = grade_counts.get('A', 0)
+        b_count = grade_counts.get('B', 0)
+        c_count = grade_counts.get('C', 0)
+        d_count = grade_counts.get('D', 0)
         
         # 计算时间范围描述
         if time_range == 'custom' and start_date and end_date:
@@ -515,19 +1352,145 @@ def get_statistics():
         else:
             time_desc = "全部时间"
         
+        data = {
+            'total': total_count,
+            'aplus_count': aplus_count,
+            'a_count': a_count,
+            'b_count': b_count,
+            'c_count': c_count,
+            'd_count': d_count,
+            'time_range': time_range,
+            'time_description': time_desc,
+            'start_date': start_date,
+            'end_date': end_date
+        }
+        if breakdown in ('day', 'department'):
+            data['breakdown'] = _grade_breakdown(start_datetime, end_datetime, breakdown)
+        
+        return jsonify({
+            'success': True,
+            'data': data
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+def _rating_counts(start_datetime=None, end_datetime=None, group_by=None):
+    """统计时间范围内未删除评级的等级分布，返回{(分组键, 等级): 数量}
+    
+    整天的部分对每日汇总表求和；起始时间不在零点时（如“近一个月”），
+    不完整的第一天直接查评级表，只扫描这一天的记录。
+    """
+    counts = {}
+    
+    def accumulate(rows):
+        for *group_key, grade, count in rows:
+            # 日期统一为字符串（SQLite的date()返回字符串，汇总表返回date对象）
+            key = str(group_key[0]) if group_key and group_key[0] is not None else None
+            counts[(key, grade)] = counts.get((key, grade), 0) + count
+    
+    first_day = start_datetime.date() if start_datetime is not None else None
+    if start_datetime is not None and start_datetime != datetime.combine(first_day, datetime.min.time()):
+        first_day += timedelta(days=1)
+        partial_end = datetime.combine(first_day, datetime.min.time())
+        if end_datetime is not None:
+            partial_end = min(partial_end, end_datetime)
+        raw_group = {
+            'day': db.func.date(CustomerRating.created_at),
+            'department': CustomerRating.submitter_department
+        }.get(group_by)
+        columns = ([raw_group] if raw_group is not None else []) + [CustomerRating.grade]
+        accumulate(db.session.query(*columns, db.func.count(CustomerRating.id)).filter(
+            CustomerRating.is_deleted == False,
+            CustomerRating.created_at >= start_datetime,
+            CustomerRating.created_at < partial_end
+        ).group_by(*columns).all())
+    
+    rollup_group = {
+        'day': RatingDailyRollup.day,
+        'department': RatingDailyRollup.submitter_department
+    }.get(group_by)
+    columns = ([rollup_group] if rollup_group is not None else []) + [RatingDailyRollup.grade]
+    query = db.session.query(*columns, db.func.sum(RatingDailyRollup.rating_count))
+    if first_day is not None:
+        query = query.filter(RatingDailyRollup.day >= first_day)
+    if end_datetime is not None:
+        # 自定义范围的结束时间总在零点
+        query = query.filter(RatingDailyRollup.day < end_datetime.date())
+    accumulate(query.group_by(*columns).all())
+    
+    return {key: int(count) for key, count in counts.items() if count}
+
+def _grade_breakdown(start_datetime, end_datetime, breakdown):
+    """按天或按提交部门分组的等级分布"""
+    groups = {}
+    for (group_key, grade), count in sorted(_rating_counts(start_datetime, end_datetime, breakdown).items(),
+                                            key=lambda item: (item[0][0] or '', item[0][1])):
+        key = group_key or ''
+        group = groups.setdefault(key, {'key': key, 'total': 0, 'grades': {}})
+        group['grades'][grade] = count
+        group['total'] += count
+    return list(groups.values())
+
+CREDIT_STATISTICS_GROUPS = {
+    'department': CustomerRating.submitter_department,
+    'grade': CustomerRating.grade,
+    'customer_type': CustomerRating.customer_type
+}
+
+@app.route('/api/statistics/credit-details', methods=['GET'])
+def get_credit_detail_statistics():
+    """资信评分子项平均分统计（只统计未删除的记录）
+    
+    参数：group_by = department（默认）/ grade / customer_type；
+    items = 逗号分隔的子项名（如 paymentCredit,accountPeriod），默认全部子项。
+    """
+    try:
+        group_by = request.args.get('group_by', 'department')
+        if group_by not in CREDIT_STATISTICS_GROUPS:
+            return jsonify({
+                'success': False,
+                'error': f'不支持的分组方式: {group_by}'
+            }), 400
+        
+        items = [item for item in request.args.get('items', '').split(',') if item] or list(CREDIT_DETAIL_FIELDS)
+        unknown = [item for item in items if item not in CREDIT_DETAIL_FIELDS]
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f'未知的资信评分子项: {", ".join(unknown)}'
+            }), 400
+        
+        group_column = CREDIT_STATISTICS_GROUPS[group_by]
+        rows = db.session.query(
+            group_column,
+            db.func.count(RatingCreditDetail.rating_id),
+            *[db.func.avg(getattr(RatingCreditDetail, CREDIT_DETAIL_FIELDS[item])) for item in items]
+        ).join(
+            CustomerRating, CustomerRating.id == RatingCreditDetail.rating_id
+        ).filter(
+            CustomerRating.is_deleted == False
+        ).group_by(group_column).order_by(group_column).all()
+        
+        groups = []
+        for group, count, *averages in rows:
+            groups.append({
+                'group': group,
+                'count': count,
+                'averages': {
+                    item: round(float(average), 2) if average is not None else None
+                    for item, average in zip(items, averages)
+                }
+            })
+        
         return jsonify({
             'success': True,
             'data': {
-                'total': total_count,
-                'aplus_count': aplus_count,
-                'a_count': a_count,
-                'b_count': b_count,
-                'c_count': c_count,
-                'd_count': d_count,
-                'time_range': time_range,
-                'time_description': time_desc,
-                'start_date': start_date,
-                'end_date': end_date
+                'group_by': group_by,
+                'groups': groups
             }
         })
         
@@ -720,169 +1683,290 @@ def export_rating_report(rating_id):
             'error': str(e)
         }), 400
 
-@app.route('/api/export/all', methods=['GET'])
-def export_all_ratings():
-    """导出所有客户评级记录到单个Excel文件"""
-    try:
-        # 获取所有评级记录
-        ratings = CustomerRating.query.order_by(CustomerRating.created_at.desc()).all()
-        
-        if not ratings:
-            return jsonify({
-                'success': False,
-                'error': '没有找到评级记录'
-            }), 404
-        
-        # 创建内存中的Excel文件
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        worksheet = workbook.add_worksheet('客户评级汇总')
-        
-        # 定义格式
-        title_format = workbook.add_format({
-            'bold': True,
-            'font_size': 16,
-            'align': 'center',
-            'valign': 'vcenter',
-            'font_color': '#1a2980'
-        })
-        
-        header_format = workbook.add_format({
-            'bold': True,
-            'font_size': 11,
-            'bg_color': '#3498db',
-            'font_color': 'white',
-            'align': 'center',
-            'valign': 'vcenter',
-            'border': 1
-        })
-        
-        cell_format = workbook.add_format({
-            'font_size': 10,
-            'align': 'center',
-            'valign': 'vcenter',
-            'border': 1
-        })
-        
-        score_format = workbook.add_format({
-            'font_size': 10,
-            'align': 'center',
-            'valign': 'vcenter',
-            'bold': True,
-            'font_color': '#3498db',
-            'border': 1
-        })
-        
-        # 设置列宽
-        worksheet.set_column('A:A', 8)   # 序号
-        worksheet.set_column('B:B', 20)  # 客户名称
-        worksheet.set_column('C:C', 15)  # 客户类型
-        worksheet.set_column('D:D', 12)  # 提交人
-        worksheet.set_column('E:E', 12)  # 部门
-        worksheet.set_column('F:F', 10)  # 综合得分
-        worksheet.set_column('G:G', 8)   # 客户等级
-        worksheet.set_column('H:H', 8)   # 行业
-        worksheet.set_column('I:I', 8)   # 业务类型
-        worksheet.set_column('J:J', 8)   # 影响力
-        worksheet.set_column('K:K', 8)   # 规模
-        worksheet.set_column('L:L', 8)   # 资信
-        worksheet.set_column('M:M', 8)   # 商机
-        worksheet.set_column('N:N', 18)  # 评估时间
-        
-        # 标题
-        worksheet.merge_range('A1:N1', '客户评级汇总表', title_format)
-        worksheet.set_row(0, 25)
-        
-        # 表头
-        headers = [
-            '序号', '客户名称', '客户类型', '提交人', '部门', '综合得分', '客户等级',
-            '行业评分', '业务类型', '影响力', '规模评分', '资信评分', '商机评分', '评估时间'
-        ]
-        
-        row = 2
-        for col, header in enumerate(headers):
-            worksheet.write(row, col, header, header_format)
-        worksheet.set_row(row, 20)
-        
-        # 数据行
-        for index, rating in enumerate(ratings):
-            row += 1
-            
-            # 序号
-            worksheet.write(row, 0, index + 1, cell_format)
-            
-            # 客户名称
-            worksheet.write(row, 1, rating.customer_name, cell_format)
-            
-            # 客户类型
-            worksheet.write(row, 2, get_customer_type_text(rating.customer_type), cell_format)
-            
-            # 提交人
-            worksheet.write(row, 3, rating.submitter_name, cell_format)
-            
-            # 部门
-            worksheet.write(row, 4, rating.submitter_department, cell_format)
-            
-            # 综合得分
-            worksheet.write(row, 5, f'{rating.total_score}分', score_format)
-            
-            # 客户等级
-            grade_format = workbook.add_format({
+def write_ratings_workbook(output_path, progress=None):
+    """将所有客户评级记录写入Excel汇总表，返回写入的记录数
+    
+    记录按批从数据库游标读取、逐行写入（xlsxwriter constant_memory模式），
+    内存占用与记录数无关；progress(已写入数)每批回调一次。
+    """
+    # 只查询导出需要的列（不含rating_details），按批从服务端游标读取
+    ratings = db.session.query(
+        CustomerRating.customer_name,
+        CustomerRating.customer_type,
+        CustomerRating.submitter_name,
+        CustomerRating.submitter_department,
+        CustomerRating.total_score,
+        CustomerRating.grade,
+        CustomerRating.industry_score,
+        CustomerRating.business_type_score,
+        CustomerRating.influence_score,
+        CustomerRating.logistics_scale_score,
+        CustomerRating.credit_score,
+        CustomerRating.profit_estimate_score,
+        CustomerRating.created_at
+    ).order_by(CustomerRating.created_at.desc()).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    
+    # constant_memory模式下每写完一行即落盘
+    workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('客户评级汇总')
+    
+    # 定义格式
+    title_format = workbook.add_format({
+        'bold': True,
+        'font_size': 16,
+        'align': 'center',
+        'valign': 'vcenter',
+        'font_color': '#1a2980'
+    })
+    
+    header_format = workbook.add_format({
+        'bold': True,
+        'font_size': 11,
+        'bg_color': '#3498db',
+        'font_color': 'white',
+        'align': 'center',
+        'valign': 'vcenter',
+        'border': 1
+    })
+    
+    cell_format = workbook.add_format({
+        'font_size': 10,
+        'align': 'center',
+        'valign': 'vcenter',
+        'border': 1
+    })
+    
+    score_format = workbook.add_format({
+        'font_size': 10,
+        'align': 'center',
+        'valign': 'vcenter',
+        'bold': True,
+        'font_color': '#3498db',
+        'border': 1
+    })
+    
+    # 设置列宽
+    worksheet.set_column('A:A', 8)   # 序号
+    worksheet.set_column('B:B', 20)  # 客户名称
+    worksheet.set_column('C:C', 15)  # 客户类型
+    worksheet.set_column('D:D', 12)  # 提交人
+    worksheet.set_column('E:E', 12)  # 部门
+    worksheet.set_column('F:F', 10)  # 综合得分
+    worksheet.set_column('G:G', 8)   # 客户等级
+    worksheet.set_column('H:H', 8)   # 行业
+    worksheet.set_column('I:I', 8)   # 业务类型
+    worksheet.set_column('J:J', 8)   # 影响力
+    worksheet.set_column('K:K', 8)   # 规模
+    worksheet.set_column('L:L', 8)   # 资信
+    worksheet.set_column('M:M', 8)   # 商机
+    worksheet.set_column('N:N', 18)  # 评估时间
+    
+    # 各等级的格式预先创建，每行复用
+    grade_formats = {}
+    def grade_format_for(grade):
+        color = get_grade_color(grade)
+        if color not in grade_formats:
+            grade_formats[color] = workbook.add_format({
                 'font_size': 10,
                 'align': 'center',
                 'valign': 'vcenter',
                 'bold': True,
                 'border': 1,
-                'font_color': get_grade_color(rating.grade)
+                'font_color': color
             })
-            worksheet.write(row, 6, rating.grade, grade_format)
-            
-            # 各项评分
-            worksheet.write(row, 7, rating.industry_score, cell_format)
-            worksheet.write(row, 8, rating.business_type_score, cell_format)
-            worksheet.write(row, 9, rating.influence_score, cell_format)
-            worksheet.write(row, 10, rating.logistics_scale_score, cell_format)
-            worksheet.write(row, 11, rating.credit_score, cell_format)
-            worksheet.write(row, 12, rating.profit_estimate_score, cell_format)
-            
-            # 评估时间
-            worksheet.write(row, 13, rating.created_at.strftime('%Y-%m-%d %H:%M'), cell_format)
+        return grade_formats[color]
+    for grade in ('A+', 'A', 'B', 'C', 'D'):
+        grade_format_for(grade)
+    
+    # 标题（constant_memory模式下必须按行顺序写入，行高在写入该行前设置）
+    worksheet.set_row(0, 25)
+    worksheet.merge_range('A1:N1', '客户评级汇总表', title_format)
+    
+    # 表头
+    headers = [
+        '序号', '客户名称', '客户类型', '提交人', '部门', '综合得分', '客户等级',
+        '行业评分', '业务类型', '影响力', '规模评分', '资信评分', '商机评分', '评估时间'
+    ]
+    
+    row = 2
+    worksheet.set_row(row, 20)
+    for col, header in enumerate(headers):
+        worksheet.write(row, col, header, header_format)
+    
+    # 数据行（边写边统计各等级数量）
+    grade_counts = {}
+    total_count = 0
+    for index, rating in enumerate(ratings):
+        row += 1
+        total_count += 1
+        grade_counts[rating.grade] = grade_counts.get(rating.grade, 0) + 1
+        if progress and total_count % EXPORT_BATCH_SIZE == 0:
+            progress(total_count)
         
-        # 统计信息
-        row += 2
-        worksheet.write(row, 0, '统计信息', header_format)
+        # 序号
+        worksheet.write(row, 0, index + 1, cell_format)
         
-        # 计算统计
-        total_count = len(ratings)
-        aplus_count = len([r for r in ratings if r.grade == 'A+'])
-        a_count = len([r for r in ratings if r.grade == 'A'])
-        b_count = len([r for r in ratings if r.grade == 'B'])
-        c_count = len([r for r in ratings if r.grade == 'C'])
+        # 客户名称
+        worksheet.write(row, 1, rating.customer_name, cell_format)
         
-        row += 1
-        worksheet.write(row, 0, '总记录数', cell_format)
-        worksheet.write(row, 1, total_count, cell_format)
-        worksheet.write(row, 2, 'A+级客户', cell_format)
-        worksheet.write(row, 3, aplus_count, cell_format)
-        worksheet.write(row, 4, 'A级客户', cell_format)
-        worksheet.write(row, 5, a_count, cell_format)
-        worksheet.write(row, 6, 'B级客户', cell_format)
-        worksheet.write(row, 7, b_count, cell_format)
-        worksheet.write(row, 8, 'C级客户', cell_format)
-        worksheet.write(row, 9, c_count, cell_format)
+        # 客户类型
+        worksheet.write(row, 2, get_customer_type_text(rating.customer_type), cell_format)
         
-        # 页脚
-        row += 2
-        worksheet.write(row, 0, '生成时间', cell_format)
-        worksheet.write(row, 1, datetime.now().strftime('%Y年%m月%d日 %H:%M:%S'), cell_format)
+        # 提交人
+        worksheet.write(row, 3, rating.submitter_name, cell_format)
         
-        workbook.close()
-        output.seek(0)
+        # 部门
+        worksheet.write(row, 4, rating.submitter_department, cell_format)
+        
+        # 综合得分
+        worksheet.write(row, 5, f'{rating.total_score}分', score_format)
+        
+        # 客户等级
+        worksheet.write(row, 6, rating.grade, grade_format_for(rating.grade))
+        
+        # 各项评分
+        worksheet.write(row, 7, rating.industry_score, cell_format)
+        worksheet.write(row, 8, rating.business_type_score, cell_format)
+        worksheet.write(row, 9, rating.influence_score, cell_format)
+        worksheet.write(row, 10, rating.logistics_scale_score, cell_format)
+        worksheet.write(row, 11, rating.credit_score, cell_format)
+        worksheet.write(row, 12, rating.profit_estimate_score, cell_format)
+        
+        # 评估时间
+        worksheet.write(row, 13, rating.created_at.strftime('%Y-%m-%d %H:%M'), cell_format)
+    
+    # 统计信息
+    row += 2
+    worksheet.write(row, 0, '统计信息', header_format)
+    
+    # 计算统计
+    aplus_count = grade_counts.get('A+', 0)
+    a_count = grade_counts.get('A', 0)
+    b_count = grade_counts.get('B', 0)
+    c_count = grade_counts.get('C', 0)
+    
+    row += 1
+    worksheet.write(row, 0, '总记录数', cell_format)
+    worksheet.write(row, 1, total_count, cell_format)
+    worksheet.write(row, 2, 'A+级客户', cell_format)
+    worksheet.write(row, 3, aplus_count, cell_format)
+    worksheet.write(row, 4, 'A级客户', cell_format)
+    worksheet.write(row, 5, a_count, cell_format)
+    worksheet.write(row, 6, 'B级客户', cell_format)
+    worksheet.write(row, 7, b_count, cell_format)
+    worksheet.write(row, 8, 'C级客户', cell_format)
+    worksheet.write(row, 9, c_count, cell_format)
+    
+    # 页脚
+    row += 2
+    worksheet.write(row, 0, '生成时间', cell_format)
+    worksheet.write(row, 1, datetime.now().strftime('%Y年%m月%d日 %H:%M:%S'), cell_format)
+    
+    workbook.close()
+    
+    if progress:
+        progress(total_count)
+    return total_count
+
+# CSV导出的列，评分为整数、时间为ISO格式（UTC）、is_deleted为0/1，便于数据分析系统直接按类型读取
+# is_deleted随标记删除/恢复变化，导出任务按export_data_version复用，该版本须覆盖这些变更
+CSV_EXPORT_COLUMNS = [
+    'id', 'customer_name', 'customer_type', 'submitter_name', 'submitter_department',
+    'industry_score', 'business_type_score', 'influence_score', 'customer_type_score',
+    'logistics_scale_score', 'credit_score', 'profit_estimate_score', 'total_score',
+    'grade', 'created_at', 'is_deleted'
+]
+
+def iter_ratings_csv_gzip(start_datetime=None, end_datetime=None, grades=None, progress=None):
+    """按批读取评级记录，逐批生成gzip压缩的CSV数据块
+    
+    start_datetime/end_datetime为左闭右开的时间范围，grades为等级列表；
+    progress(已写入数)每批回调一次。
+    """
+    query = db.session.query(*[getattr(CustomerRating, column) for column in CSV_EXPORT_COLUMNS])
+    if start_datetime:
+        query = query.filter(CustomerRating.created_at >= start_datetime)
+    if end_datetime:
+        query = query.filter(CustomerRating.created_at < end_datetime)
+    if grades:
+        query = query.filter(CustomerRating.grade.in_(grades))
+    query = query.order_by(CustomerRating.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 输出gzip格式
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_EXPORT_COLUMNS)
+    
+    count = 0
+    for row in query:
+        writer.writerow(row[:-2] + (
+            row.created_at.strftime('%Y-%m-%dT%H:%M:%S') if row.created_at else '',
+            1 if row.is_deleted else 0
+        ))
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            chunk = compressor.compress(buffer.getvalue().encode('utf-8'))
+            buffer.seek(0)
+            buffer.truncate()
+            if progress:
+                progress(count)
+            if chunk:
+                yield chunk
+    
+    yield compressor.compress(buffer.getvalue().encode('utf-8')) + compressor.flush()
+    if progress:
+        progress(count)
+
+def write_ratings_csv(output_path, progress=None):
+    """将所有评级记录写入gzip压缩的CSV文件"""
+    with open(output_path, 'wb') as f:
+        for chunk in iter_ratings_csv_gzip(progress=progress):
+            f.write(chunk)
+
+EXPORT_FORMATS = {
+    'xlsx': {
+        'writer': write_ratings_workbook,
+        'suffix': '.xlsx',
+        'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'filename': '客户评级汇总表_{time}.xlsx'
+    },
+    'csv': {
+        'writer': write_ratings_csv,
+        'suffix': '.csv.gz',
+        'mimetype': 'application/gzip',
+        'filename': 'customer_ratings_{time}.csv.gz'
+    }
+}
+
+@app.route('/api/export/all', methods=['GET'])
+def export_all_ratings():
+    """导出所有客户评级记录到单个Excel文件
+    
+    当前数据版本已有异步导出生成的文件时直接返回该文件；否则写到临时文件后流式返回。
+    """
+    output_path = None
+    try:
+        if db.session.query(CustomerRating.id).first() is None:
+            return jsonify({
+                'success': False,
+                'error': '没有找到评级记录'
+            }), 404
+        
+        cached_job = find_export_job('xlsx', export_data_version())
+        if cached_job and cached_job['status'] == 'done':
+            return _send_export_artifact(cached_job)
+        
+        fd, output_path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        write_ratings_workbook(output_path)
         
         # 生成文件名
         now = datetime.now()
         filename = f'客户评级汇总表_{now.strftime("%Y%m%d_%H%M")}.xlsx'
         
+        # 打开后立即删除临时文件，文件句柄按块流式发送，关闭后磁盘空间即释放
+        output = open(output_path, 'rb')
+        os.remove(output_path)
         return send_file(
             output,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -890,12 +1974,268 @@ def export_all_ratings():
             download_name=filename
         )
         
+    except Exception as e:
+        if output_path and os.path.exists(output_path):
+            os.remove(output_path)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+@app.route('/api/export/csv', methods=['GET'])
+def export_ratings_csv():
+    """流式导出评级记录为gzip压缩的CSV，供数据分析系统批量拉取
+    
+    可选参数：start_date、end_date（YYYY-MM-DD，含当天），grade（逗号分隔，如 A+,A）。
+    """
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_datetime = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+        end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) if end_date else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': '日期格式应为YYYY-MM-DD'
+        }), 400
+    # 查询串中未编码的“A+”会被解码为“A ”，等级名不含空格，还原为加号
+    grades = [grade for grade in request.args.get('grade', '').replace(' ', '+').split(',') if grade]
+    
+    filename = EXPORT_FORMATS['csv']['filename'].format(time=datetime.now().strftime('%Y%m%d_%H%M'))
+    return Response(
+        stream_with_context(iter_ratings_csv_gzip(start_datetime, end_datetime, grades)),
+        mimetype=EXPORT_FORMATS['csv']['mimetype'],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+# ===========================================
+# 异步导出任务：提交后由有界线程池在后台生成文件，客户端轮询进度后下载
+# ===========================================
+
+_export_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+_export_jobs_lock = threading.Lock()
+_export_jobs = {}  # 任务ID -> 任务状态
+
+def clean_export_spool():
+    """清理此前运行遗留的过期导出文件（任务状态只保存在进程内，重启后无法再下载）"""
+    if not os.path.isdir(EXPORT_SPOOL_DIR):
+        return 0
+    removed = 0
+    for name in os.listdir(EXPORT_SPOOL_DIR):
+        path = os.path.join(EXPORT_SPOOL_DIR, name)
+        if os.path.isfile(path) and time.time() - os.path.getmtime(path) > EXPORT_JOB_TTL:
+            os.remove(path)
+            removed += 1
+    return removed
+
+clean_export_spool()
+
+def export_data_version():
+    """导出内容的数据版本
+    
+    评级记录的新增、标记删除、恢复和永久删除都会追加一条变更日志，日志自增ID不复用，
+    因此最新的变更ID即可标识导出内容是否变化。
+    """
+    return str(db.session.query(db.func.max(RatingChange.id)).scalar() or 0)
+
+def find_export_job(export_format, data_version):
+    """查找同一格式、同一数据版本下未失败的导出任务"""
+    with _export_jobs_lock:
+        for job in _export_jobs.values():
+            if (job['format'] == export_format and job['data_version'] == data_version
+                    and job['status'] != 'failed'):
+                return job
+    return None
+
+def _remove_export_job(job_id):
+    """移除导出任务及其文件（调用方持有锁）"""
+    job = _export_jobs.pop(job_id)
+    if job['path'] and os.path.exists(job['path']):
+        os.remove(job['path'])
+
+def _prune_export_jobs():
+    """清理超过保留时间的导出任务（调用方持有锁）"""
+    now = time.monotonic()
+    for job_id, job in list(_export_jobs.items()):
+        if job['finished_at'] is not None and now - job['finished_at'] > EXPORT_JOB_TTL:
+            _remove_export_job(job_id)
+
+def submit_export_job(export_format):
+    """提交导出任务，同一数据版本已有任务时直接复用
+    
+    返回 (任务, 是否新建)；排队任务已满时任务为None。
+    """
+    data_version = export_data_version()
+    with _export_jobs_lock:
+        _prune_export_jobs()
+        for job in _export_jobs.values():
+            if (job['format'] == export_format and job['data_version'] == data_version
+                    and job['status'] != 'failed'):
+                return job, False
+        
+        pending = sum(1 for job in _export_jobs.values() if job['status'] in ('queued', 'running'))
+        if pending >= EXPORT_MAX_PENDING:
+            return None, False
+        
+        job = {
+            'id': uuid.uuid4().hex,
+            'format': export_format,
+            'data_version': data_version,
+            'status': 'queued',  # queued / running / done / failed
+            'processed': 0,
+            'total': 0,
+            'error': None,
+            'path': None,
+            'filename': None,
+            'created_at': datetime.now(),
+            'finished_at': None
+        }
+        _export_jobs[job['id']] = job
+    
+    _export_executor.submit(_run_export_job, job)
+    return job, True
+
+def _run_export_job(job):
+    """在后台线程中生成导出文件：先写临时文件，完成后再改名，避免下载到不完整的文件"""
+    spec = EXPORT_FORMATS[job['format']]
+    path = os.path.join(EXPORT_SPOOL_DIR, job['id'] + spec['suffix'])
+    partial_path = path + '.part'
+    with app.app_context():
+        try:
+            job['status'] = 'running'
+            job['total'] = db.session.query(db.func.count(CustomerRating.id)).scalar()
+            
+            def update_progress(processed):
+                job['processed'] = processed
+            
+            os.makedirs(EXPORT_SPOOL_DIR, exist_ok=True)
+            spec['writer'](partial_path, update_progress)
+            os.replace(partial_path, path)
+            
+            job['path'] = path
+            job['filename'] = spec['filename'].format(time=datetime.now().strftime('%Y%m%d_%H%M'))
+            job['status'] = 'done'
+            print(f"✅ 导出任务 {job['id']} 完成，共 {job['processed']} 条记录")
+        except Exception as e:
+            db.session.rollback()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            job['error'] = str(e)
+            job['status'] = 'failed'
+            print(f"❌ 导出任务 {job['id']} 失败: {e}")
+    
+    with _export_jobs_lock:
+        job['finished_at'] = time.monotonic()
+        if job['status'] == 'done':
+            # 同一格式的旧版本文件已被取代，立即清理
+            for other_id, other in list(_export_jobs.items()):
+                if (other is not job and other['format'] == job['format']
+                        and other['status'] == 'done' and other['created_at'] < job['created_at']):
+                    _remove_export_job(other_id)
+
+def _export_job_info(job):
+    """导出任务的对外状态"""
+    total = max(job['total'], job['processed'])
+    info = {
+        'job_id': job['id'],
+        'format': job['format'],
+        'status': job['status'],
+        'processed': job['processed'],
+        'total': total,
+        'progress': 100 if job['status'] == 'done' else (job['processed'] * 100 // total if total else 0),
+        'error': job['error'],
+        'created_at': job['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
+        'download_url': None
+    }
+    if job['status'] == 'done':
+        info['download_url'] = f"/api/export/jobs/{job['id']}/download"
+    return info
+
+def _send_export_artifact(job):
+    """发送已生成的导出文件"""
+    spec = EXPORT_FORMATS[job['format']]
+    return send_file(
+        job['path'],
+        mimetype=spec['mimetype'],
+        as_attachment=True,
+        download_name=job['filename']
+    )
+
+@app.route('/api/export/jobs', methods=['POST'])
+def create_export_job():
+    """提交异步导出任务"""
+    try:
+        data = request.get_json(silent=True) or {}
+        export_format = data.get('format', 'xlsx')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f'不支持的导出格式: {export_format}'
+            }), 400
+        
+        if db.session.query(CustomerRating.id).first() is None:
+            return jsonify({
+                'success': False,
+                'error': '没有找到评级记录'
+            }), 404
+        
+        job, created = submit_export_job(export_format)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': '导出任务较多，请稍后再试'
+            }), 429
+        
+        return jsonify({
+            'success': True,
+            'data': _export_job_info(job)
+        }), 202 if created else 200
+        
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 400
 
+@app.route('/api/export/jobs/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """查询导出任务进度"""
+    job = _export_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': '导出任务不存在或已过期'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': _export_job_info(job)
+    })
+
+@app.route('/api/export/jobs/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """下载已完成的导出文件"""
+    job = _export_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': '导出任务不存在或已过期'
+        }), 404
+    
+    if job['status'] != 'done':
+        return jsonify({
+            'success': False,
+            'error': '导出文件尚未生成'
+        }), 409
+    
+    try:
+        return _send_export_artifact(job)
+    except FileNotFoundError:
+        return jsonify({
+            'success': False,
+            'error': '导出任务不存在或已过期'
+        }), 404
+
 def get_grade_color(grade):
     """获取等级对应的颜色"""
     colors = {
@@ -991,38 +2331,79 @@ def get_external_company_data():
         if not company_info or not company_info.company_name:
             return jsonify({'error': '未找到该企业信息'}), 404
             
-        # 获取资信评分映射
-        credit_mapping = external_service.get_credit_score_mapping(company_info)
-        
-        # 构建响应数据
-        response_data = {
-            'company_info': {
-                'company_name': company_info.company_name,
-                'legal_representative': company_info.legal_representative,
-                'registered_capital': company_info.registered_capital,
-                'establishment_date': company_info.establishment_date,
-                'business_status': company_info.business_status,
-                'industry': company_info.industry,
-                'credit_code': company_info.credit_code,
-                'address': company_info.address,
-                'business_scope': company_info.business_scope,
-                'years_established': company_info.years_established
-            },
-            'credit_mapping': credit_mapping,
-            'analysis': {
-                'enterprise_nature': company_info.enterprise_nature,
-                'dishonesty_record': company_info.dishonesty_record,
-                'penalty_record': company_info.penalty_record,
-                'payment_credit': company_info.payment_credit,
-                'peer_review': company_info.peer_review
-            }
-        }
-        
-        return jsonify(response_data)
+        return jsonify(build_company_data_response(company_info))
         
     except Exception as e:
         return jsonify({'error': f'获取企业数据失败: {str(e)}'}), 500
 
+BATCH_COMPANY_MAX = 500  # 批量查询单次最多的企业数
+# 批量查询中未能查询外部数据源的企业（不是未查到），客户端可稍后单独重试
+BATCH_RETRY_ERRORS = {
+    'rate_limited': '外部数据源调用频率受限，请稍后重试',
+    'unavailable': '外部数据源暂不可用，请稍后重试'
+}
+
+@app.route('/api/external-company-data/batch', methods=['POST'])
+def get_external_company_data_batch():
+    """批量获取外部企业数据，按查询完成顺序逐行返回（NDJSON，每行一家企业）"""
+    data = request.get_json(silent=True) or {}
+    company_names = data.get('company_names')
+    
+    if not isinstance(company_names, list) or not all(isinstance(name, str) for name in company_names):
+        return jsonify({'error': 'company_names 须为企业名称列表'}), 400
+    if not any(name.strip() for name in company_names):
+        return jsonify({'error': '请输入企业名称'}), 400
+    if len(company_names) > BATCH_COMPANY_MAX:
+        return jsonify({'error': f'单次最多查询 {BATCH_COMPANY_MAX} 家企业'}), 400
+    
+    def generate():
+        for query, company_info, status in external_service.search_company_info_batch(company_names):
+            if status in BATCH_RETRY_ERRORS:
+                line = {'query': query, 'found': False, 'status': status, 'error': BATCH_RETRY_ERRORS[status]}
+            elif status == 'not_found' or not company_info or not company_info.company_name:
+                line = {'query': query, 'found': False, 'status': 'not_found', 'error': '未找到该企业信息'}
+            else:
+                try:
+                    # 智能生成的企业信息不是查询结果，found为false，附带生成的数据供参考
+                    line = {'query': query, 'found': status != 'generated', 'status': status,
+                            **build_company_data_response(company_info)}
+                except Exception as e:
+                    line = {'query': query, 'found': False, 'status': 'error', 'error': f'获取企业数据失败: {str(e)}'}
+            yield json.dumps(line, ensure_ascii=False) + '\n'
+    
+    response = Response(generate(), mimetype='application/x-ndjson')
+    # 关闭反向代理缓冲，每家企业查询完成即送达客户端
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def build_company_data_response(company_info):
+    """企业信息、资信评分映射及分析结果（单个与批量查询接口共用）"""
+    # 获取资信评分映射
+    credit_mapping = external_service.get_credit_score_mapping(company_info)
+    
+    return {
+        'company_info': {
+            'company_name': company_info.company_name,
+            'legal_representative': company_info.legal_representative,
+            'registered_capital': company_info.registered_capital,
+            'establishment_date': company_info.establishment_date,
+            'business_status': company_info.business_status,
+            'industry': company_info.industry,
+            'credit_code': company_info.credit_code,
+            'address': company_info.address,
+            'business_scope': company_info.business_scope,
+            'years_established': company_info.years_established
+        },
+        'credit_mapping': credit_mapping,
+        'analysis': {
+            'enterprise_nature': company_info.enterprise_nature,
+            'dishonesty_record': company_info.dishonesty_record,
+            'penalty_record': company_info.penalty_record,
+            'payment_credit': company_info.payment_credit,
+            'peer_review': company_info.peer_review
+        }
+    }
+
 @app.route('/api/test-external-api', methods=['GET'])
 def test_external_api():
     """测试外部API连接"""
@@ -1073,8 +2454,8 @@ def company_autocomplete():
                 }
             })
         
-        # 执行搜索
-        results = autocomplete_service.search_companies(query, limit)
+        # 执行搜索：前缀补全命中足够时直接返回缓存结果，否则走完整搜索流程
+        results = autocomplete_service.autocomplete(query, limit)
         
         return jsonify({
             'success': True,
@@ -1116,8 +2497,8 @@ def add_company_suggestion():
                 'error': '企业名称不能为空'
             }), 400
         
-        # 添加到自动补全数据库
-        autocomplete_service.add_company(company_name)
+        # 添加到共享企业名录，各副本轮询后同步
+        record_company_catalog_changes([company_name])
         
         return jsonify({
             'success': True,
@@ -1138,38 +2519,8 @@ def department_autocomplete():
         query = request.args.get('q', '').strip()
         limit = int(request.args.get('limit', 8))
         
-        # 从数据库获取匹配的部门名称，按使用频率排序
-        if query:
-            # 模糊匹配查询，按使用频率排序
-            departments_query = db.session.query(
-                CustomerRating.submitter_department,
-                db.func.count(CustomerRating.submitter_department).label('usage_count')
-            ).filter(
-                CustomerRating.is_deleted == False,
-                CustomerRating.submitter_department.like(f'%{query}%'),
-                CustomerRating.submitter_department.isnot(None),
-                CustomerRating.submitter_department != ''
-            ).group_by(
-                CustomerRating.submitter_department
-            ).order_by(
-                db.func.count(CustomerRating.submitter_department).desc()
-            ).limit(limit)
-        else:
-            # 获取最常用的部门（如果没有查询词）
-            departments_query = db.session.query(
-                CustomerRating.submitter_department,
-                db.func.count(CustomerRating.submitter_department).label('usage_count')
-            ).filter(
-                CustomerRating.is_deleted == False,
-                CustomerRating.submitter_department.isnot(None),
-                CustomerRating.submitter_department != ''
-            ).group_by(
-                CustomerRating.submitter_department
-            ).order_by(
-                db.func.count(CustomerRating.submitter_department).desc()
-            ).limit(limit)
-        
-        departments = departments_query.all()
+        # 由内存中的部门使用次数索引查询，按使用频率排序
+        departments = department_service.search(query, limit)
         
         # 处理建议
         suggestions = []
@@ -1180,14 +2531,13 @@ def department_autocomplete():
             '运营部', '项目部', '财务部', '人事部'
         ]
         
-        # 先添加数据库中的部门
+        # 先添加历史记录中的部门
         for dept, count in departments:
-            if dept and dept.strip():  # 确保部门名不为空
-                suggestions.append({
-                    'name': dept.strip(),
-                    'count': count,
-                    'type': 'history'
-                })
+            suggestions.append({
+                'name': dept,
+                'count': count,
+                'type': 'history'
+            })
         
         # 处理预设部门
         existing_names = {s['name'] for s in suggestions}
@@ -1410,21 +2760,47 @@ def _is_query_more_specific(query, existing_name):
     
     return contains_main_words and has_additional_content
 
+def _claim_data_supplement(query):
+    """认领查询词的数据补充任务，同一查询词同时只有一个副本执行"""
+    now = datetime.utcnow()
+    try:
+        db.session.add(DataSupplementTask(query_text=query, status='running', started_at=now))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+    
+    # 已有任务：仅当其所在副本已退出，或上次补充已过重试间隔时重新认领
+    claimed = DataSupplementTask.query.filter(
+        DataSupplementTask.query_text == query,
+        db.or_(
+            db.and_(DataSupplementTask.status == 'running',
+                    DataSupplementTask.started_at < now - timedelta(seconds=SUPPLEMENT_STALE_SECONDS)),
+            db.and_(DataSupplementTask.status != 'running',
+                    DataSupplementTask.finished_at < now - timedelta(seconds=SUPPLEMENT_RETRY_SECONDS))
+        )
+    ).update({
+        'status': 'running',
+        'started_at': now,
+        'finished_at': None,
+        'added_count': 0
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
 def _trigger_intelligent_data_supplement(query):
     """触发智能数据补充机制"""
-    import threading
-    import time
-    
     # 估算补充时间（基于查询复杂度）
     estimated_time = _estimate_supplement_time(query)
     
-    # 启动后台数据补充任务
-    supplement_thread = threading.Thread(
-        target=_background_data_supplement, 
-        args=(query,)
-    )
-    supplement_thread.daemon = True
-    supplement_thread.start()
+    # 启动后台数据补充任务；其他副本已在补充同一查询词时不重复启动
+    if _claim_data_supplement(query):
+        supplement_thread = threading.Thread(
+            target=_background_data_supplement, 
+            args=(query,)
+        )
+        supplement_thread.daemon = True
+        supplement_thread.start()
     
     return jsonify({
         'success': True,
@@ -1463,33 +2839,40 @@ def _estimate_supplement_time(query):
 
 def _background_data_supplement(query):
     """后台数据补充任务"""
-    try:
-        import time
-        
-        # 模拟数据补充过程
-        print(f"🔄 开始为查询 '{query}' 补充相关企业数据...")
-        
-        # 根据查询关键词智能推断可能的企业
-        potential_companies = _generate_potential_companies(query)
-        
-        # 模拟网络请求和数据处理延迟
-        time.sleep(2)
-        
-        # 将新企业添加到数据库
-        added_count = 0
-        for company in potential_companies:
-            try:
-                autocomplete_service.add_company(company)
-                added_count += 1
+    with app.app_context():
+        status, added_count = 'failed', 0
+        try:
+            # 模拟数据补充过程
+            print(f"🔄 开始为查询 '{query}' 补充相关企业数据...")
+            
+            # 根据查询关键词智能推断可能的企业
+            potential_companies = _generate_potential_companies(query)
+            
+            # 模拟网络请求和数据处理延迟
+            time.sleep(2)
+            
+            # 将新企业写入共享企业名录（本副本立即更新索引，其他副本轮询同步）
+            added_count = record_company_catalog_changes(potential_companies)
+            for company in potential_companies:
                 print(f"✅ 已添加企业: {company}")
-                time.sleep(0.5)  # 模拟处理延迟
-            except Exception as e:
-                print(f"❌ 添加企业失败 {company}: {e}")
-        
-        print(f"🎉 数据补充完成！共添加 {added_count} 家相关企业")
-        
-    except Exception as e:
-        print(f"❌ 后台数据补充失败: {e}")
+            
+            status = 'done'
+            print(f"🎉 数据补充完成！共添加 {added_count} 家相关企业")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ 后台数据补充失败: {e}")
+        
+        try:
+            DataSupplementTask.query.filter_by(query_text=query).update({
+                'status': status,
+                'added_count': added_count,
+                'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ 更新数据补充任务状态失败: {e}")
 
 def _generate_potential_companies(query):
     """根据查询关键词生成潜在的企业名称"""
@@ -1625,13 +3008,16 @@ def get_data_supplement_status():
             'error': '查询参数不能为空'
         }), 400
     
-    # 重新搜索，看是否有新的结果
+    # 补充可能由其他副本完成，先同步共享名录再重新搜索，看是否有新的结果
+    sync_company_catalog(force=True)
     results = autocomplete_service.search_companies(query, limit=10)
+    task = db.session.get(DataSupplementTask, query)
     
     return jsonify({
         'success': True,
         'data': {
             'query': query,
+            'supplement_status': task.status if task else None,
             'has_new_results': len(results) > 0,
             'results_count': len(results),
             'message': f'已为"{query}"补充了相关企业数据' if len(results) > 0 else f'暂未找到"{query}"的相关企业'
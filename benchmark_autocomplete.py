@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+企业名称自动补全性能基准
+用IntelligentCompanyGenerator的行业/地区/人名词汇生成不同规模的企业名录，
+回放模拟的逐键输入查询流，统计索引构建耗时、内存占用及查询延迟p50/p99。
+
+用法:
+    python benchmark_autocomplete.py                         # 默认规模 10k,100k
+    python benchmark_autocomplete.py --sizes 10000,100000,1000000
+    python benchmark_autocomplete.py --save baseline.json    # 保存结果
+    python benchmark_autocomplete.py --baseline baseline.json  # 与基线对比，p99退化超出容差或超过上限时退出码为1
+    python benchmark_autocomplete.py --baseline baseline.json --max-p99-ms 30
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+
+from company_autocomplete_service import (
+    CompanyAutocompleteService, build_index_file, COMPANY_NAME_SUFFIXES
+)
+from intelligent_company_generator import IntelligentCompanyGenerator
+
+# 生成名称用的后缀（去掉地区括注，地区括注单独组合）
+NAME_SUFFIXES = ['有限公司', '股份有限公司', '集团有限公司', '科技有限公司', '有限责任公司']
+REGION_NOTES = [suffix for suffix in COMPANY_NAME_SUFFIXES if suffix.startswith('(')]
+
+
+def build_vocabulary(generator: IntelligentCompanyGenerator) -> dict:
+    """从智能企业数据生成器中提取生成名称所需的词汇"""
+    # 字号用人名和地址中的汉字随机组合
+    chars = set()
+    for name in generator.legal_representatives:
+        chars.update(name)
+    for districts in generator.region_mapping.values():
+        for district in districts:
+            chars.update(district)
+    for word in ('省', '市', '区', '县'):
+        chars.discard(word)
+    return {
+        'regions': sorted(generator.region_mapping),
+        'industries': sorted(generator.industry_mapping),
+        'chars': sorted(chars)
+    }
+
+
+def generate_catalogue(size: int, vocabulary: dict, rng: random.Random) -> list:
+    """生成size个互不重复的企业名称：[地区]字号行业后缀，部分带地区括注"""
+    names = set()
+    while len(names) < size:
+        brand = ''.join(rng.sample(vocabulary['chars'], rng.randint(2, 4)))
+        industry = rng.choice(vocabulary['industries'])
+        name = brand + industry
+        roll = rng.random()
+        if roll < 0.3:
+            name = rng.choice(vocabulary['regions']) + name
+        elif roll < 0.4:
+            name += rng.choice(REGION_NOTES)
+        names.add(name + rng.choice(NAME_SUFFIXES))
+    return sorted(names)
+
+
+def generate_query_stream(names: list, count: int, vocabulary: dict, rng: random.Random) -> list:
+    """模拟用户逐键输入：多数会话按热门程度挑选企业并逐字输入前缀，少数为错字或宽泛的行业词"""
+    queries = []
+    while len(queries) < count:
+        roll = rng.random()
+        if roll < 0.1:
+            # 宽泛查询，如“科技”“上海”
+            queries.append(rng.choice(vocabulary['industries'] + vocabulary['regions']))
+            continue
+
+        # 企业热度近似服从幂律分布，少数企业被反复查询；
+        # 热度排名映射到名录中打散的位置，避免热门企业集中在同一前缀下
+        rank = min(int(rng.paretovariate(1.2)) - 1, len(names) - 1)
+        target = names[rank * 7919 % len(names)]
+        typed = target[:rng.randint(3, min(10, len(target)))]
+        if roll < 0.2:
+            # 错字：替换其中一个字，走模糊匹配
+            pos = rng.randrange(len(typed))
+            typed = typed[:pos] + rng.choice(vocabulary['chars']) + typed[pos + 1:]
+        for end in range(2, len(typed) + 1):
+            queries.append(typed[:end])
+    return queries[:count]
+
+
+def current_rss_mb() -> float:
+    """当前进程的常驻内存（MB）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        # 非Linux系统只能取峰值
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+
+def measure(service: CompanyAutocompleteService, queries: list, limit: int) -> dict:
+    """回放查询流，返回延迟统计（毫秒）"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        service.autocomplete(query, limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3)
+    }
+
+
+def run_size(size: int, args, vocabulary: dict) -> dict:
+    rng = random.Random(args.seed + size)
+    names = generate_catalogue(size, vocabulary, rng)
+    queries = generate_query_stream(names, args.queries, vocabulary, rng)
+
+    gc.collect()
+    rss_before = current_rss_mb()
+    result = {'size': size, 'mode': args.mode, 'queries': len(queries)}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        if args.mode == 'mapped':
+            # 与生产环境一致：名录文件 + 预构建的内存映射索引
+            catalogue_path = os.path.join(workdir, 'company_catalogue.txt')
+            index_path = os.path.join(workdir, 'company_index.bin')
+            with open(catalogue_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(names) + '\n')
+            build_index_file(catalogue_path, index_path)
+            result['build_s'] = round(time.perf_counter() - start, 2)
+            result['index_mb'] = round(os.path.getsize(index_path) / 1024 / 1024, 1)
+
+            start = time.perf_counter()
+            service = CompanyAutocompleteService(catalogue_path=catalogue_path, index_path=index_path)
+            result['load_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        else:
+            service = CompanyAutocompleteService(catalogue_path=None)
+            service.add_companies(names, persist=False)
+            result['build_s'] = round(time.perf_counter() - start, 2)
+
+        gc.collect()
+        result['rss_mb'] = round(current_rss_mb() - rss_before, 1)
+
+        # 首次回放：前缀缓存为空；再次回放：缓存已预热
+        result['cold'] = measure(service, queries, args.limit)
+        result['warm'] = measure(service, queries, args.limit)
+        del service
+    return result
+
+
+def print_result(result: dict):
+    cold, warm = result['cold'], result['warm']
+    extra = f", 索引 {result['index_mb']}MB, 加载 {result['load_ms']}ms" if 'index_mb' in result else ''
+    print(f"📦 {result['size']:>9,} 家企业 ({result['mode']}): 构建 {result['build_s']}s{extra}, "
+          f"内存 +{result['rss_mb']}MB")
+    print(f"   冷启动  p50 {cold['p50_ms']:.3f}ms  p99 {cold['p99_ms']:.3f}ms  max {cold['max_ms']:.1f}ms")
+    print(f"   缓存预热 p50 {warm['p50_ms']:.3f}ms  p99 {warm['p99_ms']:.3f}ms  max {warm['max_ms']:.1f}ms")
+
+
+def compare_with_baseline(results: list, baseline_path: str, tolerance: float, max_p99_ms: float) -> bool:
+    """与基线对比p99延迟和构建耗时，任一超出容差返回False；p99延迟超过上限同样返回False
+
+    容差只能发现相对基线的退化，基线本身已经变慢时仍会通过，因此另设绝对上限。
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(item['size'], item['mode']): item for item in json.load(f)}
+
+    passed = True
+    for result in results:
+        for label in ('cold', 'warm'):
+            value = result[label]['p99_ms']
+            if value > max_p99_ms:
+                print(f"❌ {result['size']:,} {label} p99: {value}ms > 上限 {max_p99_ms}ms")
+                passed = False
+        base = baseline.get((result['size'], result['mode']))
+        if base is None:
+            continue
+        checks = [
+            ('build_s', result['build_s'], base['build_s']),
+            ('cold p99', result['cold']['p99_ms'], base['cold']['p99_ms']),
+            ('warm p99', result['warm']['p99_ms'], base['warm']['p99_ms'])
+        ]
+        for label, value, reference in checks:
+            if reference and value > reference * (1 + tolerance):
+                print(f"❌ {result['size']:,} {label}: {value} > 基线 {reference} (+{tolerance:.0%})")
+                passed = False
+    if passed:
+        print(f"✅ 未超出基线容差 ({tolerance:.0%})及p99上限 ({max_p99_ms}ms)")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='企业名称自动补全性能基准')
+    parser.add_argument('--sizes', default='10000,100000', help='名录规模，逗号分隔')
+    parser.add_argument('--queries', type=int, default=5000, help='每个规模回放的查询数')
+    parser.add_argument('--limit', type=int, default=8, help='每次返回的建议条数（与前端一致）')
+    parser.add_argument('--mode', choices=['mapped', 'memory'], default='mapped',
+                        help='mapped: 预构建索引+内存映射；memory: 纯内存索引')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='将结果保存为JSON')
+    parser.add_argument('--baseline', help='与之前保存的JSON结果对比')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允许的退化比例')
+    parser.add_argument('--max-p99-ms', type=float, default=50.0, help='与基线对比时p99延迟的绝对上限（毫秒）')
+    args = parser.parse_args()
+
+    vocabulary = build_vocabulary(IntelligentCompanyGenerator())
+    results = []
+    for size in (int(size) for size in args.sizes.split(',')):
+        result = run_size(size, args, vocabulary)
+        print_result(result)
+        results.append(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {args.save}")
+
+    if args.baseline and not compare_with_baseline(results, args.baseline, args.tolerance, args.max_p99_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
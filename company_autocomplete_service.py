@@ -3,16 +3,378 @@
 支持模糊搜索和智能建议
 """
 
+import os
 import re
+import sys
+import mmap
+import struct
 import difflib
-from typing import List, Dict
+import hashlib
+import heapq
+import operator
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from typing import List, Dict, Optional
 import json
 
 
+# 企业名录（文本，可追加）与预构建的二进制索引
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CATALOGUE_PATH = os.environ.get(
+    'COMPANY_CATALOGUE_PATH', os.path.join(_BASE_DIR, 'data', 'company_catalogue.txt'))
+DEFAULT_INDEX_PATH = os.environ.get(
+    'COMPANY_INDEX_PATH', os.path.join(_BASE_DIR, 'data', 'company_index.bin'))
+
+# 倒排表类别：字符二元组、单字符、名称长度
+POSTING_KINDS = ('gram', 'char', 'length')
+
+# 前缀补全：每个前缀缓存的补全条数，以及缓存的前缀数量上限
+COMPLETION_CACHE_K = 20
+COMPLETION_CACHE_MAX_PREFIXES = 50000
+
+# 热门企业推荐，同时作为前缀补全的排序依据
+POPULAR_COMPANIES = [
+    "阿里巴巴(中国)有限公司",
+    "腾讯科技(深圳)有限公司", 
+    "百度在线网络技术(北京)有限公司",
+    "小米科技有限责任公司",
+    "华为技术有限公司",
+    "京东科技信息技术有限公司",
+    "美团网络科技有限公司",
+    "字节跳动有限公司",
+    "中国工商银行股份有限公司",
+    "中国建设银行股份有限公司",
+    "招商银行股份有限公司",
+    "比亚迪股份有限公司",
+    "格力电器股份有限公司",
+    "美的集团股份有限公司",
+    "万科企业股份有限公司",
+    "碧桂园控股有限公司",
+    "新东方教育科技集团有限公司",
+    "恒瑞医药股份有限公司",
+    "苏宁易购集团股份有限公司",
+    "滴滴出行科技有限公司"
+]
+_POPULAR_RANK = {name: rank for rank, name in enumerate(POPULAR_COMPANIES)}
+
+# 企业名称中需移除的常见后缀和地区括注，按移除顺序排列
+COMPANY_NAME_SUFFIXES = [
+    '有限公司', '股份有限公司', '集团有限公司', '控股有限公司',
+    '科技有限公司', '投资有限公司', '发展有限公司', '管理有限公司',
+    '集团股份有限公司', '控股股份有限公司', '(中国)', '(集团)', '(控股)',
+    '(上海)', '(北京)', '(深圳)', '(广州)', '(天津)', '(西安)', '(南京)',
+    '(苏州)', '(杭州)', '(成都)', '(重庆)', '(武汉)', '(青岛)', '(厦门)'
+]
+
+# 特殊简称映射：名称中出现全称时，额外检索这些简称
+ABBREVIATION_KEYWORDS = {
+    '东京电子': ['东电', '东京', '电子'],
+    '应用材料': ['应材', '应用', '材料'],
+    '长鑫存储': ['长鑫', '存储'],
+    '中芯国际': ['中芯', '国际'],
+    '台积电': ['台积', '积电'],
+    '联发科': ['联发', '发科'],
+    '紫光展锐': ['紫光', '展锐'],
+    '海思半导体': ['海思', '半导体'],
+    '京东方': ['京东方', 'BOE'],
+    '华星光电': ['华星', '光电'],
+    '三星电子': ['三星', '电子'],
+    '英伟达': ['英伟达', 'NVIDIA'],
+    '高通': ['高通', 'Qualcomm'],
+    '英特尔': ['英特尔', 'Intel'],
+    '阿斯麦': ['阿斯麦', 'ASML']
+}
+
+_CHINESE_RUN = re.compile(r'[\u4e00-\u9fff]+')
+
+
+def _compile_suffix_pattern(suffixes: List[str]):
+    """把依次replace的后缀列表编译为一次扫描的正则
+    
+    包含更早后缀的后缀（如“股份有限公司”包含“有限公司”）在前者移除后不会再出现，直接剔除；
+    剩余后缀互不包含、首尾也不重叠时，各处匹配互不相交，一次扫描全部移除与依次replace结果相同。
+    """
+    effective = []
+    for suffix in suffixes:
+        if not any(earlier in suffix for earlier in effective):
+            effective.append(suffix)
+    for a in effective:
+        for b in effective:
+            if a != b and (b in a or any(a.endswith(b[:k]) for k in range(1, min(len(a), len(b))))):
+                raise ValueError(f'后缀 {a!r} 与 {b!r} 重叠，无法编译为一次扫描')
+    return re.compile('|'.join(map(re.escape, effective)))
+
+
+_SUFFIX_PATTERN = _compile_suffix_pattern(COMPANY_NAME_SUFFIXES)
+
+# 匹配度评分用的特殊简称及其全称
+_SCORE_ABBREVIATIONS = {
+    '东电': '东京电子',
+    '应材': '应用材料',
+    '长鑫': '长鑫存储',
+    '中芯': '中芯国际',
+    '台积': '台积电',
+    '联发': '联发科',
+    '紫光': '紫光展锐',
+    '海思': '海思半导体',
+    '华星': '华星光电',
+    '三星': '三星电子',
+}
+
+# 企业热度（被评级次数）按指数衰减，半衰期（天）
+POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('COMPANY_POPULARITY_HALF_LIFE_DAYS', '30'))
+# 热度以“前向衰减”累加：新记录权重随时间指数增长，比较时等价于旧记录衰减；
+# 权重超过该值时整体缩放一次，防止溢出
+_POPULARITY_RESCALE_LIMIT = 1e12
+
+# 模糊匹配只在查询至少这么长、且前缀补全没有结果时执行（输入框逐键触发，短查询的模糊结果没有意义）
+FUZZY_MIN_QUERY_LENGTH = 3
+# 模糊匹配每次查询最多展开的候选企业数，用完后返回已找到的最好结果，保证单次查询的延迟上限
+FUZZY_CANDIDATE_BUDGET = int(os.environ.get('COMPANY_FUZZY_CANDIDATE_BUDGET', '20000'))
+
+# 二进制索引文件格式：文件头 + 按顺序排列的各段（每段8字节对齐）
+_INDEX_MAGIC = b'CACIDX02'
+_INDEX_VERSION = 2
+_INDEX_SECTIONS = ('name_offsets', 'name_blob', 'name_lengths', 'term_offsets', 'term_blob', 'name_order') + tuple(
+    f'{kind}_{part}'
+    for kind in POSTING_KINDS
+    for part in ('key_offsets', 'key_blob', 'posting_offsets', 'postings')
+)
+# magic, version, 企业数, 已收录的名录字节数, 已收录名录内容的摘要, 各段(offset, length)
+_INDEX_HEADER = struct.Struct('<8sIIQ16s' + 'QQ' * len(_INDEX_SECTIONS))
+
+
+class _MemorySegment:
+    """可变的内存索引段，企业ID从first_id开始连续分配"""
+    
+    def __init__(self, first_id: int = 0):
+        self.first_id = first_id
+        # 下标 = 企业ID - first_id；删除的企业置为None，ID不复用
+        self.names = []
+        # 与names对齐的名称长度，模糊匹配计算上界时无需解码名称
+        self.lengths = array('I')
+        # 与names对齐的检索词文本（去后缀后的中文词组 + 特殊简称）
+        self.terms = []
+        self.company_ids = {}
+        # 按名称排序的有效企业名称，用于前缀补全
+        self.sorted_names = []
+        # 各类倒排表：键 -> 企业ID数组，ID按升序追加，天然有序
+        self.postings = {kind: {} for kind in POSTING_KINDS}
+
+
+class _MappedTable:
+    """内存映射的有序键表，二分查找键后返回对应的倒排数组切片"""
+    
+    def __init__(self, key_offsets, key_blob, posting_offsets, postings):
+        self._key_offsets = key_offsets
+        self._key_blob = key_blob
+        self._posting_offsets = posting_offsets
+        self._postings = postings
+    
+    def __len__(self):
+        return len(self._key_offsets) - 1
+    
+    def key(self, i: int) -> str:
+        return str(self._key_blob[self._key_offsets[i]:self._key_offsets[i + 1]], 'utf-8')
+    
+    def get(self, key: str):
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self.key(lo) == key:
+            return self._postings[self._posting_offsets[lo]:self._posting_offsets[lo + 1]]
+        return None
+    
+    def keys(self) -> List[str]:
+        return [self.key(i) for i in range(len(self))]
+
+
+class _MappedSegment:
+    """只读的内存映射索引段，同一台机器上的多个进程共享同一份页缓存"""
+    
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        fields = _INDEX_HEADER.unpack_from(self._mmap, 0)
+        magic, version, self.count, self.catalogue_size, self.catalogue_digest = fields[:5]
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            raise ValueError(f'无法识别的索引文件格式: {path}')
+        
+        buffer = memoryview(self._mmap)
+        sections = {}
+        for i, name in enumerate(_INDEX_SECTIONS):
+            offset, length = fields[5 + 2 * i], fields[6 + 2 * i]
+            view = buffer[offset:offset + length]
+            sections[name] = view if name.endswith('_blob') else view.cast('I')
+        
+        self._name_offsets = sections['name_offsets']
+        self._name_blob = sections['name_blob']
+        self.lengths = sections['name_lengths']
+        self._term_offsets = sections['term_offsets']
+        self._term_blob = sections['term_blob']
+        self._name_order = sections['name_order']
+        self.tables = {
+            kind: _MappedTable(*(sections[f'{kind}_{part}'] for part in
+                                 ('key_offsets', 'key_blob', 'posting_offsets', 'postings')))
+            for kind in POSTING_KINDS
+        }
+    
+    def name(self, company_id: int) -> str:
+        offsets = self._name_offsets
+        return str(self._name_blob[offsets[company_id]:offsets[company_id + 1]], 'utf-8')
+    
+    def terms(self, company_id: int) -> str:
+        offsets = self._term_offsets
+        return str(self._term_blob[offsets[company_id]:offsets[company_id + 1]], 'utf-8')
+    
+    def find(self, company_name: str) -> Optional[int]:
+        """在按名称排序的ID表上二分查找企业ID"""
+        order = self._name_order
+        lo = self._bisect_name(company_name)
+        if lo < len(order) and self.name(order[lo]) == company_name:
+            return order[lo]
+        return None
+    
+    def _bisect_name(self, target: str, lo: int = 0) -> int:
+        """在按名称排序的ID表上二分查找第一个名称不小于target的位置"""
+        order = self._name_order
+        hi = len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.name(order[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def prefix_ids(self, prefix: str):
+        """以prefix开头的企业ID，按名称顺序排列"""
+        start = self._bisect_name(prefix)
+        end = self._bisect_name(prefix + '\U0010ffff', start)
+        return self._name_order[start:end]
+    
+    def postings(self, kind: str, key):
+        return self.tables[kind].get(str(key))
+
+
+def _pack_strings(strings: List[str]) -> tuple:
+    """将字符串列表打包为 (偏移数组, UTF-8字节串)"""
+    offsets = array('I', [0])
+    blob = bytearray()
+    for text in strings:
+        blob += text.encode('utf-8')
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def write_index_file(path: str, segment: _MemorySegment, catalogue_size: int, catalogue_digest: bytes):
+    """将不含删除记录的内存索引段写为二进制索引文件（写临时文件后原子替换）"""
+    names = segment.names
+    sections = {}
+    sections['name_offsets'], sections['name_blob'] = _pack_strings(names)
+    sections['name_lengths'] = segment.lengths
+    sections['term_offsets'], sections['term_blob'] = _pack_strings(segment.terms)
+    sections['name_order'] = array('I', sorted(range(len(names)), key=names.__getitem__))
+    
+    for kind in POSTING_KINDS:
+        items = sorted((str(key), postings) for key, postings in segment.postings[kind].items())
+        sections[f'{kind}_key_offsets'], sections[f'{kind}_key_blob'] = _pack_strings(
+            [key for key, _ in items])
+        posting_offsets = array('I', [0])
+        all_postings = array('I')
+        for _, postings in items:
+            all_postings.extend(postings)
+            posting_offsets.append(len(all_postings))
+        sections[f'{kind}_posting_offsets'] = posting_offsets
+        sections[f'{kind}_postings'] = all_postings
+    
+    layout = []
+    payloads = []
+    offset = _INDEX_HEADER.size
+    for name in _INDEX_SECTIONS:
+        data = sections[name]
+        raw = data.tobytes() if isinstance(data, array) else data
+        offset = (offset + 7) & ~7
+        layout.extend((offset, len(raw)))
+        payloads.append((offset, raw))
+        offset += len(raw)
+    
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, len(names), catalogue_size,
+                                   catalogue_digest, *layout))
+        for section_offset, raw in payloads:
+            f.write(b'\0' * (section_offset - f.tell()))
+            f.write(raw)
+    os.replace(tmp_path, path)
+
+
+def _catalogue_digest(path: str, size: int) -> bytes:
+    """企业名录前size字节的摘要，用于判断索引收录的那部分名录是否被改写"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while size > 0:
+            chunk = f.read(min(size, 1 << 20))
+            if not chunk:
+                break
+            digest.update(chunk)
+            size -= len(chunk)
+    return digest.digest()
+
+
+def _parse_catalogue(data: bytes) -> List[tuple]:
+    """解析企业名录，返回 [(操作, 企业名称)]，操作为'+'(添加)或'-'(移除)"""
+    entries = []
+    for line in data.decode('utf-8').split('\n'):
+        name = line.strip()
+        if not name or name.startswith('#'):
+            continue
+        if name.startswith('-'):
+            entries.append(('-', name[1:].strip()))
+        elif name.startswith('+'):
+            # 以"#"、"-"、"+"开头的企业名称写入时加"+"前缀
+            entries.append(('+', name[1:].strip()))
+        else:
+            entries.append(('+', name))
+    return entries
+
+
+def _catalogue_line(op: str, name: str) -> str:
+    """名录记录对应的一行：移除记录以"-"开头，名称本身以"#"、"-"、"+"开头时加"+"前缀"""
+    if op == '-':
+        return f'-{name}'
+    return f'+{name}' if name[0] in '#-+' else name
+
+
+def build_index_file(catalogue_path: str, index_path: str) -> int:
+    """从企业名录构建二进制索引文件，返回收录的企业数"""
+    with open(catalogue_path, 'rb') as f:
+        data = f.read()
+    # 只收录完整的行，尚未写完的最后一行留给启动时的增量加载
+    covered = data.rfind(b'\n') + 1
+    
+    service = CompanyAutocompleteService(catalogue_path=None)
+    service._apply_catalogue_entries(_parse_catalogue(data[:covered]))
+    segment = service._compact_segment()
+    
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    write_index_file(index_path, segment, covered, hashlib.blake2b(data[:covered], digest_size=16).digest())
+    return len(segment.names)
+
+
 class CompanyAutocompleteService:
     """企业名称自动补全服务"""
     
-    def __init__(self):
+    def __init__(self, catalogue_path: Optional[str] = DEFAULT_CATALOGUE_PATH,
+                 index_path: Optional[str] = DEFAULT_INDEX_PATH):
         # 拼音到中文的映射表（仅包含常用企业名称关键词）
         self.pinyin_mapping = {
             'sanxing': '三星',
@@ -72,263 +434,551 @@ class CompanyAutocompleteService:
             'huaxing': '华星'
         }
         
-        # 常见企业名称数据库（可以从真实数据库或API获取）
-        self.company_database = [
-            # 知名互联网公司
-            "阿里巴巴(中国)有限公司",
-            "阿里巴巴集团控股有限公司", 
-            "腾讯科技(深圳)有限公司",
-            "腾讯控股有限公司",
-            "百度在线网络技术(北京)有限公司",
-            "百度网讯科技有限公司",
-            "字节跳动有限公司",
-            "字节跳动科技有限公司",
-            "小米科技有限责任公司",
-            "小米通讯技术有限公司",
-            "华为技术有限公司",
-            "华为投资控股有限公司",
-            "京东科技信息技术有限公司",
-            "京东数字科技控股股份有限公司",
-            "美团网络科技有限公司",
-            "美团点评网络科技有限公司",
-            "滴滴出行科技有限公司",
-            "北京嘀嘀无限科技发展有限公司",
-            
-            # 金融机构
-            "中国工商银行股份有限公司",
-            "中国建设银行股份有限公司", 
-            "中国农业银行股份有限公司",
-            "中国银行股份有限公司",
-            "招商银行股份有限公司",
-            "平安银行股份有限公司",
-            "中国人寿保险股份有限公司",
-            "中国平安保险(集团)股份有限公司",
-            "中国太平洋保险(集团)股份有限公司",
-            
-            # 制造业企业
-            "比亚迪股份有限公司",
-            "吉利汽车控股有限公司",
-            "中国石油化工股份有限公司",
-            "中国石油天然气股份有限公司",
-            "中国海洋石油有限公司",
-            "宝山钢铁股份有限公司",
-            "中国神华能源股份有限公司",
-            "格力电器股份有限公司",
-            "美的集团股份有限公司",
-            "海尔智家股份有限公司",
-            
-            # 国际知名企业
-            "三星(中国)投资有限公司",
-            "三星电子株式会社",
-            "三星半导体(中国)研究开发有限公司",
-            "三星显示(中国)有限公司",
-            "三星SDI环新(西安)动力电池有限公司",
-            "苹果电脑贸易(上海)有限公司",
-            "索尼(中国)有限公司",
-            "松下电器(中国)有限公司",
-            "LG电子(中国)有限公司",
-            "丰田汽车(中国)投资有限公司",
-            "本田技研工业(中国)投资有限公司",
-            "日产(中国)投资有限公司",
-            "大众汽车(中国)投资有限公司",
-            "宝马(中国)汽车贸易有限公司",
-            "奔驰(中国)汽车销售有限公司",
-            
-            # 房地产公司
-            "万科企业股份有限公司",
-            "碧桂园控股有限公司",
-            "中国恒大集团",
-            "融创中国控股有限公司",
-            "绿地控股集团股份有限公司",
-            "保利发展控股集团股份有限公司",
-            "龙湖集团控股有限公司",
-            
-            # 零售连锁
-            "沃尔玛(中国)投资有限公司",
-            "家乐福(中国)管理咨询服务有限公司",
-            "大润发投资有限公司",
-            "苏宁易购集团股份有限公司",
-            "国美零售控股有限公司",
-            
-            # 教育培训
-            "新东方教育科技集团有限公司",
-            "学而思教育科技有限公司",
-            "中公教育科技有限公司",
-            "达内时代科技集团有限公司",
-            
-            # 医药健康
-            "恒瑞医药股份有限公司",
-            "云南白药集团股份有限公司",
-            "同仁堂科技发展股份有限公司",
-            "片仔癀药业股份有限公司",
+        # 企业名录与二进制索引路径；catalogue_path为None时仅使用内存索引，不读写文件
+        self.catalogue_path = catalogue_path
+        self.index_path = index_path
+        
+        # 索引写操作锁（后台数据补充线程与请求线程可能并发写入）
+        self._write_lock = threading.Lock()
+        
+        # 构建空索引，再加载企业名录
+        self._build_search_index([])
+        if catalogue_path:
+            self._load_catalogue()
+    
+    @property
+    def company_database(self) -> List[str]:
+        """当前有效的企业名称列表"""
+        names = (self._name(company_id) for company_id in range(self._company_count()))
+        return [name for name in names if name is not None]
+        
+    def _build_search_index(self, companies: List[str] = None):
+        """在内存中重新构建搜索索引（字符二元组/单字符/名称长度倒排索引）"""
+        if companies is None:
+            companies = self.company_database
+        
+        with self._write_lock:
+            # 预构建的内存映射索引段（只读），以及其后追加企业所在的内存索引段
+            self._base = None
+            self._memory = _MemorySegment()
+            # 内存映射索引段中已删除的企业ID
+            self._deleted = set()
+            # 前缀 -> 排名前COMPLETION_CACHE_K的补全企业ID
+            self._completion_cache = {}
+            # 每次增删企业后递增，用于判断查询期间索引是否变化
+            self._index_version = 0
+            self._reset_popularity()
             
-            # 半导体和电子设备企业
-            "长鑫存储技术有限公司",
-            "合肥长鑫集成电路有限公司",
-            "中芯国际集成电路制造有限公司",
-            "华虹半导体有限公司",
-            "紫光集团有限公司",
-            "紫光展锐(上海)科技有限公司",
-            "海思半导体有限公司",
-            "中兴通讯股份有限公司",
-            "京东方科技集团股份有限公司",
-            "天马微电子股份有限公司",
-            "TCL华星光电技术有限公司",
-            "维信诺科技股份有限公司",
-            "深圳市汇顶科技股份有限公司",
-            "兆易创新科技集团股份有限公司",
-            "北京君正集成电路股份有限公司",
-            "全志科技股份有限公司",
-            "瑞芯微电子股份有限公司",
-            "士兰微电子股份有限公司",
-            "韦尔股份有限公司",
-            "圣邦微电子(北京)股份有限公司",
-            "卓胜微电子股份有限公司",
-            "晶晨半导体(上海)股份有限公司",
-            "澜起科技股份有限公司",
-            "乐鑫科技(上海)股份有限公司",
-            "芯原微电子(上海)股份有限公司",
-            "恒玄科技(上海)股份有限公司",
-            "晶丰明源半导体股份有限公司",
-            "思瑞浦微电子科技(苏州)股份有限公司",
-            "芯海科技(深圳)股份有限公司",
-            "新洁能股份有限公司",
-            "富满微电子集团股份有限公司",
-            "上海贝岭股份有限公司",
-            "华润微电子有限公司",
-            "扬杰科技股份有限公司",
-            "捷捷微电子股份有限公司",
-            "斯达半导体股份有限公司",
-            "立昂微电子股份有限公司",
-            "通富微电子股份有限公司",
-            "华天科技股份有限公司",
-            "长电科技股份有限公司",
-            "晶方科技股份有限公司",
-            "太极实业股份有限公司",
-            "深南电路股份有限公司",
-            "沪电股份有限公司",
-            "景嘉微电子股份有限公司",
+            self._append_companies(companies)
+    
+    def _load_catalogue(self):
+        """加载企业名录：映射预构建的二进制索引，只解析索引之后追加的名录记录"""
+        catalogue_size = os.path.getsize(self.catalogue_path) if os.path.exists(self.catalogue_path) else 0
+        
+        base = None
+        if self.index_path:
+            try:
+                base = self._open_index(catalogue_size)
+            except (OSError, ValueError, struct.error) as e:
+                print(f"⚠️ 企业索引文件不可用，改为内存索引: {e}")
+                base = None
+        
+        offset = base.catalogue_size if base is not None else 0
+        entries = []
+        if catalogue_size > offset:
+            with open(self.catalogue_path, 'rb') as f:
+                f.seek(offset)
+                entries = _parse_catalogue(f.read())
+        
+        with self._write_lock:
+            self._base = base
+            self._memory = _MemorySegment(base.count if base is not None else 0)
+            self._deleted = set()
+            self._completion_cache = {}
+            self._index_version += 1
+            self._reset_popularity()
+            self._apply_catalogue_entries(entries)
+    
+    def _open_index(self, catalogue_size: int) -> Optional[_MappedSegment]:
+        """映射预构建的索引；索引缺失、格式不符或与名录内容不一致时重新构建"""
+        base = None
+        if os.path.exists(self.index_path):
+            try:
+                base = _MappedSegment(self.index_path)
+            except (ValueError, struct.error) as e:
+                print(f"⚠️ 企业索引文件格式不符，重新构建: {e}")
+        # 名录被重写（而非追加）过时，索引收录的那部分名录内容已变化，即使长度没有变短
+        if base is not None and (base.catalogue_size > catalogue_size or
+                                 _catalogue_digest(self.catalogue_path, base.catalogue_size) != base.catalogue_digest):
+            print("⚠️ 企业名录已被改写，重新构建企业索引")
+            base = None
+        if base is None and catalogue_size:
+            build_index_file(self.catalogue_path, self.index_path)
+            base = _MappedSegment(self.index_path)
+        return base
+    
+    def _apply_catalogue_entries(self, entries: List[tuple]):
+        """按顺序应用名录记录，连续的添加记录合并为一次批量追加"""
+        pending = []
+        for op, name in entries:
+            if op == '+':
+                pending.append(name)
+                continue
+            if pending:
+                self._append_companies(pending)
+                pending = []
+            self._remove_company(name)
+        if pending:
+            self._append_companies(pending)
+    
+    def _append_to_catalogue(self, lines: List[str]):
+        """将新增/移除记录追加到企业名录，重启后仍然有效"""
+        if not self.catalogue_path or not lines:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.catalogue_path)), exist_ok=True)
+            with open(self.catalogue_path, 'a+b') as f:
+                prefix = b''
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        prefix = b'\n'
+                f.write(prefix + ''.join(line + '\n' for line in lines).encode('utf-8'))
+        except OSError as e:
+            print(f"⚠️ 企业名录写入失败: {e}")
+    
+    def _compact_segment(self) -> _MemorySegment:
+        """返回只包含有效企业、ID从0连续编号的内存索引段"""
+        segment = self._memory
+        if self._base is None and segment.first_id == 0 and None not in segment.names:
+            return segment
+        
+        service = CompanyAutocompleteService(catalogue_path=None)
+        service._append_companies(self.company_database)
+        return service._memory
+    
+    def _company_count(self) -> int:
+        """已分配的企业ID数量（含已删除）"""
+        return self._memory.first_id + len(self._memory.names)
+    
+    def _name(self, company_id: int) -> Optional[str]:
+        """按企业ID取名称，已删除返回None"""
+        segment = self._memory
+        if company_id >= segment.first_id:
+            return segment.names[company_id - segment.first_id]
+        if company_id in self._deleted:
+            return None
+        return self._base.name(company_id)
+    
+    def _name_length(self, company_id: int) -> int:
+        """按企业ID取名称长度"""
+        segment = self._memory
+        if company_id >= segment.first_id:
+            return segment.lengths[company_id - segment.first_id]
+        return self._base.lengths[company_id]
+    
+    def _terms(self, company_id: int) -> str:
+        """按企业ID取检索词文本"""
+        segment = self._memory
+        if company_id >= segment.first_id:
+            return segment.terms[company_id - segment.first_id]
+        if company_id in self._deleted:
+            return ''
+        return self._base.terms(company_id)
+    
+    def _find_id(self, company_name: str) -> Optional[int]:
+        """按名称查找有效企业ID"""
+        company_id = self._memory.company_ids.get(company_name)
+        if company_id is None and self._base is not None:
+            company_id = self._base.find(company_name)
+            if company_id in self._deleted:
+                return None
+        return company_id
+    
+    def _postings(self, kind: str, key) -> list:
+        """取某个键在各索引段中的倒排表，按ID升序排列的非空片段列表"""
+        parts = []
+        if self._base is not None:
+            base_postings = self._base.postings(kind, key)
+            if base_postings:
+                parts.append(base_postings)
+        memory_postings = self._memory.postings[kind].get(key)
+        if memory_postings:
+            parts.append(memory_postings)
+        return parts
+    
+    @staticmethod
+    def _posting_contains(parts: list, company_id: int) -> bool:
+        """二分查找企业ID是否在分段倒排表中"""
+        for part in parts:
+            if part[-1] >= company_id:
+                pos = bisect_left(part, company_id)
+                return part[pos] == company_id
+        return False
+    
+    def _length_keys(self) -> set:
+        """索引中出现过的全部名称长度"""
+        lengths = set(self._memory.postings['length'])
+        if self._base is not None:
+            lengths.update(int(key) for key in self._base.tables['length'].keys())
+        return lengths
+    
+    def _append_companies(self, companies: List[str]) -> List[str]:
+        """为新企业分配ID并批量追加到内存索引段，只触及新企业自身的倒排表，返回实际新增的企业"""
+        segment = self._memory
+        new_postings = {kind: defaultdict(list) for kind in POSTING_KINDS}
+        added = []
+        skipped = 0
+        
+        for company in companies:
+            if not company:
+                continue
+            # 名录按行存储，含换行的名称无法持久化
+            if '\n' in company or '\r' in company:
+                skipped += 1
+                continue
+            if self._find_id(company) is not None:
+                continue
             
-            # 半导体设备企业
-            "北方华创科技集团股份有限公司",
-            "中微半导体设备(上海)股份有限公司",
-            "拓荆科技股份有限公司",
-            "华海清科股份有限公司",
-            "盛美上海半导体设备股份有限公司",
-            "芯源微半导体设备(上海)股份有限公司",
-            "万业企业股份有限公司",
-            "晶盛机电股份有限公司",
-            "长川科技股份有限公司",
-            "精测电子科技股份有限公司",
-            "华峰测控技术股份有限公司",
-            "奥普特科技股份有限公司",
+            company_id = segment.first_id + len(segment.names)
+            terms = self._search_terms(company)
+            segment.names.append(company)
+            segment.lengths.append(len(company))
+            segment.terms.append(terms)
+            segment.company_ids[company] = company_id
             
-            # 国际半导体企业
-            "台湾积体电路制造股份有限公司",
-            "联发科技股份有限公司",
-            "联华电子股份有限公司",
-            "日月光半导体制造股份有限公司",
-            "英特尔(中国)有限公司",
-            "英伟达(上海)企业管理有限公司",
-            "高通(中国)控股有限公司",
-            "博通集成电路(上海)股份有限公司",
-            "美满电子科技(上海)有限公司",
-            "新思科技(上海)有限公司",
-            "楷登电子科技(上海)有限公司",
-            "应用材料(中国)有限公司",
-            "泛林集团(上海)贸易有限公司",
-            "科磊半导体技术(上海)有限公司",
-            "东京电子(上海)有限公司",
-            "阿斯麦(上海)贸易有限公司",
-            "爱德万测试技术(北京)有限公司",
+            for kind, keys in self._company_keys(company, terms):
+                keyed_ids = new_postings[kind]
+                for key in keys:
+                    keyed_ids[key].append(company_id)
+            added.append(company)
+        
+        # 新ID均大于已有ID，直接追加即可保持倒排表有序
+        for kind, keyed_ids in new_postings.items():
+            index = segment.postings[kind]
+            for key, company_ids in keyed_ids.items():
+                postings = index.get(key)
+                if postings is None:
+                    index[key] = array('I', company_ids)
+                else:
+                    postings.extend(company_ids)
+        
+        if len(added) > 32:
+            segment.sorted_names.extend(added)
+            segment.sorted_names.sort()
+        else:
+            for company in added:
+                insort(segment.sorted_names, company)
+        missing = self._company_count() - len(self._popularity)
+        if missing > 0:
+            self._popularity.frombytes(bytes(missing * self._popularity.itemsize))
+        for company in added:
+            self._update_completions(segment.company_ids[company])
+        if added:
+            self._index_version += 1
+        if skipped:
+            print(f"⚠️ 跳过 {skipped} 个含换行、无法写入企业名录的企业名称")
+        
+        return added
+    
+    def _remove_company(self, company_name: str) -> bool:
+        """移除企业：内存段从其自身的倒排表中删除ID，映射段记为已删除"""
+        company_id = self._find_id(company_name)
+        if company_id is None:
+            return False
+        
+        self._invalidate_completions(company_name, company_id)
+        self._index_version += 1
+        self._popularity[company_id] = 0.0
+        self._popular_ids.discard(company_id)
+        segment = self._memory
+        if company_id < segment.first_id:
+            self._deleted.add(company_id)
+            return True
+        
+        slot = company_id - segment.first_id
+        for kind, keys in self._company_keys(company_name, segment.terms[slot]):
+            for key in keys:
+                self._discard_posting(segment.postings[kind], key, company_id)
+        del segment.company_ids[company_name]
+        del segment.sorted_names[bisect_left(segment.sorted_names, company_name)]
+        segment.names[slot] = None
+        segment.terms[slot] = ''
+        return True
+    
+    @staticmethod
+    def _discard_posting(index: dict, key, company_id: int):
+        """从有序倒排表中删除单个企业ID"""
+        postings = index.get(key)
+        if postings is None:
+            return
+        pos = bisect_left(postings, company_id)
+        if pos < len(postings) and postings[pos] == company_id:
+            del postings[pos]
+        if not postings:
+            del index[key]
+    
+    def _completion_key(self, company_id: int) -> tuple:
+        """前缀补全排序键：评级热度高的优先，其次是热门企业推荐，再次名称越短越靠前"""
+        name = self._name(company_id)
+        return (-self._popularity[company_id], _POPULAR_RANK.get(name, len(POPULAR_COMPANIES)), len(name), name)
+    
+    def _reset_popularity(self):
+        """清空企业热度，热度数组与企业ID对齐"""
+        self._popularity = array('d', bytes(8 * self._company_count()))
+        # 热度大于0的企业ID，热门推荐只需在其中排序
+        self._popular_ids = set()
+        self._popularity_epoch = time.time()
+    
+    def _popularity_weight(self, timestamp: float) -> float:
+        """记录在timestamp时的前向衰减权重"""
+        half_life = POPULARITY_HALF_LIFE_DAYS * 86400
+        return 2.0 ** ((timestamp - self._popularity_epoch) / half_life)
+    
+    def record_usage(self, company_name: str, timestamp: float = None) -> bool:
+        """记录一次企业被评级，提升其热度；企业不在数据库中时返回False"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._write_lock:
+            company_id = self._find_id(company_name)
+            if company_id is None:
+                return False
             
-            # 存储器企业
-            "长江存储科技有限责任公司",
-            "福建晋华集成电路有限公司",
-            "兆易创新科技集团股份有限公司",
-            "江波龙电子股份有限公司",
-            "佰维存储科技股份有限公司",
-            "东芯半导体股份有限公司",
-            "普冉半导体(上海)股份有限公司",
-            "聚辰半导体股份有限公司",
-            "恒烁半导体(合肥)股份有限公司",
-        ]
-        
-        # 构建搜索索引
-        self._build_search_index()
-        
-    def _build_search_index(self):
-        """构建搜索索引"""
-        self.search_index = {}
-        
-        for company in self.company_database:
-            # 提取关键词
-            keywords = self._extract_keywords(company)
+            weight = self._popularity_weight(timestamp)
+            if weight > _POPULARITY_RESCALE_LIMIT:
+                # 整体缩放不改变热度的相对顺序，已缓存的补全结果依然有效
+                popularity = self._popularity
+                for popular_id in self._popular_ids:
+                    popularity[popular_id] /= weight
+                self._popularity_epoch = timestamp
+                weight = 1.0
             
-            for keyword in keywords:
-                if keyword not in self.search_index:
-                    self.search_index[keyword] = []
-                if company not in self.search_index[keyword]:
-                    self.search_index[keyword].append(company)
+            self._popularity[company_id] += weight
+            self._popular_ids.add(company_id)
+            self._update_completions(company_id)
+        return True
     
-    def _extract_keywords(self, company_name: str) -> List[str]:
-        """从企业名称中提取关键词"""
-        keywords = []
+    def popularity(self, company_name: str) -> float:
+        """企业当前的热度（衰减后的评级次数）"""
+        company_id = self._find_id(company_name)
+        if company_id is None:
+            return 0.0
+        return self._popularity[company_id] / self._popularity_weight(time.time())
+    
+    def export_popularity(self) -> tuple:
+        """导出企业热度用于保存检查点，返回(衰减基准时间, {企业名称: 热度})"""
+        with self._write_lock:
+            popularity = self._popularity
+            values = {}
+            for company_id in self._popular_ids:
+                name = self._name(company_id)
+                if name is not None:
+                    values[name] = popularity[company_id]
+            return self._popularity_epoch, values
+    
+    def restore_popularity(self, epoch: float, values: Dict[str, float]) -> int:
+        """以检查点中的企业热度替换当前热度，返回恢复的企业数；不在数据库中的企业忽略"""
+        with self._write_lock:
+            self._reset_popularity()
+            # 检查点的热度以其衰减基准时间累加，换算到当前的基准时间
+            scale = self._popularity_weight(epoch)
+            restored = 0
+            for name, value in values.items():
+                company_id = self._find_id(name)
+                if company_id is None or value <= 0:
+                    continue
+                self._popularity[company_id] = value * scale
+                self._popular_ids.add(company_id)
+                restored += 1
+            # 热度整体变化，已缓存的补全结果顺序失效
+            self._completion_cache = {}
+            self._index_version += 1
+        return restored
+    
+    def _prefix_ids(self, prefix: str):
+        """以prefix开头的有效企业ID"""
+        if self._base is not None:
+            deleted = self._deleted
+            for company_id in self._base.prefix_ids(prefix):
+                if company_id not in deleted:
+                    yield company_id
+        segment = self._memory
+        names = segment.sorted_names
+        pos = bisect_left(names, prefix)
+        while pos < len(names) and names[pos].startswith(prefix):
+            yield segment.company_ids[names[pos]]
+            pos += 1
+    
+    def _update_completions(self, company_id: int):
+        """新增企业或其热度变化后，更新其各级前缀已缓存的补全结果"""
+        cache = self._completion_cache
+        if not cache:
+            return
+        name = self._name(company_id)
+        key = self._completion_key(company_id)
+        for end in range(1, len(name) + 1):
+            cached = cache.get(name[:end])
+            if cached is None:
+                continue
+            # 缓存不足K条说明该前缀下的企业已全部在内，否则只需与第K名比较
+            if (len(cached) >= COMPLETION_CACHE_K and company_id not in cached
+                    and key >= self._completion_key(cached[-1])):
+                continue
+            # 整体替换列表，不修改正在被读取的旧列表
+            updated = [company for company in cached if company != company_id] + [company_id]
+            updated.sort(key=self._completion_key)
+            cache[name[:end]] = updated[:COMPLETION_CACHE_K]
+    
+    def _invalidate_completions(self, company_name: str, company_id: int):
+        """移除企业后丢弃包含它的前缀缓存，下次查询时重新计算"""
+        cache = self._completion_cache
+        for end in range(1, len(company_name) + 1):
+            cached = cache.get(company_name[:end])
+            if cached is not None and company_id in cached:
+                del cache[company_name[:end]]
+    
+    def complete_prefix(self, prefix: str, limit: int = 10) -> List[str]:
+        """返回以prefix开头的企业名称，按热门程度排序
         
-        # 移除常见后缀
-        suffixes = ['有限公司', '股份有限公司', '集团有限公司', '控股有限公司', 
-                   '科技有限公司', '投资有限公司', '发展有限公司', '管理有限公司',
-                   '集团股份有限公司', '控股股份有限公司', '(中国)', '(集团)', '(控股)',
-                   '(上海)', '(北京)', '(深圳)', '(广州)', '(天津)', '(西安)', '(南京)',
-                   '(苏州)', '(杭州)', '(成都)', '(重庆)', '(武汉)', '(青岛)', '(厦门)']
-        
-        clean_name = company_name
-        for suffix in suffixes:
-            clean_name = clean_name.replace(suffix, '')
-        
-        # 添加特殊的简称映射
-        abbreviation_mappings = {
-            '东京电子': ['东电', '东京', '电子'],
-            '应用材料': ['应材', '应用', '材料'],
-            '长鑫存储': ['长鑫', '存储'],
-            '中芯国际': ['中芯', '国际'],
-            '台积电': ['台积', '积电'],
-            '联发科': ['联发', '发科'],
-            '紫光展锐': ['紫光', '展锐'],
-            '海思半导体': ['海思', '半导体'],
-            '京东方': ['京东方', 'BOE'],
-            '华星光电': ['华星', '光电'],
-            '三星电子': ['三星', '电子'],
-            '英伟达': ['英伟达', 'NVIDIA'],
-            '高通': ['高通', 'Qualcomm'],
-            '英特尔': ['英特尔', 'Intel'],
-            '阿斯麦': ['阿斯麦', 'ASML']
-        }
+        每个前缀的前K名在首次查询时由排序数组上的二分区间求出并缓存，
+        之后同一前缀只需一次字典查找；企业增删时只更新该企业自身的各级前缀。
+        """
+        if not prefix:
+            return []
+        if limit > COMPLETION_CACHE_K:
+            top = heapq.nsmallest(limit, self._prefix_ids(prefix), key=self._completion_key)
+            return [self._name(company_id) for company_id in top]
         
-        # 检查是否有特殊简称映射
-        for full_name, abbreviations in abbreviation_mappings.items():
+        cache = self._completion_cache
+        top = cache.get(prefix)
+        if top is None:
+            version = self._index_version
+            top = heapq.nsmallest(COMPLETION_CACHE_K, self._prefix_ids(prefix), key=self._completion_key)
+            with self._write_lock:
+                # 计算期间索引有变化时不缓存本次结果，避免漏掉新增企业
+                if version == self._index_version:
+                    if len(cache) >= COMPLETION_CACHE_MAX_PREFIXES:
+                        cache.clear()
+                    cache[prefix] = top
+        return [self._name(company_id) for company_id in top[:limit]]
+    
+    def autocomplete(self, query: str, limit: int = 10) -> List[Dict]:
+        """输入框自动补全：前缀补全已足够时直接返回，否则走完整搜索流程
+        
+        模糊匹配只在查询足够长且没有任何前缀补全时执行：有前缀补全说明用户正在输入
+        一个已有的名称，精确和关键词匹配即可补足结果。
+        """
+        query = query.strip()
+        completions = []
+        if len(query) >= 2:
+            completions = self.complete_prefix(query, limit)
+            if len(completions) >= limit:
+                return [{'name': company, 'match_type': 'prefix', 'score': 100}
+                        for company in completions]
+        fuzzy = len(query) >= FUZZY_MIN_QUERY_LENGTH and not completions
+        return self.search_companies(query, limit, fuzzy=fuzzy)
+    
+    def _company_keys(self, company: str, terms: str):
+        """企业在各类倒排表中的键，返回[(类别, 键集合)]"""
+        company_lower = company.lower()
+        return (
+            ('gram', self._grams(company_lower + '\n' + terms.lower())),
+            ('char', set(company_lower)),
+            ('length', (len(company),))
+        )
+    
+    @staticmethod
+    def _grams(text: str) -> set:
+        """切分字符二元组（跨越换行分隔符的二元组不参与索引）"""
+        grams = set(map(operator.add, text, text[1:]))
+        if '\n' in text:
+            grams = {gram for gram in grams if '\n' not in gram}
+        return grams
+    
+    def _iter_candidates(self, term: str):
+        """对term的所有二元组倒排表求交集，按ID升序惰性产出候选企业ID"""
+        grams = self._grams(term.lower())
+        if not grams:
+            return
+        
+        postings = []
+        for gram in grams:
+            parts = self._postings('gram', gram)
+            if not parts:
+                return
+            postings.append(parts)
+        
+        # 以最短的倒排表驱动，其余倒排表二分查找判断是否包含
+        postings.sort(key=lambda parts: sum(len(part) for part in parts))
+        head, rest = postings[0], postings[1:]
+        deleted = self._deleted
+        for part in head:
+            for company_id in part:
+                if deleted and company_id in deleted:
+                    continue
+                for parts in rest:
+                    if not self._posting_contains(parts, company_id):
+                        break
+                else:
+                    yield company_id
+    
+    def _clean_company_name(self, company_name: str) -> str:
+        """移除企业名称中的常见后缀和地区括注"""
+        clean_name = _SUFFIX_PATTERN.sub('', company_name)
+        if _SUFFIX_PATTERN.search(clean_name):
+            # 移除后拼接出了新的后缀（极少见），按原顺序逐个replace以保持原有结果
+            clean_name = company_name
+            for suffix in COMPANY_NAME_SUFFIXES:
+                clean_name = clean_name.replace(suffix, '')
+        return clean_name
+    
+    def _match_abbreviations(self, clean_name: str) -> List[str]:
+        """查找名称中出现的特殊简称映射"""
+        keywords = []
+        for full_name, abbreviations in ABBREVIATION_KEYWORDS.items():
             if full_name in clean_name:
                 keywords.extend(abbreviations)
+        return keywords
+    
+    def _search_terms(self, company_name: str) -> str:
+        """生成企业的检索词文本
         
-        # 提取中文字符
-        chinese_chars = re.findall(r'[\u4e00-\u9fff]+', clean_name)
+        关键词匹配只关心查询是否为某个关键词的子串，而2-4字子串都包含在
+        所属的完整中文词组中，因此只需保留完整词组和特殊简称，用换行分隔。
+        """
+        clean_name = self._clean_company_name(company_name)
+        terms = dict.fromkeys(self._match_abbreviations(clean_name))
+        terms.update(dict.fromkeys(chars for chars in _CHINESE_RUN.findall(clean_name) if len(chars) >= 2))
+        return '\n'.join(terms)
+    
+    def _extract_keywords(self, company_name: str) -> List[str]:
+        """从企业名称中提取关键词"""
+        clean_name = self._clean_company_name(company_name)
         
-        for chars in chinese_chars:
+        # 添加特殊的简称映射（dict保持首次出现的顺序并去重）
+        keywords = dict.fromkeys(self._match_abbreviations(clean_name))
+        
+        # 提取中文字符
+        for chars in _CHINESE_RUN.findall(clean_name):
             # 添加完整词组
             if len(chars) >= 2:
-                keywords.append(chars)
+                keywords[chars] = None
             
             # 添加2-4字的子串
-            for i in range(len(chars)):
-                for j in range(i + 2, min(i + 5, len(chars) + 1)):
-                    substring = chars[i:j]
-                    if len(substring) >= 2:
-                        keywords.append(substring)
+            for size in range(2, 5):
+                for i in range(len(chars) - size + 1):
+                    keywords[chars[i:i + size]] = None
         
-        return keywords
+        return list(keywords)
     
-    def search_companies(self, query: str, limit: int = 10) -> List[Dict]:
-        """搜索企业名称"""
+    def find_by_keyword(self, keyword: str) -> List[str]:
+        """查找检索词包含keyword的企业（关键词匹配阶段的候选集）"""
+        return [self._name(company_id)
+                for company_id in self._iter_candidates(keyword)
+                if keyword in self._terms(company_id)]
+    
+    def search_companies(self, query: str, limit: int = 10, fuzzy: bool = True) -> List[Dict]:
+        """搜索企业名称，fuzzy为False时跳过模糊匹配"""
         if not query or len(query) < 2:
             return []
         
@@ -341,7 +991,8 @@ class CompanyAutocompleteService:
         for pinyin, chinese in self.pinyin_mapping.items():
             if query_lower == pinyin or query_lower in pinyin:
                 # 使用中文关键词搜索
-                for company in self.company_database:
+                for company_id in self._iter_candidates(chinese):
+                    company = self._name(company_id)
                     if chinese in company and company not in seen:
                         results.append({
                             'name': company,
@@ -351,124 +1002,304 @@ class CompanyAutocompleteService:
                         seen.add(company)
         
         # 1. 精确匹配
-        for company in self.company_database:
+        # 精确匹配固定100分且排在关键词匹配之前，最终按热度排序后只有前limit条可能进入结果：
+        # 无热度的企业按ID顺序取前limit条，有热度的企业在热门集合中筛选，合并后按热度取前limit条
+        popular_ids = self._popular_ids
+        exact_ids = []
+        for company_id in self._iter_candidates(query):
+            if company_id in popular_ids:
+                continue
+            company = self._name(company_id)
             if query in company and company not in seen:
-                results.append({
-                    'name': company,
-                    'match_type': 'exact',
-                    'score': 100
-                })
-                seen.add(company)
+                exact_ids.append(company_id)
+                if len(exact_ids) >= limit:
+                    break
+        if popular_ids:
+            popular_matches = [
+                company_id for company_id in list(popular_ids)
+                if query in self._name(company_id) and self._name(company_id) not in seen
+            ]
+            exact_ids = heapq.nsmallest(limit, popular_matches + exact_ids,
+                                        key=lambda company_id: (-self._popularity[company_id], company_id))
+        for company_id in exact_ids:
+            company = self._name(company_id)
+            results.append({
+                'name': company,
+                'match_type': 'exact',
+                'score': 100
+            })
+            seen.add(company)
+        exact_count = len(exact_ids)
         
         # 2. 关键词匹配
-        for keyword, companies in self.search_index.items():
-            if query == keyword or query in keyword:
-                for company in companies:
-                    if company not in seen:
-                        # 计算匹配度
-                        score = self._calculate_match_score(query, company)
-                        if score > 30:  # 降低阈值，让更多结果通过
-                            results.append({
-                                'name': company,
-                                'match_type': 'keyword',
-                                'score': score
-                            })
-                            seen.add(company)
-        
-        # 3. 模糊匹配
-        if len(results) < limit:
-            for company in self.company_database:
-                if company not in seen:
-                    # 使用编辑距离进行模糊匹配
-                    similarity = difflib.SequenceMatcher(None, query.lower(), company.lower()).ratio()
-                    if similarity > 0.3:  # 相似度阈值
+        if exact_count < limit:
+            matched = [
+                company for company, company_id in
+                ((self._name(company_id), company_id) for company_id in self._iter_candidates(query))
+                if company not in seen and query in self._terms(company_id)
+            ]
+            # 批量计算匹配度
+            for company, score in zip(matched, self._score_candidates(query, matched)):
+                if score > 30:  # 降低阈值，让更多结果通过
                         results.append({
                             'name': company,
-                            'match_type': 'fuzzy',
-                            'score': int(similarity * 100)
+                            'match_type': 'keyword',
+                            'score': score
                         })
                         seen.add(company)
         
-        # 按相关度排序
-        results.sort(key=lambda x: x['score'], reverse=True)
+        # 3. 模糊匹配
+        if fuzzy and len(results) < limit:
+            # 最终只取前limit条，模糊匹配只需找出相似度最高的limit个企业
+            for score, company in self._fuzzy_top_k(query, seen, limit):
+                results.append({
+                    'name': company,
+                    'match_type': 'fuzzy',
+                    'score': score
+                })
+                seen.add(company)
+        
+        # 按相关度排序，相关度相同时评级热度高的优先
+        if self._popular_ids:
+            def rank(result):
+                company_id = self._find_id(result['name'])
+                return result['score'], self._popularity[company_id] if company_id is not None else 0.0
+            results.sort(key=rank, reverse=True)
+        else:
+            results.sort(key=lambda x: x['score'], reverse=True)
         
         return results[:limit]
     
-    def _calculate_match_score(self, query: str, company_name: str) -> int:
-        """计算匹配度分数"""
+    def _fuzzy_top_k(self, query: str, exclude: set, k: int,
+                     budget: Optional[int] = FUZZY_CANDIDATE_BUDGET) -> List[tuple]:
+        """候选剪枝的模糊匹配，返回[(score, company)]，按分数降序
+        
+        SequenceMatcher.ratio() = 2M / (len(a) + len(b))，其中匹配字符数M不超过
+        两者共有字符数，也不超过较短一方的长度，据此得到每个候选的相似度上界。
+        上界只取决于共有字符数和名称长度，候选按这两者分桶、按桶的上界降序处理，
+        上界不可能进入当前前k名时立即停止；稀有字符的倒排表由短到长按需展开。
+        
+        budget限制展开的候选企业数（稀有字符倒排表中新展开的企业与逐个计算相似度的企业），
+        用完后直接返回已找到的最好结果；为None时不限制，结果与全量扫描一致。
+        """
         query = query.lower()
-        company = company_name.lower()
-        
-        # 基础分数
-        base_score = 0
-        
-        # 检查是否是特殊简称匹配
-        abbreviation_mappings = {
-            '东电': '东京电子',
-            '应材': '应用材料',
-            '长鑫': '长鑫存储',
-            '中芯': '中芯国际',
-            '台积': '台积电',
-            '联发': '联发科',
-            '紫光': '紫光展锐',
-            '海思': '海思半导体',
-            '华星': '华星光电',
-            '三星': '三星电子',
-        }
+        query_len = len(query)
+        threshold = 0.3  # 相似度阈值
         
-        # 如果是简称匹配，给予高分
-        if query in abbreviation_mappings:
-            full_name = abbreviation_mappings[query]
-            if full_name in company:
-                base_score += 90  # 简称匹配高分
+        def upper_bound(shared: int, length: int) -> float:
+            return 2 * min(shared, query_len, length) / (query_len + length)
+        
+        # 出现在四分之一以上企业中的常见字符（如“公司”）不逐个计数，统一计入每个候选的上界
+        posting_limit = max(2000, self._company_count() // 4)
+        rare_chars = []  # (倒排表长度, 字符, 在查询中的出现次数, 倒排表)
+        common_shared = 0
+        for char, count in Counter(query).items():
+            parts = self._postings('char', char)
+            if not parts:
+                continue
+            size = sum(len(part) for part in parts)
+            if size > posting_limit:
+                common_shared += count
+            else:
+                rare_chars.append((size, char, count, parts))
+        # 稀有字符按倒排表从短到长排列；remaining[i]为第i个及之后的稀有字符在查询中的出现次数之和
+        rare_chars.sort(key=lambda item: item[0])
+        remaining = [0] * (len(rare_chars) + 1)
+        for i in range(len(rare_chars) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + rare_chars[i][2]
+        
+        matcher = difflib.SequenceMatcher(None, query)
+        heap = []  # (score, -company_id) 小顶堆，分数相同时ID小者优先
+        remaining_budget = float('inf') if budget is None else budget
+        
+        def promising(bound: float) -> bool:
+            if bound <= threshold:
+                return False
+            # 上界等于第k名分数时仍可能以更小的ID胜出（与逐个扫描时的稳定排序一致）
+            return len(heap) < k or int(bound * 100) >= heap[0][0]
+        
+        def consider(company_id: int):
+            nonlocal remaining_budget
+            remaining_budget -= 1
+            company = self._name(company_id)
+            if company is None or company in exclude:
+                return
+            matcher.set_seq2(company.lower())
+            if matcher.quick_ratio() <= threshold:
+                return
+            similarity = matcher.ratio()
+            if similarity <= threshold:
+                return
+            item = (int(similarity * 100), -company_id)
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+        
+        # 索引中实际存在的名称长度：上界在名称长度为min(共有字符数, 查询长度)时最大，
+        # 长度小于它时随长度递增、大于它时递减，因此只需比较其两侧最近的已有长度
+        name_lengths = sorted(self._length_keys())
+        
+        def best_bound(shared_total: int) -> float:
+            pos = bisect_left(name_lengths, min(shared_total, query_len))
+            return max(upper_bound(shared_total, length) for length in name_lengths[max(pos - 1, 0):pos + 1])
+        
+        def process_level(shared_total: int, company_ids):
+            """上界只取决于共有字符数和名称长度：层内按名称长度分桶，按桶的上界降序处理"""
+            buckets = defaultdict(list)
+            for company_id in company_ids:
+                buckets[self._name_length(company_id)].append(company_id)
+            for length in sorted(buckets, key=lambda length: upper_bound(shared_total, length), reverse=True):
+                bound = upper_bound(shared_total, length)
+                if not promising(bound):
+                    break
+                for company_id in buckets[length]:
+                    if not promising(bound) or remaining_budget <= 0:
+                        break
+                    consider(company_id)
         
-        # 开头匹配加分
-        if company.startswith(query):
-            base_score += 50
+        # 1. 含稀有字符的候选：按稀有程度逐个字符扩展候选集。处理第i个稀有字符时，
+        #    其倒排表中尚未处理的企业都不含前面的稀有字符，共有字符数由后面各稀有字符的倒排表
+        #    （C层面的集合求交）精确计算后分层处理；不含前i个稀有字符的企业共有字符数不超过
+        #    remaining[i]，这一上界不够进入前k名时停止，其余倒排表无需展开
+        visited = set()
+        posting_sets = {}  # 稀有字符的倒排表转为集合（按需构建，每个查询只构建一次），集合求交只遍历较小一方
         
-        # 包含关系加分
-        if query in company:
-            base_score += 30
+        def posting_set(i: int) -> set:
+            if i not in posting_sets:
+                posting_sets[i] = set().union(*rare_chars[i][3])
+            return posting_sets[i]
         
-        # 字符覆盖率
-        coverage = sum(1 for char in query if char in company) / len(query)
-        base_score += int(coverage * 20)
+        for i, (size, _, count, _) in enumerate(rare_chars):
+            if not name_lengths or not promising(best_bound(remaining[i] + common_shared)):
+                break
+            # 展开这个字符会超出预算（倒排表长度是新展开企业数的上限）时停止
+            if size > remaining_budget:
+                remaining_budget = 0
+                break
+            new_ids = posting_set(i) - visited
+            visited |= new_ids
+            remaining_budget -= len(new_ids)
+            
+            later_hits = Counter()
+            for j in range(i + 1, len(rare_chars)):
+                hits = new_ids.intersection(posting_set(j))
+                for _ in range(rare_chars[j][2]):
+                    later_hits.update(hits)
+            # 只有命中后面稀有字符的企业需要逐个分层，其余企业的共有字符数均为count
+            levels = defaultdict(list)
+            for company_id, hit_count in later_hits.items():
+                levels[count + hit_count].append(company_id)
+            levels[count] = new_ids.difference(later_hits)
+            for shared in sorted(levels, reverse=True):
+                shared_total = shared + common_shared
+                # 名称长度取最有利的情况，这一层的最好情况都不够则其余各层也不够
+                if not promising(best_bound(shared_total)) or remaining_budget <= 0:
+                    break
+                process_level(shared_total, levels[shared])
+        
+        # 2. 未展开的企业：只含常见字符的企业同一长度的上界相同，按长度分桶处理
+        #   （含未展开稀有字符的企业已由上面的停止条件排除，这里计算的上界偏小也不影响结果）
+        if common_shared and remaining_budget > 0:
+            lengths = sorted(name_lengths,
+                             key=lambda length: upper_bound(common_shared, length),
+                             reverse=True)
+            for length in lengths:
+                bound = upper_bound(common_shared, length)
+                if not promising(bound) or remaining_budget <= 0:
+                    break
+                for part in self._postings('length', length):
+                    for company_id in part:
+                        if company_id in visited:
+                            continue
+                        if not promising(bound) or remaining_budget <= 0:
+                            break
+                        consider(company_id)
         
-        return min(base_score, 100)
+        return [(score, self._name(-neg_id)) for score, neg_id in sorted(heap, reverse=True)]
+    
+    def _calculate_match_score(self, query: str, company_name: str) -> int:
+        """计算匹配度分数"""
+        return self._score_candidates(query, [company_name])[0]
+    
+    def _score_candidates(self, query: str, company_names: List[str]) -> List[int]:
+        """批量计算同一查询对多个企业名称的匹配度分数
+        
+        与查询有关的部分（小写、简称对应的全称、去重后的字符及出现次数）只计算一次，
+        每个候选只剩几次C层面的子串判断。
+        """
+        query = query.lower()
+        query_len = len(query)
+        # 如果是简称匹配，给予高分
+        full_name = _SCORE_ABBREVIATIONS.get(query)
+        # 字符覆盖率按查询中的字符逐个计算，重复字符只需判断一次
+        char_counts = list(Counter(query).items())
+        
+        scores = []
+        for company_name in company_names:
+            company = company_name.lower()
+            
+            # 基础分数
+            base_score = 0
+            if full_name is not None and full_name in company:
+                base_score += 90  # 简称匹配高分
+            
+            # 开头匹配加分
+            if company.startswith(query):
+                base_score += 50
+            
+            # 包含关系加分
+            if query in company:
+                base_score += 30
+            
+            # 字符覆盖率
+            covered = sum(count for char, count in char_counts if char in company)
+            base_score += int(covered / query_len * 20)
+            
+            scores.append(min(base_score, 100))
+        return scores
     
     def get_popular_companies(self, limit: int = 20) -> List[str]:
-        """获取热门企业名称"""
-        # 返回一些知名企业作为热门推荐
-        popular = [
-            "阿里巴巴(中国)有限公司",
-            "腾讯科技(深圳)有限公司", 
-            "百度在线网络技术(北京)有限公司",
-            "小米科技有限责任公司",
-            "华为技术有限公司",
-            "京东科技信息技术有限公司",
-            "美团网络科技有限公司",
-            "字节跳动有限公司",
-            "中国工商银行股份有限公司",
-            "中国建设银行股份有限公司",
-            "招商银行股份有限公司",
-            "比亚迪股份有限公司",
-            "格力电器股份有限公司",
-            "美的集团股份有限公司",
-            "万科企业股份有限公司",
-            "碧桂园控股有限公司",
-            "新东方教育科技集团有限公司",
-            "恒瑞医药股份有限公司",
-            "苏宁易购集团股份有限公司",
-            "滴滴出行科技有限公司"
-        ]
-        return popular[:limit]
-    
-    def add_company(self, company_name: str):
+        """获取热门企业名称：按评级热度排序，不足时以知名企业补齐"""
+        popular_ids = heapq.nlargest(limit, list(self._popular_ids), key=self._popularity.__getitem__)
+        popular = [self._name(company_id) for company_id in popular_ids]
+        for company in POPULAR_COMPANIES:
+            if len(popular) >= limit:
+                break
+            if company not in popular:
+                popular.append(company)
+        return popular
+    
+    def add_company(self, company_name: str) -> bool:
         """动态添加企业名称到数据库"""
-        if company_name and company_name not in self.company_database:
-            self.company_database.append(company_name)
-            # 重建索引
-            self._build_search_index()
+        return self.add_companies([company_name]) > 0
+    
+    def add_companies(self, company_names: List[str], persist: bool = True) -> int:
+        """批量添加企业名称，增量更新索引并追加到企业名录，返回实际新增数量"""
+        with self._write_lock:
+            added = self._append_companies(company_names)
+            if persist:
+                self._append_to_catalogue([_catalogue_line('+', name) for name in added])
+        return len(added)
+    
+    def remove_company(self, company_name: str, persist: bool = True) -> bool:
+        """从数据库移除企业名称，只从该企业自身的倒排表中删除其ID"""
+        with self._write_lock:
+            removed = self._remove_company(company_name)
+            if removed and persist:
+                self._append_to_catalogue([_catalogue_line('-', company_name)])
+        return removed
+    
+    def has_company(self, company_name: str) -> bool:
+        """企业名称是否已在数据库中"""
+        return self._find_id(company_name) is not None
+    
+    def apply_changes(self, changes: List[tuple], persist: bool = False):
+        """按顺序应用外部名录变更[('+'|'-', name)]，用于同步其他副本写入的共享名录"""
+        with self._write_lock:
+            self._apply_catalogue_entries(changes)
+            if persist:
+                self._append_to_catalogue([_catalogue_line(op, name) for op, name in changes])
     
     def get_suggestions_for_partial(self, partial: str) -> List[str]:
         """根据部分输入获取建议"""
@@ -487,6 +1318,12 @@ autocomplete_service = CompanyAutocompleteService()
 
 # 测试功能
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'build-index':
+        # 从企业名录构建二进制索引：python company_autocomplete_service.py build-index
+        count = build_index_file(DEFAULT_CATALOGUE_PATH, DEFAULT_INDEX_PATH)
+        print(f"✅ 已构建企业索引: {DEFAULT_INDEX_PATH}（{count} 家企业）")
+        sys.exit(0)
+    
     service = CompanyAutocompleteService()
     
     test_queries = ["阿里", "腾讯", "百度", "小米", "银行", "科技"]
@@ -37,24 +37,19 @@ def debug_search():
     
     # 3. 检查关键词匹配
     print("\n3️⃣ 关键词匹配:")
-    print(f"  搜索索引总数: {len(service.search_index)}")
-    
-    # 查找包含"东电"的关键词
-    dongdian_keywords = [k for k in service.search_index.keys() if query in k or k == query]
-    print(f"  包含'{query}'的关键词: {dongdian_keywords}")
+    print(f"  企业总数: {len(service.company_database)}")
     
     found_keyword = False
-    for keyword, companies in service.search_index.items():
-        if query == keyword or query in keyword:
-            print(f"  匹配关键词: '{keyword}' -> {len(companies)} 企业")
-            for company in companies:
-                score = service._calculate_match_score(query, company)
-                print(f"    企业: {company} (分数: {score})")
-                if score > 30:
-                    print(f"      ✅ 分数合格 (>{30})")
-                    found_keyword = True
-                else:
-                    print(f"      ❌ 分数不合格 (<={30})")
+    keyword_companies = service.find_by_keyword(query)
+    print(f"  检索词包含'{query}'的企业: {len(keyword_companies)}")
+    for company in keyword_companies:
+        score = service._calculate_match_score(query, company)
+        print(f"    企业: {company} (分数: {score})")
+        if score > 30:
+            print(f"      ✅ 分数合格 (>{30})")
+            found_keyword = True
+        else:
+            print(f"      ❌ 分数不合格 (<={30})")
     
     if not found_keyword:
         print("  ❌ 无关键词匹配")
@@ -0,0 +1,91 @@
+"""
+部门名称自动补全服务
+在内存中维护各提交部门的使用次数，并按单字符/字符二元组建立倒排索引，
+子串查询直接由索引求交得到候选，不访问数据库
+"""
+
+import threading
+from typing import Dict, List, Tuple
+
+
+class DepartmentAutocompleteService:
+    """部门名称自动补全服务"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}  # 部门名称 -> 使用次数（只统计未删除的评级记录）
+        self._postings: Dict[str, set] = {}  # 单字符/二元组 -> 包含它的部门名称
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        # 与数据库LIKE一致，英文不区分大小写
+        return text.strip().casefold()
+
+    @staticmethod
+    def _keys(text: str) -> set:
+        keys = set(text)
+        keys.update(text[i:i + 2] for i in range(len(text) - 1))
+        return keys
+
+    def _add_locked(self, name: str, delta: int):
+        count = self._counts.get(name, 0) + delta
+        if count > 0:
+            if name not in self._counts:
+                for key in self._keys(self._normalize(name)):
+                    self._postings.setdefault(key, set()).add(name)
+            self._counts[name] = count
+        elif name in self._counts:
+            del self._counts[name]
+            for key in self._keys(self._normalize(name)):
+                names = self._postings.get(key)
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self._postings[key]
+
+    def update(self, department: str, delta: int = 1):
+        """部门使用次数增减（新增评级记录为+1，标记删除为-1）"""
+        name = (department or '').strip()
+        if not name:
+            return
+        with self._lock:
+            self._add_locked(name, delta)
+
+    def reset(self, counts: Dict[str, int]):
+        """以数据库中的统计结果整体替换内存中的使用次数"""
+        with self._lock:
+            self._counts = {}
+            self._postings = {}
+            for department, count in counts.items():
+                name = (department or '').strip()
+                if name and count > 0:
+                    self._add_locked(name, count)
+
+    def counts(self) -> Dict[str, int]:
+        """当前各部门的使用次数（用于保存检查点）"""
+        with self._lock:
+            return dict(self._counts)
+
+    def search(self, query: str, limit: int = 8) -> List[Tuple[str, int]]:
+        """返回名称包含query的部门及使用次数，按使用次数降序；query为空时返回最常用的部门"""
+        needle = self._normalize(query or '')
+        with self._lock:
+            if not needle:
+                candidates = list(self._counts)
+            else:
+                keys = [needle] if len(needle) == 1 else {needle[i:i + 2] for i in range(len(needle) - 1)}
+                postings = sorted((self._postings.get(key, set()) for key in keys), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+                # 二元组都命中不代表连续出现，再核对一次子串
+                if len(needle) > 2:
+                    candidates = [name for name in candidates if needle in self._normalize(name)]
+            matches = [(name, self._counts[name]) for name in candidates]
+        matches.sort(key=lambda item: (-item[1], item[0]))
+        return matches[:limit]
+
+    def __len__(self):
+        return len(self._counts)
+
+
+# 全局实例
+department_service = DepartmentAutocompleteService()
@@ -3,12 +3,16 @@
 支持多个免费数据源，自动填充资信评分表
 """
 
+import os
 import requests
 import json
 import time
 import re
-from typing import Dict, Optional, List
-from dataclasses import dataclass
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from typing import Dict, Optional, List, Iterator, Tuple
+from dataclasses import dataclass, fields
 from urllib.parse import quote
 from intelligent_company_generator import IntelligentCompanyGenerator
 
@@ -42,10 +46,253 @@ class CompanyInfo:
     peer_review: str = ""
 
 
+# 外部接口查询结果缓存：各类字段的有效期（秒），登记信息基本不变，经营状态变化较快
+COMPANY_INFO_FIELD_TTLS = {
+    'identity': (('company_name', 'credit_code', 'legal_representative', 'establishment_date', 'address'),
+                 30 * 86400),
+    'registration': (('registered_capital', 'paid_capital', 'company_type', 'industry', 'business_scope'),
+                     7 * 86400),
+    'status': (('business_status',), 86400)
+}
+# 外部接口均未查到时的负缓存有效期（秒），期间不再请求外部接口
+COMPANY_INFO_NEGATIVE_TTL = int(os.environ.get('COMPANY_INFO_NEGATIVE_TTL', '600'))
+COMPANY_INFO_CACHE_SIZE = 2048  # 进程内LRU缓存条数
+
+# 对冲请求：数据源超过其历史延迟的该分位数仍未返回时，并发请求下一个数据源
+HEDGE_PERCENTILE = 0.9
+HEDGE_DEFAULT_DELAY = 1.0  # 尚无延迟样本时的对冲等待时间（秒）
+HEDGE_MIN_DELAY = 0.2
+LATENCY_SAMPLE_SIZE = 50  # 每个数据源保留的最近延迟样本数
+
+# 熔断：连续失败达到阈值后熔断，冷却期过后放行单个探测请求（半开），成功则恢复
+SOURCE_FAILURE_THRESHOLD = int(os.environ.get('SOURCE_FAILURE_THRESHOLD', '3'))
+SOURCE_RECOVERY_TIMEOUT = float(os.environ.get('SOURCE_RECOVERY_TIMEOUT', '30'))  # 熔断冷却时间（秒）
+
+# 请求超时 = 延迟EWMA + 4倍平均偏差（同TCP重传超时的估计方法），限制在上下限之间
+SOURCE_MIN_TIMEOUT = 1.0
+SOURCE_MAX_TIMEOUT = 10.0
+LATENCY_EWMA_ALPHA = 0.125
+
+# 外部数据源查询状态：查到、数据源应答未查到、均被限流未发出请求、均失败或已熔断
+LOOKUP_FOUND = 'found'
+LOOKUP_NOT_FOUND = 'not_found'
+LOOKUP_RATE_LIMITED = 'rate_limited'
+LOOKUP_UNAVAILABLE = 'unavailable'
+# 外部数据源未查到时的回退结果：本地知名企业数据、智能生成的企业信息
+LOOKUP_LOCAL = 'local'
+LOOKUP_GENERATED = 'generated'
+
+BATCH_LOOKUP_WORKERS = 4  # 批量查询时同时处理的企业数（外部接口调用另受令牌桶限制）
+# 批量查询中数据源均被限流时，在该时间预算（秒，自批量查询开始计）内等待令牌补充后重试
+BATCH_RATE_LIMIT_WAIT = float(os.environ.get('BATCH_RATE_LIMIT_WAIT', '30'))
+BATCH_RATE_LIMIT_RETRY_INTERVAL = 2.0
+
+# 18位统一社会信用代码
+_CREDIT_CODE_PATTERN = re.compile(r'^[0-9A-HJ-NPQRTUWXY]{2}\d{6}[0-9A-HJ-NPQRTUWXY]{10}$')
+
+
+class CompanyInfoCache:
+    """
+    外部接口企业信息的两级缓存：进程内LRU + 可选的持久化存储
+    持久化存储需支持 get(key) -> entry / set(key, entry)，entry为
+    {'found': bool, 'fields': {字段: 值}, 'fetched_at': 时间戳}
+    """
+    
+    def __init__(self, store=None, max_entries: int = COMPANY_INFO_CACHE_SIZE):
+        self._store = store
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key_for(query: str) -> str:
+        """缓存键：统一社会信用代码按代码，其余按规范化的企业名称（去空白、括号统一为半角）"""
+        text = re.sub(r'\s+', '', query or '').replace('（', '(').replace('）', ')')
+        if _CREDIT_CODE_PATTERN.match(text.upper()):
+            return 'code:' + text.upper()
+        return 'name:' + text.casefold()
+    
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if self._store is None:
+            return None
+        try:
+            entry = self._store.get(key)
+        except Exception as e:
+            print(f"读取企业信息缓存失败: {e}")
+            return None
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+    
+    def set(self, key: str, entry: dict):
+        self._remember(key, entry)
+        if self._store is not None:
+            try:
+                self._store.set(key, entry)
+            except Exception as e:
+                print(f"写入企业信息缓存失败: {e}")
+    
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+    
+    @staticmethod
+    def is_fresh(entry: dict, now: float) -> bool:
+        """负缓存按负缓存有效期判断；正常条目要求所含各类字段都未过期"""
+        age = now - entry['fetched_at']
+        if not entry['found']:
+            return age < COMPANY_INFO_NEGATIVE_TTL
+        return all(age < ttl for names, ttl in COMPANY_INFO_FIELD_TTLS.values()
+                   if any(entry['fields'].get(name) for name in names))
+    
+    @staticmethod
+    def unexpired_fields(entry: dict, now: float) -> dict:
+        """过期条目中仍在各自有效期内的字段（外部接口刷新失败时使用）"""
+        age = now - entry['fetched_at']
+        return {name: entry['fields'].get(name, '')
+                for names, ttl in COMPANY_INFO_FIELD_TTLS.values() if age < ttl
+                for name in names}
+
+
+class TokenBucketRateLimiter:
+    """
+    外部数据源调用的令牌桶限流：每个数据源的桶容量为其rate_limit（每分钟次数），令牌按每分钟rate_limit个匀速补充
+    默认在进程内计数；传入共享存储（需支持 try_acquire(name, capacity, refill_rate)）时由各副本扣减同一个桶，
+    共享存储不可用时退回进程内计数
+    """
+    
+    def __init__(self, limits: Dict[str, int], store=None):
+        self._limits = limits
+        self._store = store
+        self._lock = threading.Lock()
+        self._buckets = {}  # 数据源名称 -> (剩余令牌, 上次补充时间)
+    
+    def try_acquire(self, name: str) -> bool:
+        """取一个令牌，桶空时返回False（不等待）"""
+        capacity = self._limits.get(name, 5)
+        refill_rate = capacity / 60.0
+        if self._store is not None:
+            try:
+                return self._store.try_acquire(name, capacity, refill_rate)
+            except Exception as e:
+                print(f"共享限流存储不可用，改用进程内限流: {e}")
+        return self._acquire_local(name, capacity, refill_rate)
+    
+    def _acquire_local(self, name: str, capacity: int, refill_rate: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(name, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            acquired = tokens >= 1
+            self._buckets[name] = (tokens - 1 if acquired else tokens, now)
+            return acquired
+
+
+class DataSourceHealth:
+    """
+    单个外部数据源的健康状态：熔断器、延迟EWMA（决定请求超时）及最近延迟样本（决定对冲等待时间）
+    熔断器状态：closed（正常）→ open（熔断，直接跳过）→ half_open（放行一个探测请求）
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self.latency_ewma = None
+        self.latency_deviation = 0.0
+        self._latencies = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self.total_successes = 0
+        self.total_failures = 0
+        self.last_error = None
+    
+    def allow_request(self) -> bool:
+        """是否放行请求；半开状态下只放行一个探测请求，放行后须以record_*或release结束"""
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < SOURCE_RECOVERY_TIMEOUT:
+                    return False
+                self.state = 'half_open'
+            if self.state == 'half_open':
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+    
+    def release(self):
+        """放行的请求未实际发出（如被速率限制），归还探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def record_success(self, latency: float):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+            self.total_successes += 1
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+                self.latency_deviation = latency / 2
+            else:
+                self.latency_deviation += LATENCY_EWMA_ALPHA * (abs(latency - self.latency_ewma) - self.latency_deviation)
+                self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+            self._latencies.append(latency)
+    
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self.last_error = str(error)
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.consecutive_failures >= SOURCE_FAILURE_THRESHOLD:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+    
+    def timeout(self) -> float:
+        """本次请求的超时时间；尚无延迟样本时使用上限"""
+        if self.latency_ewma is None:
+            return SOURCE_MAX_TIMEOUT
+        return min(SOURCE_MAX_TIMEOUT, max(SOURCE_MIN_TIMEOUT, self.latency_ewma + 4 * self.latency_deviation))
+    
+    def hedge_delay(self) -> float:
+        """对冲等待时间：最近成功响应延迟的分位数"""
+        samples = sorted(self._latencies)
+        if not samples:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, samples[int(HEDGE_PERCENTILE * (len(samples) - 1))])
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == 'open':
+                retry_in = round(max(0.0, SOURCE_RECOVERY_TIMEOUT - (time.monotonic() - self.opened_at)), 1)
+            return {
+                'name': self.name,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_in_seconds': retry_in,
+                'latency_ewma_ms': round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+                'timeout_seconds': round(self.timeout(), 2),
+                'total_successes': self.total_successes,
+                'total_failures': self.total_failures,
+                'last_error': self.last_error
+            }
+
+
 class ExternalDataService:
     """外部数据服务类"""
     
-    def __init__(self):
+    def __init__(self, company_cache=None, info_store=None, rate_limit_store=None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -57,7 +304,7 @@ class ExternalDataService:
                 'name': 'free_api_1',
                 'url': 'http://42.193.122.222:8600/power_enterprise/get-enterprise-full-info',
                 'method': 'GET',
-                'rate_limit': 5  # 每分钟5次
+                'rate_limit': 5  # 每分钟5次（令牌桶容量，按此速率补充）
             },
             {
                 'name': 'backup_api',
@@ -67,87 +314,281 @@ class ExternalDataService:
             }
         ]
         
-        # 请求计数器（简单的速率限制）
-        self.request_counts = {}
-        self.last_request_time = {}
+        # 令牌桶限流（多副本部署时传入共享存储，使rate_limit在整个集群内生效）
+        self.rate_limiter = TokenBucketRateLimiter(
+            {source['name']: source['rate_limit'] for source in self.data_sources},
+            store=rate_limit_store
+        )
+        
+        # 并发查询外部数据源的线程池，以及各数据源的熔断/延迟状态
+        self._source_fetchers = {
+            'free_api_1': self._try_free_api_1,
+            'backup_api': self._try_backup_api
+        }
+        self._lookup_executor = ThreadPoolExecutor(max_workers=4 * len(self.data_sources),
+                                                   thread_name_prefix='company-lookup')
+        self._source_health = {source['name']: DataSourceHealth(source['name'])
+                               for source in self.data_sources}
+        # 批量查询单独使用线程池，避免占满数据源查询线程池
+        self._batch_executor = ThreadPoolExecutor(max_workers=BATCH_LOOKUP_WORKERS,
+                                                  thread_name_prefix='company-batch')
         
         # 初始化智能企业数据生成器
         self.company_generator = IntelligentCompanyGenerator()
         
         # 本地企业数据库将在需要时加载
+        
+        # 智能补充生成的企业信息缓存（需支持 get / in / 赋值）
+        # 默认仅在进程内有效，多副本部署时传入基于共享数据库的缓存
+        self._runtime_company_cache = company_cache if company_cache is not None else {}
+        
+        # 外部接口查询结果缓存（进程内LRU + 可选的持久化存储，多副本部署时传入共享数据库存储）
+        self.info_cache = CompanyInfoCache(store=info_store)
 
     def search_company_info(self, company_name: str) -> Optional[CompanyInfo]:
         """
         根据企业名称搜索企业信息
         """
         try:
-            # 尝试第一个免费API
-            result = self._try_free_api_1(company_name)
-            if result and result.company_name:
-                return result
-            
-            # 如果第一个失败，尝试备用API
-            result = self._try_backup_api(company_name)
-            if result and result.company_name:
-                return result
-                
-            # 如果API都失败，尝试本地数据库
-            result = self._try_local_database(company_name)
+            # 外部接口的结果先查缓存，未命中或已过期时才请求外部接口
+            result, _ = self._search_external_apis(company_name)
             if result:
                 return result
-            
-            # 🔄 如果所有数据源都没有找到，智能生成企业信息
-            print(f"🤖 为企业 '{company_name}' 智能生成企业信息...")
-            generated_info = self._auto_supplement_company_data(company_name)
-            if generated_info:
-                print(f"✅ 已为 '{company_name}' 生成完整企业信息")
-                return generated_info
-                
-            # 最后返回空结果
-            return CompanyInfo(company_name=company_name)
+            result, _ = self._search_local_or_generate(company_name)
+            return result
             
         except Exception as e:
             print(f"获取企业信息失败: {e}")
             # 即使出错也尝试智能生成
             return self._auto_supplement_company_data(company_name) or CompanyInfo(company_name=company_name)
+    
+    def _search_local_or_generate(self, company_name: str) -> Tuple[CompanyInfo, str]:
+        """外部接口未查到时，依次尝试本地数据库和智能生成，返回 (企业信息, 来源状态)"""
+        # 如果API都失败，尝试本地数据库
+        result = self._try_local_database(company_name)
+        if result:
+            return result, LOOKUP_LOCAL
+        
+        # 🔄 如果所有数据源都没有找到，智能生成企业信息
+        print(f"🤖 为企业 '{company_name}' 智能生成企业信息...")
+        generated_info = self._auto_supplement_company_data(company_name)
+        if generated_info:
+            print(f"✅ 已为 '{company_name}' 生成完整企业信息")
+            return generated_info, LOOKUP_GENERATED
+            
+        # 最后返回空结果
+        return CompanyInfo(company_name=company_name), LOOKUP_NOT_FOUND
 
-    def _try_free_api_1(self, company_name: str) -> Optional[CompanyInfo]:
-        """尝试免费API 1"""
+    def search_company_info_batch(self, company_names: List[str]) -> Iterator[Tuple[str, Optional[CompanyInfo], str]]:
+        """
+        批量查询企业信息，按完成顺序逐个产出 (企业名称, 企业信息, 查询状态)
+        名称按缓存键去重；缓存中已有有效结果的直接产出，其余并发查询。
+        数据源被限流或不可用的企业不生成企业信息，以rate_limited / unavailable状态产出，由调用方稍后重试；
+        数据源未查到时回退到本地数据库和智能生成，分别以local / generated状态产出，与数据源查到的结果区分
+        """
+        unique = {}
+        for company_name in company_names:
+            company_name = (company_name or '').strip()
+            if company_name:
+                unique.setdefault(self.info_cache.key_for(company_name), company_name)
+        
+        cached = []
+        remaining = []
+        now = time.time()
+        for key, company_name in unique.items():
+            entry = self.info_cache.get(key)
+            if entry is not None and entry['found'] and self.info_cache.is_fresh(entry, now):
+                cached.append((company_name, self._company_info_from_fields(entry['fields']), LOOKUP_FOUND))
+            else:
+                remaining.append(company_name)
+        
+        # 先提交未命中的查询，再产出缓存结果，调用方处理缓存结果时查询已在进行
+        deadline = time.monotonic() + BATCH_RATE_LIMIT_WAIT
+        stopped = threading.Event()
+        futures = {self._batch_executor.submit(self._search_company_info_for_batch, company_name,
+                                               deadline, stopped): company_name
+                   for company_name in remaining}
         try:
-            # 检查速率限制
-            if not self._check_rate_limit('free_api_1'):
-                return None
-                
-            url = f"http://42.193.122.222:8600/power_enterprise/get-enterprise-full-info?name={quote(company_name)}"
+            yield from cached
+            for future in as_completed(futures):
+                try:
+                    result, status = future.result()
+                except Exception as e:
+                    print(f"批量查询企业 {futures[future]} 失败: {e}")
+                    result, status = None, LOOKUP_UNAVAILABLE
+                yield futures[future], result, status
+        finally:
+            # 调用方提前结束（如客户端断开）时取消尚未开始的查询，并结束正在等待令牌的查询
+            stopped.set()
+            for future in futures:
+                future.cancel()
+    
+    def _search_company_info_for_batch(self, company_name: str, deadline: float,
+                                       stopped: threading.Event) -> Tuple[Optional[CompanyInfo], str]:
+        """
+        批量查询中的单个企业，返回 (企业信息, 查询状态)
+        数据源均被限流时在deadline前等待令牌后重试；仍被限流或数据源不可用时不回退到本地数据库和智能生成
+        """
+        while True:
+            result, status = self._search_external_apis(company_name)
+            if result:
+                return result, LOOKUP_FOUND
+            remaining = deadline - time.monotonic()
+            if status != LOOKUP_RATE_LIMITED or remaining <= 0:
+                break
+            if stopped.wait(min(BATCH_RATE_LIMIT_RETRY_INTERVAL, remaining)):
+                break
+        if status != LOOKUP_NOT_FOUND:
+            return None, status
+        return self._search_local_or_generate(company_name)
+
+    def _search_external_apis(self, company_name: str) -> Tuple[Optional[CompanyInfo], str]:
+        """
+        查询外部接口，返回 (企业信息, 查询状态)
+        查到的结果写入缓存；只有数据源实际应答未查到时才写入负缓存，被限流或数据源不可用时下次重新查询
+        """
+        key = self.info_cache.key_for(company_name)
+        entry = self.info_cache.get(key)
+        now = time.time()
+        if entry is not None and self.info_cache.is_fresh(entry, now):
+            if entry['found']:
+                return self._company_info_from_fields(entry['fields']), LOOKUP_FOUND
+            return None, LOOKUP_NOT_FOUND
+        
+        result, status = self._query_data_sources(company_name)
+        if result:
+            new_entry = {
+                'found': True,
+                'fields': {name: getattr(result, name)
+                           for names, _ in COMPANY_INFO_FIELD_TTLS.values() for name in names},
+                'fetched_at': now
+            }
+            self.info_cache.set(key, new_entry)
+            if result.credit_code:
+                self.info_cache.set(self.info_cache.key_for(result.credit_code), new_entry)
+            return result, LOOKUP_FOUND
+        
+        # 外部接口刷新失败：之前查到过的企业使用仍在有效期内的字段
+        if entry is not None and entry['found']:
+            cached_fields = self.info_cache.unexpired_fields(entry, now)
+            if cached_fields.get('company_name'):
+                return self._company_info_from_fields(cached_fields), LOOKUP_FOUND
+        
+        if status == LOOKUP_NOT_FOUND:
+            self.info_cache.set(key, {'found': False, 'fields': {}, 'fetched_at': now})
+        return None, status
+    
+    def _query_data_sources(self, company_name: str) -> Tuple[Optional[CompanyInfo], str]:
+        """
+        并发查询外部数据源，返回 (最先得到的有效结果, 查询状态)
+        按data_sources顺序启动：前一个数据源失败，或超过其历史延迟分位数仍未返回时，
+        立即启动下一个（对冲请求），因此总耗时取决于最快的可用数据源；已熔断的数据源直接跳过
+        均未查到时，有数据源应答未查到为not_found，否则有数据源被限流为rate_limited，其余为unavailable
+        """
+        sources = [source['name'] for source in self.data_sources if source['name'] in self._source_fetchers]
+        launched = {}  # future -> 数据源名称
+        pending = set()
+        next_index = 0
+        hedge_at = None
+        statuses = set()
+        
+        while pending or next_index < len(sources):
+            if next_index < len(sources) and (not pending or time.monotonic() >= hedge_at):
+                source_name = sources[next_index]
+                next_index += 1
+                health = self._source_health[source_name]
+                if not health.allow_request():
+                    statuses.add(LOOKUP_UNAVAILABLE)
+                    continue
+                future = self._lookup_executor.submit(self._fetch_from_source, source_name, company_name)
+                launched[future] = source_name
+                pending.add(future)
+                hedge_at = time.monotonic() + health.hedge_delay()
             
-            response = self.session.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return self._parse_api_1_response(data)
-                
+            if not pending:
+                continue
+            timeout = max(0.0, hedge_at - time.monotonic()) if next_index < len(sources) else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                status, result = future.result()
+                if status == LOOKUP_FOUND:
+                    # 尚未开始的请求直接取消；已发出的请求在后台自行超时结束
+                    for other in pending:
+                        if other.cancel():
+                            self._source_health[launched[other]].release()
+                    return result, LOOKUP_FOUND
+                statuses.add(status)
+        
+        for status in (LOOKUP_NOT_FOUND, LOOKUP_RATE_LIMITED):
+            if status in statuses:
+                return None, status
+        return None, LOOKUP_UNAVAILABLE
+    
+    def _fetch_from_source(self, source_name: str, company_name: str) -> Tuple[str, Optional[CompanyInfo]]:
+        """
+        查询单个数据源，按自适应超时发出请求并更新熔断器，返回 (查询状态, 企业信息)
+        超时、连接失败、429、5xx等异常计为失败；数据源正常应答（包括未查到）计为成功
+        """
+        health = self._source_health[source_name]
+        start = time.monotonic()
+        try:
+            result = self._source_fetchers[source_name](company_name, timeout=health.timeout())
         except Exception as e:
-            print(f"免费API 1调用失败: {e}")
-            
-        return None
+            print(f"数据源 {source_name} 查询失败: {e}")
+            health.record_failure(e)
+            return LOOKUP_UNAVAILABLE, None
+        if result is None:
+            # 被速率限制，未实际发出请求
+            health.release()
+            return LOOKUP_RATE_LIMITED, None
+        health.record_success(time.monotonic() - start)
+        return (LOOKUP_FOUND if result.company_name else LOOKUP_NOT_FOUND), result
+    
+    def data_source_status(self) -> List[dict]:
+        """各外部数据源的熔断器状态、延迟估计及当前超时"""
+        return [self._source_health[source['name']].snapshot() for source in self.data_sources]
+    
+    def _company_info_from_fields(self, cached_fields: dict) -> CompanyInfo:
+        """由缓存的字段还原企业信息，并重新映射资信评分字段"""
+        known = {field.name for field in fields(CompanyInfo)}
+        company_info = CompanyInfo(**{name: value for name, value in cached_fields.items() if name in known})
+        self._analyze_and_map_credit_fields(company_info)
+        return company_info
 
-    def _try_backup_api(self, company_name: str) -> Optional[CompanyInfo]:
-        """尝试备用API"""
-        try:
-            if not self._check_rate_limit('backup_api'):
-                return None
-                
-            url = "http://39.106.33.248:8088/businesslicenseVerificationDetailed"
-            data = {"verifynum": company_name}
+    def _try_free_api_1(self, company_name: str, timeout: float = SOURCE_MAX_TIMEOUT) -> Optional[CompanyInfo]:
+        """
+        尝试免费API 1
+        被速率限制时返回None；请求异常（超时、连接失败、429、5xx）向上抛出，由调用方计入熔断器
+        """
+        # 检查速率限制
+        if not self._check_rate_limit('free_api_1'):
+            return None
             
-            response = self.session.post(url, json=data, timeout=10)
-            if response.status_code == 200:
-                result = response.json()
-                return self._parse_backup_api_response(result)
-                
-        except Exception as e:
-            print(f"备用API调用失败: {e}")
+        url = f"http://42.193.122.222:8600/power_enterprise/get-enterprise-full-info?name={quote(company_name)}"
+        
+        response = self.session.get(url, timeout=timeout)
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        if response.status_code == 200:
+            data = response.json()
+            return self._parse_api_1_response(data)
+        return CompanyInfo()
+
+    def _try_backup_api(self, company_name: str, timeout: float = SOURCE_MAX_TIMEOUT) -> Optional[CompanyInfo]:
+        """尝试备用API（返回值与异常约定同_try_free_api_1）"""
+        if not self._check_rate_limit('backup_api'):
+            return None
             
-        return None
+        url = "http://39.106.33.248:8088/businesslicenseVerificationDetailed"
+        data = {"verifynum": company_name}
+        
+        response = self.session.post(url, json=data, timeout=timeout)
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        if response.status_code == 200:
+            result = response.json()
+            return self._parse_backup_api_response(result)
+        return CompanyInfo()
 
     def _parse_api_1_response(self, data: dict) -> CompanyInfo:
         """解析API 1的响应数据"""
@@ -677,27 +1118,8 @@ class ExternalDataService:
         return 0
 
     def _check_rate_limit(self, api_name: str) -> bool:
-        """检查API调用速率限制"""
-        current_time = time.time()
-        
-        # 初始化计数器
-        if api_name not in self.request_counts:
-            self.request_counts[api_name] = 0
-            self.last_request_time[api_name] = current_time
-            
-        # 如果距离上次请求超过1分钟，重置计数器
-        if current_time - self.last_request_time[api_name] > 60:
-            self.request_counts[api_name] = 0
-            self.last_request_time[api_name] = current_time
-            
-        # 检查是否超过限制
-        rate_limit = next((source['rate_limit'] for source in self.data_sources if source['name'] == api_name), 5)
-        
-        if self.request_counts[api_name] >= rate_limit:
-            return False
-            
-        self.request_counts[api_name] += 1
-        return True
+        """检查API调用速率限制（取一个令牌）"""
+        return self.rate_limiter.try_acquire(api_name)
 
     def get_credit_score_mapping(self, company_info: CompanyInfo) -> dict:
         """将企业信息映射为资信评分表的选项值"""
@@ -823,8 +1245,12 @@ class ExternalDataService:
         使用智能生成器为新企业生成完整信息，并动态添加到本地数据库
         """
         try:
-            # 使用智能生成器生成企业信息
-            generated_data = self.company_generator.generate_company_info(company_name)
+            # 已生成过的企业直接复用，保证各副本、各次查询返回一致的信息
+            generated_data = self._runtime_company_cache.get(company_name)
+            is_new = not generated_data
+            if is_new:
+                # 使用智能生成器生成企业信息
+                generated_data = self.company_generator.generate_company_info(company_name)
             
             # 转换为CompanyInfo对象
             company_info = CompanyInfo()
@@ -842,7 +1268,8 @@ class ExternalDataService:
             self._analyze_and_map_credit_fields(company_info)
             
             # 🚀 动态添加到本地数据库
-            self._add_to_local_database(company_name, generated_data)
+            if is_new:
+                self._add_to_local_database(company_name, generated_data)
             
             print(f"📊 企业信息摘要:")
             print(f"   法人代表: {company_info.legal_representative}")
@@ -873,10 +1300,7 @@ class ExternalDataService:
             # 2. 更新文件中的字典
             # 3. 缓存到内存中
             
-            # 为了演示，我们可以将数据添加到一个运行时字典中
-            if not hasattr(self, '_runtime_company_cache'):
-                self._runtime_company_cache = {}
-            
+            # 写入运行时缓存（可能是多副本共享的数据库缓存）
             self._runtime_company_cache[company_name] = company_data
             
         except Exception as e:
@@ -888,7 +1312,7 @@ class ExternalDataService:
         通过一些启发式规则来判断
         """
         # 检查是否在运行时缓存中
-        if hasattr(self, '_runtime_company_cache') and company_name in self._runtime_company_cache:
+        if company_name in self._runtime_company_cache:
             return True
             
         # 检查企业名称模式（智能补充系统通常生成规律性的名称）
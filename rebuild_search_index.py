@@ -15,8 +15,8 @@ def rebuild_and_test():
     
     # 检查搜索索引中的"东电"关键词
     print("\n🔍 检查搜索索引中的'东电'关键词...")
-    if '东电' in service.search_index:
-        companies = service.search_index['东电']
+    companies = service.find_by_keyword('东电')
+    if companies:
         print(f"  关键词'东电'对应的企业: {len(companies)}")
         for company in companies:
             print(f"    - {company}")
@@ -36,8 +36,8 @@ def rebuild_and_test():
     
     # 再次检查
     print("\n🔍 重建后检查搜索索引中的'东电'关键词...")
-    if '东电' in service.search_index:
-        companies = service.search_index['东电']
+    companies = service.find_by_keyword('东电')
+    if companies:
         print(f"  关键词'东电'对应的企业: {len(companies)}")
         for company in companies:
             print(f"    - {company}")
@@ -1,12 +1,13 @@
 // 管理员审批面板JavaScript
 
 let currentPage = 1;
+let currentCursor = null; // 当前页的游标，第一页为null
 let selectedRecords = new Set();
 
 // 页面加载完成后初始化
 document.addEventListener('DOMContentLoaded', function() {
     loadAdminStats();
-    loadDeletedRecords(1);
+    loadDeletedRecords();
     
     // 绑定批量操作事件
     document.getElementById('confirmBatchDelete').addEventListener('click', executeBatchDelete);
@@ -33,22 +34,32 @@ async function loadAdminStats() {
     }
 }
 
-// 加载待删除记录
-async function loadDeletedRecords(page = 1) {
-    currentPage = page;
-    
+// 加载待删除记录（游标分页）
+async function loadDeletedRecords(cursor = null, page = 1) {
     // 显示加载指示器
     document.getElementById('loadingIndicator').style.display = 'block';
     document.getElementById('deletedRecordsTable').style.display = 'none';
     document.getElementById('noDataMessage').style.display = 'none';
     
     try {
-        const response = await fetch(`/api/admin/deleted-records?page=${page}&per_page=10`);
+        let url = '/api/admin/deleted-records?per_page=10';
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        const response = await fetch(url);
         const data = await response.json();
         
+        // 当前页记录已全部处理时回到第一页
+        if (data.success && data.data.records.length === 0 && cursor) {
+            await loadDeletedRecords();
+            return;
+        }
+        
         document.getElementById('loadingIndicator').style.display = 'none';
         
         if (data.success) {
+            currentCursor = cursor;
+            currentPage = page;
             if (data.data.records.length === 0) {
                 document.getElementById('noDataMessage').style.display = 'block';
             } else {
@@ -137,59 +148,37 @@ function renderDeletedRecords(records) {
     document.getElementById('selectAll').checked = false;
 }
 
-// 渲染分页导航
+// 渲染分页导航（只能逐页前后翻动）
 function renderPagination(data) {
     const nav = document.getElementById('paginationNav');
     const pagination = document.getElementById('pagination');
     
-    if (data.pages <= 1) {
+    if (!data.next_cursor && !data.prev_cursor) {
         nav.style.display = 'none';
         return;
     }
     
     nav.style.display = 'block';
     
+    const totalPages = Math.max(data.pages, currentPage);
     let html = '';
     
     // 上一页
     html += `
-        <li class="page-item ${data.current_page === 1 ? 'disabled' : ''}">
-            <a class="page-link" href="#" onclick="loadDeletedRecords(${data.current_page - 1}); return false;">
+        <li class="page-item ${data.prev_cursor ? '' : 'disabled'}">
+            <a class="page-link" href="#" onclick="loadDeletedRecords('${data.prev_cursor}', ${currentPage - 1}); return false;">
                 <i class="bi bi-chevron-left"></i>
             </a>
         </li>
     `;
     
-    // 页码
-    const startPage = Math.max(1, data.current_page - 2);
-    const endPage = Math.min(data.pages, data.current_page + 2);
-    
-    if (startPage > 1) {
-        html += `<li class="page-item"><a class="page-link" href="#" onclick="loadDeletedRecords(1); return false;">1</a></li>`;
-        if (startPage > 2) {
-            html += `<li class="page-item disabled"><span class="page-link">...</span></li>`;
-        }
-    }
-    
-    for (let i = startPage; i <= endPage; i++) {
-        html += `
-            <li class="page-item ${i === data.current_page ? 'active' : ''}">
-                <a class="page-link" href="#" onclick="loadDeletedRecords(${i}); return false;">${i}</a>
-            </li>
-        `;
-    }
-    
-    if (endPage < data.pages) {
-        if (endPage < data.pages - 1) {
-            html += `<li class="page-item disabled"><span class="page-link">...</span></li>`;
-        }
-        html += `<li class="page-item"><a class="page-link" href="#" onclick="loadDeletedRecords(${data.pages}); return false;">${data.pages}</a></li>`;
-    }
+    // 当前页码
+    html += `<li class="page-item active"><span class="page-link">${currentPage} / ${totalPages}</span></li>`;
     
     // 下一页
     html += `
-        <li class="page-item ${data.current_page === data.pages ? 'disabled' : ''}">
-            <a class="page-link" href="#" onclick="loadDeletedRecords(${data.current_page + 1}); return false;">
+        <li class="page-item ${data.next_cursor ? '' : 'disabled'}">
+            <a class="page-link" href="#" onclick="loadDeletedRecords('${data.next_cursor}', ${currentPage + 1}); return false;">
                 <i class="bi bi-chevron-right"></i>
             </a>
         </li>
@@ -324,7 +313,7 @@ async function executeBatchDelete() {
         
         // 刷新数据
         await loadAdminStats();
-        await loadDeletedRecords(currentPage);
+        await loadDeletedRecords(currentCursor, currentPage);
         
     } catch (error) {
         console.error('批量删除失败:', error);
@@ -363,7 +352,7 @@ async function executeBatchRestore() {
         
         // 刷新数据
         await loadAdminStats();
-        await loadDeletedRecords(currentPage);
+        await loadDeletedRecords(currentCursor, currentPage);
         
     } catch (error) {
         console.error('批量恢复失败:', error);
@@ -453,7 +442,7 @@ async function executeSingleAction(action, recordId) {
             
             // 刷新数据
             await loadAdminStats();
-            await loadDeletedRecords(currentPage);
+            await loadDeletedRecords(currentCursor, currentPage);
         } else {
             throw new Error(result.error);
         }
@@ -471,7 +460,7 @@ function viewRecordDetail(recordId) {
 
 // 刷新删除记录
 function refreshDeletedRecords() {
-    loadDeletedRecords(currentPage);
+    loadDeletedRecords(currentCursor, currentPage);
     showToast('数据已刷新', 'info');
 }
 
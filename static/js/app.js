@@ -451,6 +451,7 @@ function highlightMatch(text, query) {
 function getMatchTypeText(type) {
     const types = {
         'exact': '精确',
+        'prefix': '前缀',
         'pinyin': '拼音',
         'keyword': '关键词',
         'fuzzy': '模糊',
@@ -690,6 +691,7 @@ function collectFormData() {
         logistics_scale_detail: getSelectedText('logisticsScale'),
         credit_score: parseInt(creditScoreValue) || 0,
         credit_detail: creditRatingText,
+        credit_details: getCreditDetails(),
         profit_estimate_score: getSelectedValue('profitEstimate'),
         profit_estimate_detail: getSelectedText('profitEstimate')
     };
@@ -890,6 +892,22 @@ function calculateCreditScore() {
     creditRatingText = `${creditLevel}（${totalScore.toFixed(0)}分）`;
 }
 
+// 获取资信评分表各子项得分（字段名 -> 分数），未选择的子项不提交
+function getCreditDetails() {
+    const form = document.getElementById('creditRatingForm');
+    const details = {};
+    if (!form) {
+        return details;
+    }
+    
+    for (let [name, value] of new FormData(form).entries()) {
+        if (value && !isNaN(value)) {
+            details[name] = parseInt(value);
+        }
+    }
+    return details;
+}
+
 // 验证资信评分是否已填写
 function validateCreditScore() {
     if (!creditScoreValue || creditScoreValue === '') {
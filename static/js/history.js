@@ -1,6 +1,9 @@
 // 全局变量
 let currentPage = 1;
 let totalPages = 1;
+let currentCursor = null; // 当前页的游标，第一页为null
+let nextCursor = null;
+let prevCursor = null;
 let allRatings = [];
 let currentRatingForAction = null;
 let selectedRatings = new Set(); // 存储选中的评级ID
@@ -79,18 +82,31 @@ function refreshHistory() {
     loadHistory();
 }
 
-// 加载历史记录
-async function loadHistory(page = 1) {
+// 加载历史记录（游标分页，翻到任意深度的代价相同）
+async function loadHistory(cursor = null, page = 1) {
     try {
         showLoadingIndicator();
         
-        const response = await fetch(`/api/history?page=${page}&per_page=10`);
+        let url = '/api/history?per_page=10';
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        const response = await fetch(url);
         const result = await response.json();
         
         if (result.success) {
+            // 当前页记录已全部删除时回到第一页
+            if (result.data.ratings.length === 0 && cursor) {
+                loadHistory();
+                return;
+            }
+            
             allRatings = result.data.ratings;
-            currentPage = result.data.current_page;
-            totalPages = result.data.pages;
+            currentCursor = cursor;
+            currentPage = page;
+            nextCursor = result.data.next_cursor;
+            prevCursor = result.data.prev_cursor;
+            totalPages = Math.max(result.data.pages, currentPage);
             
             hideLoadingIndicator();
             
@@ -387,12 +403,12 @@ async function exportSelectedRecords() {
     }
 }
 
-// 渲染分页
+// 渲染分页（只能逐页前后翻动）
 function renderPagination() {
     const pagination = document.getElementById('pagination');
     pagination.innerHTML = '';
     
-    if (totalPages <= 1) {
+    if (!nextCursor && !prevCursor) {
         document.getElementById('paginationNav').style.display = 'none';
         return;
     }
@@ -401,58 +417,25 @@ function renderPagination() {
     
     // 上一页
     const prevItem = document.createElement('li');
-    prevItem.className = `page-item ${currentPage === 1 ? 'disabled' : ''}`;
+    prevItem.className = `page-item ${prevCursor ? '' : 'disabled'}`;
     prevItem.innerHTML = `
-        <a class="page-link" href="#" onclick="loadHistory(${currentPage - 1})">
+        <a class="page-link" href="#" onclick="loadHistory(prevCursor, currentPage - 1); return false;">
             <i class="bi bi-chevron-left"></i>
         </a>
     `;
     pagination.appendChild(prevItem);
     
-    // 页码
-    let startPage = Math.max(1, currentPage - 2);
-    let endPage = Math.min(totalPages, currentPage + 2);
-    
-    if (startPage > 1) {
-        const firstItem = document.createElement('li');
-        firstItem.className = 'page-item';
-        firstItem.innerHTML = `<a class="page-link" href="#" onclick="loadHistory(1)">1</a>`;
-        pagination.appendChild(firstItem);
-        
-        if (startPage > 2) {
-            const dotsItem = document.createElement('li');
-            dotsItem.className = 'page-item disabled';
-            dotsItem.innerHTML = `<span class="page-link">...</span>`;
-            pagination.appendChild(dotsItem);
-        }
-    }
-    
-    for (let i = startPage; i <= endPage; i++) {
-        const pageItem = document.createElement('li');
-        pageItem.className = `page-item ${i === currentPage ? 'active' : ''}`;
-        pageItem.innerHTML = `<a class="page-link" href="#" onclick="loadHistory(${i})">${i}</a>`;
-        pagination.appendChild(pageItem);
-    }
-    
-    if (endPage < totalPages) {
-        if (endPage < totalPages - 1) {
-            const dotsItem = document.createElement('li');
-            dotsItem.className = 'page-item disabled';
-            dotsItem.innerHTML = `<span class="page-link">...</span>`;
-            pagination.appendChild(dotsItem);
-        }
-        
-        const lastItem = document.createElement('li');
-        lastItem.className = 'page-item';
-        lastItem.innerHTML = `<a class="page-link" href="#" onclick="loadHistory(${totalPages})">${totalPages}</a>`;
-        pagination.appendChild(lastItem);
-    }
+    // 当前页码
+    const pageItem = document.createElement('li');
+    pageItem.className = 'page-item active';
+    pageItem.innerHTML = `<span class="page-link">${currentPage} / ${totalPages}</span>`;
+    pagination.appendChild(pageItem);
     
     // 下一页
     const nextItem = document.createElement('li');
-    nextItem.className = `page-item ${currentPage === totalPages ? 'disabled' : ''}`;
+    nextItem.className = `page-item ${nextCursor ? '' : 'disabled'}`;
     nextItem.innerHTML = `
-        <a class="page-link" href="#" onclick="loadHistory(${currentPage + 1})">
+        <a class="page-link" href="#" onclick="loadHistory(nextCursor, currentPage + 1); return false;">
             <i class="bi bi-chevron-right"></i>
         </a>
     `;
@@ -812,7 +795,7 @@ async function exportRatingReport(ratingId) {
     }
 }
 
-// 导出所有记录到单个Excel文件
+// 导出所有记录到单个Excel文件（后台生成，轮询进度后下载）
 async function exportAllRecords() {
     try {
         if (allRatings.length === 0) {
@@ -820,36 +803,47 @@ async function exportAllRecords() {
             return;
         }
         
-        showToast('正在生成汇总Excel文件，请稍候...', 'info');
+        const response = await fetch('/api/export/jobs', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ format: 'xlsx' })
+        });
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.error || '导出失败');
+        }
         
-        const response = await fetch('/api/export/all');
+        let job = result.data;
+        if (job.status !== 'done') {
+            showToast('正在生成汇总Excel文件，请稍候...', 'info');
+        }
         
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.style.display = 'none';
-            a.href = url;
-            
-            // 生成文件名
-            const now = new Date();
-            const dateStr = now.getFullYear() + 
-                           String(now.getMonth() + 1).padStart(2, '0') + 
-                           String(now.getDate()).padStart(2, '0') + '_' +
-                           String(now.getHours()).padStart(2, '0') + 
-                           String(now.getMinutes()).padStart(2, '0');
-            const filename = `客户评级汇总表_${dateStr}.xlsx`;
-            
-            a.download = filename;
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
-            
-            showToast('汇总Excel文件下载成功！', 'success');
-        } else {
-            throw new Error('导出失败');
+        // 轮询导出进度，直至文件生成
+        while (job.status === 'queued' || job.status === 'running') {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const statusResponse = await fetch(`/api/export/jobs/${job.job_id}`);
+            const statusResult = await statusResponse.json();
+            if (!statusResult.success) {
+                throw new Error(statusResult.error || '导出失败');
+            }
+            job = statusResult.data;
+            document.getElementById('exportAllBtn').title = `已生成 ${job.progress}%`;
         }
+        document.getElementById('exportAllBtn').title = '';
+        
+        if (job.status !== 'done') {
+            throw new Error(job.error || '导出失败');
+        }
+        
+        // 由浏览器直接下载，文件名使用服务器返回的名称
+        const a = document.createElement('a');
+        a.style.display = 'none';
+        a.href = job.download_url;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        
+        showToast('汇总Excel文件下载成功！', 'success');
     } catch (error) {
         console.error('Error exporting all records:', error);
         showToast('导出汇总文件失败: ' + error.message, 'error');
@@ -911,7 +905,7 @@ async function confirmDelete() {
             await hideModal('deleteModal');
             
             // 重新加载当前页面
-            loadHistory(currentPage);
+            loadHistory(currentCursor, currentPage);
         } else {
             throw new Error(result.error || '删除失败');
         }
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量企业信息查询回归测试
+外部数据源用替身函数模拟查到、未查到、限流、故障，检查NDJSON每行的found/status：
+被限流或数据源不可用的企业不写入负缓存、不智能生成；未查到时回退的本地数据和智能生成数据
+以local / generated状态与数据源查到的结果区分。
+
+用法:
+    python test_company_batch.py
+"""
+
+import os
+import sys
+import json
+import atexit
+import shutil
+import tempfile
+
+import requests
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_company_batch_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+
+import external_data_service
+from external_data_service import CompanyInfo
+from app import app, external_service
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def fake_source(company_name, timeout=None):
+    """按企业名称中的关键字模拟数据源应答"""
+    if '限流' in company_name:
+        return None
+    if '故障' in company_name:
+        raise requests.ConnectionError('数据源故障')
+    if '查到' in company_name:
+        return CompanyInfo(company_name=company_name, legal_representative='张三')
+    return CompanyInfo()
+
+
+def run_batch(client, company_names):
+    response = client.post('/api/external-company-data/batch', json={'company_names': company_names})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return {line['query']: line for line in lines}
+
+
+def cache_entry(company_name):
+    with app.app_context():
+        return external_service.info_cache.get(external_service.info_cache.key_for(company_name))
+
+
+def main():
+    external_service._source_fetchers = {'free_api_1': fake_source, 'backup_api': fake_source}
+    # 缩短限流等待预算，限流的企业很快以rate_limited返回
+    external_data_service.BATCH_RATE_LIMIT_WAIT = 0.5
+    external_data_service.BATCH_RATE_LIMIT_RETRY_INTERVAL = 0.1
+    client = app.test_client()
+
+    names = ['可查到科技有限公司', '小米科技有限责任公司', '无记录贸易有限公司',
+             '限流科技有限公司', '故障科技有限公司']
+    lines = run_batch(client, names)
+    check(sorted(lines) == sorted(names), f'每家企业各返回一行（{len(lines)}行）')
+
+    line = lines.get('可查到科技有限公司', {})
+    check(line.get('status') == 'found' and line.get('found') is True
+          and line.get('company_info', {}).get('legal_representative') == '张三', '数据源查到：found / true')
+
+    line = lines.get('小米科技有限责任公司', {})
+    check(line.get('status') == 'local' and line.get('found') is True, '数据源未查到、本地知名企业数据命中：local / true')
+
+    line = lines.get('无记录贸易有限公司', {})
+    check(line.get('status') == 'generated' and line.get('found') is False and line.get('company_info'),
+          '数据源未查到、智能生成：generated / false，并附带生成的数据')
+    entry = cache_entry('无记录贸易有限公司')
+    check(entry is not None and not entry['found'], '数据源应答未查到时写入负缓存')
+
+    for company_name, status in (('限流科技有限公司', 'rate_limited'), ('故障科技有限公司', 'unavailable')):
+        line = lines.get(company_name, {})
+        check(line.get('status') == status and line.get('found') is False and 'company_info' not in line,
+              f'{status}：不返回企业信息')
+        check(cache_entry(company_name) is None, f'{status}：不写入负缓存')
+        with app.app_context():
+            check(external_service._runtime_company_cache.get(company_name) is None, f'{status}：不智能生成')
+
+    # 限流等待预算内令牌恢复，重试后查到
+    attempts = []
+
+    def recovering_source(company_name, timeout=None):
+        attempts.append(company_name)
+        if len(attempts) < 3:
+            return None
+        return CompanyInfo(company_name=company_name, legal_representative='李四')
+
+    external_service._source_fetchers = {'free_api_1': recovering_source, 'backup_api': recovering_source}
+    external_data_service.BATCH_RATE_LIMIT_WAIT = 5
+    line = run_batch(client, ['限流后恢复有限公司']).get('限流后恢复有限公司', {})
+    check(line.get('status') == 'found' and line.get('company_info', {}).get('legal_representative') == '李四',
+          '等待预算内令牌恢复后重试查到')
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 批量查询状态检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+企业索引文件回归测试
+检查名录被改写（长度不变甚至变长）、索引为旧格式时启动会重建索引，
+名录只是追加时沿用已有索引、只增量解析追加的记录。
+
+用法:
+    python test_company_index.py
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+from company_autocomplete_service import CompanyAutocompleteService, build_index_file
+
+_workdir = tempfile.mkdtemp(prefix='test_company_index_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+CATALOGUE_PATH = os.path.join(_workdir, 'company_catalogue.txt')
+INDEX_PATH = os.path.join(_workdir, 'company_index.bin')
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def write_catalogue(names, mode='w'):
+    with open(CATALOGUE_PATH, mode, encoding='utf-8') as f:
+        f.write(''.join(name + '\n' for name in names))
+
+
+def load():
+    return CompanyAutocompleteService(catalogue_path=CATALOGUE_PATH, index_path=INDEX_PATH)
+
+
+def main():
+    write_catalogue(['甲乙科技有限公司', '丙丁贸易有限公司'])
+    build_index_file(CATALOGUE_PATH, INDEX_PATH)
+    built_at = os.path.getmtime(INDEX_PATH)
+
+    # 只追加：沿用已有索引，追加的企业由增量解析加入
+    write_catalogue(['戊己物流有限公司'], mode='a')
+    service = load()
+    check(os.path.getmtime(INDEX_PATH) == built_at, '名录只追加时不重建索引')
+    check(service._base is not None and service._base.count == 2, '已有索引收录的企业来自内存映射')
+    check(set(service.company_database) == {'甲乙科技有限公司', '丙丁贸易有限公司', '戊己物流有限公司'},
+          '追加的企业已加入')
+
+    # 改写为同样长度的不同内容：只比较长度时会沿用过期索引
+    write_catalogue(['庚辛科技有限公司', '壬癸贸易有限公司', '戊己物流有限公司'])
+    service = load()
+    check(set(service.company_database) == {'庚辛科技有限公司', '壬癸贸易有限公司', '戊己物流有限公司'},
+          f'名录改写（长度不变）后重建索引（{sorted(service.company_database)}）')
+    check(service.complete_prefix('甲乙') == [], '被改写掉的企业不再出现在补全中')
+
+    # 改写后变长：同样重建
+    write_catalogue(['子丑科技有限公司', '寅卯贸易集团有限公司', '辰巳物流有限公司', '午未电子有限公司'])
+    service = load()
+    check(set(service.company_database) == {'子丑科技有限公司', '寅卯贸易集团有限公司', '辰巳物流有限公司',
+                                             '午未电子有限公司'}, '名录改写（变长）后重建索引')
+
+    # 旧格式的索引文件：自动重建而不是退回纯内存索引
+    with open(INDEX_PATH, 'r+b') as f:
+        f.write(b'CACIDX01')
+    service = load()
+    check(service._base is not None and service._base.count == 4, '旧格式索引自动重建')
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 企业索引文件检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
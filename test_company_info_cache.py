@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+外部企业信息负缓存回归测试
+用替身数据源代替外部接口，检查只有数据源实际应答未查到时才写入负缓存：
+被限流、数据源异常、熔断器全部打开时不写入，下次重新查询；负缓存有效期内不再请求数据源、过期后重新查询；
+查到的结果按名称和统一社会信用代码缓存，过期后刷新失败时使用仍在有效期内的字段；
+负缓存经共享存储对其他副本生效。
+
+用法:
+    python test_company_info_cache.py
+"""
+
+import os
+import sys
+import time
+import atexit
+import shutil
+import tempfile
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_company_info_cache_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+
+import requests
+
+from app import SharedCompanyInfoStore
+from external_data_service import (ExternalDataService, CompanyInfo, COMPANY_INFO_NEGATIVE_TTL,
+                                   LOOKUP_FOUND, LOOKUP_NOT_FOUND, LOOKUP_RATE_LIMITED, LOOKUP_UNAVAILABLE)
+
+CREDIT_CODE = '91440300MA5F000001'
+
+failures = []
+calls = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def limited(company_name, timeout=0):
+    calls.append(company_name)
+    return None
+
+
+def broken(company_name, timeout=0):
+    calls.append(company_name)
+    raise requests.ConnectionError('数据源不可用')
+
+
+def missing(company_name, timeout=0):
+    calls.append(company_name)
+    return CompanyInfo()
+
+
+def found(company_name, timeout=0):
+    calls.append(company_name)
+    return CompanyInfo(company_name=company_name, credit_code=CREDIT_CODE, registered_capital='1000万元',
+                       business_status='存续')
+
+
+def new_service():
+    """一个副本：进程内缓存独立，第二级缓存为共享数据库存储"""
+    return ExternalDataService(info_store=SharedCompanyInfoStore())
+
+
+def lookup(service, company_name, first, second):
+    """用替身数据源查询，返回 (查询状态, 企业信息, 缓存条目, 请求数据源的次数)"""
+    service._source_fetchers = {'free_api_1': first, 'backup_api': second}
+    del calls[:]
+    result, status = service._search_external_apis(company_name)
+    entry = service.info_cache.get(service.info_cache.key_for(company_name))
+    return status, result, entry, len(calls)
+
+
+def test_negative_cache_rules(service):
+    cases = [
+        ('均被限流', '限流测试有限公司', limited, limited, LOOKUP_RATE_LIMITED),
+        ('均异常', '异常测试有限公司', broken, broken, LOOKUP_UNAVAILABLE),
+        ('限流与异常', '混合测试有限公司', limited, broken, LOOKUP_RATE_LIMITED),
+    ]
+    for label, company, first, second, expected in cases:
+        status, _, entry, _ = lookup(service, company, first, second)
+        check(status == expected and entry is None, f'{label}：状态为{status}，不写入负缓存')
+        status, _, _, count = lookup(service, company, missing, missing)
+        check(status == LOOKUP_NOT_FOUND and count == 2, f'{label}：下次查询重新请求数据源（{count}次）')
+
+    status, _, entry, _ = lookup(service, '未查到测试有限公司', limited, missing)
+    check(status == LOOKUP_NOT_FOUND and entry is not None and entry['found'] is False,
+          '一个数据源限流、另一个应答未查到：写入负缓存')
+    status, _, _, count = lookup(service, '未查到测试有限公司', found, found)
+    check(status == LOOKUP_NOT_FOUND and count == 0, '负缓存有效期内不请求数据源')
+    status, _, _, count = lookup(service, ' 未查到测试有限公司 ', found, found)
+    check(status == LOOKUP_NOT_FOUND and count == 0, '名称前后有空白时命中同一负缓存')
+
+    key = service.info_cache.key_for('未查到测试有限公司')
+    service.info_cache.set(key, {'found': False, 'fields': {},
+                                 'fetched_at': time.time() - COMPANY_INFO_NEGATIVE_TTL - 1})
+    status, result, entry, count = lookup(service, '未查到测试有限公司', broken, found)
+    check(status == LOOKUP_FOUND and count == 2 and result.company_name == '未查到测试有限公司' and entry['found'],
+          '负缓存过期后重新请求数据源，查到后覆盖负缓存')
+
+
+def test_found_entry(service):
+    status, _, entry, _ = lookup(service, '查到测试有限公司', broken, found)
+    check(status == LOOKUP_FOUND and entry['found'] and entry['fields']['credit_code'] == CREDIT_CODE,
+          '查到的结果写入名称缓存')
+    status, result, _, count = lookup(service, CREDIT_CODE.lower(), broken, broken)
+    check(status == LOOKUP_FOUND and count == 0 and result.company_name == '查到测试有限公司',
+          '按统一社会信用代码（不区分大小写）命中同一条缓存')
+
+    # 经营状态（有效期一天）已过期、登记信息仍有效时数据源不可用
+    key = service.info_cache.key_for('查到测试有限公司')
+    service.info_cache.set(key, dict(entry, fetched_at=time.time() - 2 * 86400))
+    status, result, entry, count = lookup(service, '查到测试有限公司', broken, broken)
+    check(status == LOOKUP_FOUND and count == 2 and result.registered_capital == '1000万元'
+          and result.business_status == '', '刷新失败时使用仍在有效期内的字段，过期字段不返回')
+    check(entry['found'], '刷新失败不覆盖之前查到的结果')
+
+
+def test_open_circuit(service):
+    for health in service._source_health.values():
+        while health.allow_request():
+            health.record_failure(requests.ConnectionError('数据源不可用'))
+    status, _, entry, count = lookup(service, '熔断测试有限公司', found, found)
+    check(status == LOOKUP_UNAVAILABLE and count == 0 and entry is None,
+          f'熔断器全部打开：跳过数据源，状态为{status}，不写入负缓存')
+
+
+def test_shared_store():
+    first, second = new_service(), new_service()
+    lookup(first, '共享测试有限公司', missing, missing)
+    status, _, _, count = lookup(second, '共享测试有限公司', found, found)
+    check(status == LOOKUP_NOT_FOUND and count == 0, '一个副本写入的负缓存对其他副本生效')
+
+    lookup(first, '共享限流测试有限公司', limited, limited)
+    status, _, _, count = lookup(second, '共享限流测试有限公司', found, found)
+    check(status == LOOKUP_FOUND and count > 0, '一个副本被限流不影响其他副本查询数据源')
+
+
+def main():
+    test_negative_cache_rules(new_service())
+    test_found_entry(new_service())
+    test_open_circuit(new_service())
+    test_shared_store()
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 外部企业信息负缓存检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
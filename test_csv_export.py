@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSV流式导出回归测试
+检查 /api/export/csv 分多个gzip数据块流式返回、拼接后可完整解压，
+列与CSV_EXPORT_COLUMNS一致（评分为整数、时间为ISO格式、is_deleted为0/1），
+含逗号和引号的企业名称正确转义，日期范围（含结束当天）和等级筛选（含未编码的“A+”）正确，
+日期格式错误时返回400。
+
+用法:
+    python test_csv_export.py
+"""
+
+import os
+import io
+import sys
+import csv
+import gzip
+import atexit
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_csv_export_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+
+import app as app_module
+from app import app, db, CustomerRating, CSV_EXPORT_COLUMNS, write_ratings_csv
+
+GRADES = ['A+', 'A', 'B', 'C', 'D']
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def add_ratings(count):
+    """写入count条评级：等级轮换，按天分布在2024-03-01起的若干天，首条名称含逗号和引号"""
+    with app.app_context():
+        for index in range(count):
+            name = '甲,乙"丙"有限公司' if index == 0 else f'导出测试{index}有限公司'
+            db.session.add(CustomerRating(
+                customer_name=name, customer_type='direct', submitter_name='测试', submitter_department='市场部',
+                industry_score=index % 10, business_type_score=10, influence_score=10, customer_type_score=10,
+                logistics_scale_score=10, credit_score=10, profit_estimate_score=10, total_score=60 + index % 10,
+                grade=GRADES[index % len(GRADES)], rating_details='{}', is_deleted=index % 7 == 3,
+                created_at=datetime(2024, 3, 1, 8, 30, 15) + timedelta(days=index // 10, hours=index % 10)
+            ))
+        db.session.commit()
+
+
+def fetch(client, query=''):
+    """请求CSV导出，返回 (响应, 数据块列表, 解析后的行)"""
+    response = client.get(f'/api/export/csv{query}', buffered=False)
+    chunks = [chunk for chunk in response.iter_encoded() if chunk]
+    rows = []
+    if response.status_code == 200:
+        rows = list(csv.reader(io.StringIO(gzip.decompress(b''.join(chunks)).decode('utf-8'))))
+    response.close()
+    return response, chunks, rows
+
+
+def main():
+    total = 45
+    add_ratings(total)
+    # 缩小批量，覆盖多批读取
+    app_module.EXPORT_BATCH_SIZE = 8
+    client = app.test_client()
+
+    response, chunks, rows = fetch(client)
+    check(response.status_code == 200 and response.mimetype == 'application/gzip'
+          and 'customer_ratings_' in response.headers.get('Content-Disposition', ''), '返回gzip附件')
+    check(rows and rows[0] == CSV_EXPORT_COLUMNS, '表头与CSV_EXPORT_COLUMNS一致')
+    records = [dict(zip(rows[0], row)) for row in rows[1:]]
+    check(len(records) == total and [int(r['id']) for r in records] == sorted(int(r['id']) for r in records),
+          f'导出全部记录并按ID排序（{len(records)}条）')
+    check(records[0]['customer_name'] == '甲,乙"丙"有限公司', '含逗号和引号的企业名称正确转义')
+    first = records[0]
+    check(first['industry_score'] == '0' and first['total_score'] == '60' and first['created_at'] == '2024-03-01T08:30:15',
+          f'评分为整数、时间为ISO格式（{first["industry_score"]}, {first["created_at"]}）')
+    check({r['is_deleted'] for r in records} == {'0', '1'}
+          and sum(r['is_deleted'] == '1' for r in records) == sum(1 for i in range(total) if i % 7 == 3),
+          'is_deleted为0/1且与数据库一致')
+
+    # 结束日期含当天；未编码的“A+”在查询串中被解码为“A ”
+    _, _, rows = fetch(client, '?start_date=2024-03-02&end_date=2024-03-03&grade=A+,C')
+    days = {row[CSV_EXPORT_COLUMNS.index('created_at')][:10] for row in rows[1:]}
+    grades = {row[CSV_EXPORT_COLUMNS.index('grade')] for row in rows[1:]}
+    expected = sum(1 for i in range(total) if 10 <= i < 30 and GRADES[i % 5] in ('A+', 'C'))
+    check(len(rows) - 1 == expected and days == {'2024-03-02', '2024-03-03'} and grades == {'A+', 'C'},
+          f'日期范围（含结束当天）与等级筛选正确（{len(rows) - 1}/{expected}条）')
+
+    _, _, rows = fetch(client, '?grade=A%2B')
+    check(len(rows) - 1 == total // 5, '编码后的等级“A%2B”同样正确')
+
+    response, _, _ = fetch(client, '?start_date=2024/03/01')
+    check(response.status_code == 400, '日期格式错误时返回400')
+
+    # 异步导出任务写文件时使用同一生成器，进度回调报告全部记录
+    progress = []
+    path = os.path.join(_workdir, 'ratings.csv.gz')
+    with app.app_context():
+        write_ratings_csv(path, progress.append)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        file_rows = list(csv.reader(f))
+    check(len(file_rows) - 1 == total and progress and progress[-1] == total,
+          f'写入文件的记录数与进度回调一致（{progress[-1] if progress else None}）')
+
+    # 数据量较大时压缩数据分多个数据块流式返回，而不是生成完整文件后一次返回
+    add_ratings(4000)
+    app_module.EXPORT_BATCH_SIZE = 500
+    _, chunks, rows = fetch(client)
+    check(len(chunks) > 2 and len(rows) - 1 == total + 4000, f'分多个数据块流式返回（{len(chunks)}块）')
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ CSV流式导出检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+部门使用次数回归测试
+通过接口提交、删除、恢复评级，检查内存中的部门使用次数随变更日志增减；
+再绕过接口直接修改数据库（变更日志中没有记录），检查定期核对能纠正偏差，
+且有尚未应用的变更时核对不替换计数。
+
+用法:
+    python test_department_counts.py
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_department_counts_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+os.environ['CATALOG_SYNC_INTERVAL'] = '0'
+
+import app as app_module
+from app import app, db, CustomerRating, RatingChange, sync_company_catalog, _reconcile_department_counts
+from department_autocomplete_service import department_service
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def submit(client, department):
+    payload = {
+        'customer_name': '测试企业有限公司', 'customer_type': 'direct', 'submitter_name': '测试',
+        'submitter_department': department, 'industry_score': 10, 'business_type_score': 10,
+        'influence_score': 10, 'logistics_scale_score': 10, 'credit_score': 10, 'profit_estimate_score': 10
+    }
+    return client.post('/api/calculate', json=payload).get_json()['data']['id']
+
+
+def counts():
+    return {name: count for name, count in department_service.search('', limit=20) if count}
+
+
+def main():
+    client = app.test_client()
+    ids = [submit(client, department) for department in ('市场部', '市场部', '销售部')]
+    check(counts() == {'市场部': 2, '销售部': 1}, f'提交后计数（{counts()}）')
+
+    client.delete(f'/api/rating/{ids[0]}', json={'reason': '测试'})
+    check(counts() == {'市场部': 1, '销售部': 1}, f'标记删除后扣减（{counts()}）')
+    client.post(f'/api/admin/reject-delete/{ids[0]}', json={'reason': '测试'})
+    check(counts() == {'市场部': 2, '销售部': 1}, f'拒绝删除后恢复（{counts()}）')
+
+    # 绕过接口修改数据库，变更日志中没有记录
+    with app.app_context():
+        db.session.get(CustomerRating, ids[1]).submitter_department = '研发部'
+        db.session.commit()
+        sync_company_catalog(force=True)
+    check(counts() == {'市场部': 2, '销售部': 1}, '核对前计数未变（变更日志中没有该修改）')
+
+    app_module.DEPARTMENT_RECONCILE_INTERVAL = 0
+    with app.app_context():
+        # 有尚未应用的变更时不替换计数
+        db.session.add(RatingChange(rating_id=ids[2], action='update', customer_name='测试企业有限公司',
+                                    submitter_department='销售部'))
+        db.session.commit()
+        check(not _reconcile_department_counts(), '有尚未应用的变更时不核对')
+        sync_company_catalog(force=True)
+    check(counts() == {'市场部': 1, '销售部': 1, '研发部': 1}, f'定期核对后与数据库一致（{counts()}）')
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 部门使用次数检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
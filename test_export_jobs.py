@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步导出任务回归测试
+数据未变化时重复提交复用同一任务；标记删除、拒绝删除（恢复）、审批通过删除后
+即使评级记录ID被新记录复用，也须生成新任务，导出的is_deleted列与数据库一致，
+被取代的旧导出文件随即清理。
+
+用法:
+    python test_export_jobs.py
+"""
+
+import os
+import sys
+import gzip
+import time
+import atexit
+import shutil
+import tempfile
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_export_jobs_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+
+from app import app, _export_jobs
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def submit(client, company):
+    payload = {
+        'customer_name': company, 'customer_type': 'direct', 'submitter_name': '测试',
+        'submitter_department': '市场部', 'industry_score': 10, 'business_type_score': 10,
+        'influence_score': 10, 'logistics_scale_score': 10, 'credit_score': 10, 'profit_estimate_score': 10
+    }
+    return client.post('/api/calculate', json=payload).get_json()['data']['id']
+
+
+def run_job(client):
+    """提交CSV导出任务并等待完成，返回 (任务ID, HTTP状态码, {记录ID: (企业名称, is_deleted)})"""
+    response = client.post('/api/export/jobs', json={'format': 'csv'})
+    job = response.get_json()['data']
+    for _ in range(200):
+        job = client.get(f"/api/export/jobs/{job['job_id']}").get_json()['data']
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    if job['status'] != 'done':
+        return job['job_id'], response.status_code, None
+    lines = gzip.decompress(client.get(job['download_url']).data).decode('utf-8').splitlines()
+    header = lines[0].split(',')
+    rows = {}
+    for line in lines[1:]:
+        values = dict(zip(header, line.split(',')))
+        rows[int(values['id'])] = (values['customer_name'], values['is_deleted'])
+    return job['job_id'], response.status_code, rows
+
+
+def main():
+    client = app.test_client()
+    first = submit(client, '导出测试甲有限公司')
+    second = submit(client, '导出测试乙有限公司')
+
+    job_id, status, rows = run_job(client)
+    check(status == 202 and rows == {first: ('导出测试甲有限公司', '0'), second: ('导出测试乙有限公司', '0')},
+          f'首次提交新建任务并导出全部记录（{status}, {rows}）')
+    seen = {job_id}
+
+    reused_id, status, _ = run_job(client)
+    check(reused_id == job_id and status == 200, '数据未变化时复用已完成的任务')
+
+    steps = [
+        ('标记删除', lambda: client.delete(f'/api/rating/{second}', json={'reason': '测试'}),
+         {first: ('导出测试甲有限公司', '0'), second: ('导出测试乙有限公司', '1')}),
+        ('拒绝删除（恢复）', lambda: client.post(f'/api/admin/reject-delete/{second}', json={'reason': '测试'}),
+         {first: ('导出测试甲有限公司', '0'), second: ('导出测试乙有限公司', '0')}),
+    ]
+    for label, action, expected in steps:
+        previous = _export_jobs.get(job_id)
+        previous_path = previous and previous['path']
+        action()
+        job_id, status, rows = run_job(client)
+        check(job_id not in seen and status == 202 and rows == expected, f'{label}后新建任务，is_deleted正确（{rows}）')
+        check(previous_path is not None and not os.path.exists(previous_path), f'{label}后旧版本的导出文件已清理')
+        seen.add(job_id)
+
+    # 审批通过删除后提交新记录，新记录可能复用被删除记录的ID
+    client.delete(f'/api/rating/{second}', json={'reason': '测试'})
+    client.post(f'/api/admin/approve-delete/{second}', json={})
+    third = submit(client, '导出测试丙有限公司')
+    job_id, status, rows = run_job(client)
+    check(job_id not in seen and rows == {first: ('导出测试甲有限公司', '0'), third: ('导出测试丙有限公司', '0')},
+          f'永久删除并新增记录（ID {"复用" if third == second else "未复用"}）后新建任务（{rows}）')
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 导出任务复用检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模糊匹配回归测试
+用基准测试的企业名录和查询流，比较剪枝后的 _fuzzy_top_k 与逐个计算相似度的全量扫描，
+分数和同分时的先后顺序（ID小者优先）都须一致；限定候选预算时，返回的结果须是真实分数、按分数降序。
+另外检查输入框补全只在查询足够长且没有前缀补全时才做模糊匹配。
+
+用法:
+    python test_fuzzy_search.py                  # 默认 3000 家企业、约300个不同查询
+    python test_fuzzy_search.py --size 10000 --queries 500
+"""
+
+import sys
+import random
+import difflib
+import argparse
+
+from benchmark_autocomplete import build_vocabulary, generate_catalogue, generate_query_stream
+from company_autocomplete_service import CompanyAutocompleteService
+from intelligent_company_generator import IntelligentCompanyGenerator
+
+
+def full_scan_top_k(service: CompanyAutocompleteService, query: str, exclude: set, k: int) -> list:
+    """原有的全量扫描：按ID顺序计算全部企业的相似度，稳定排序后取前k个"""
+    results = []
+    for company_id in range(service._company_count()):
+        company = service._name(company_id)
+        if company is None or company in exclude:
+            continue
+        similarity = difflib.SequenceMatcher(None, query.lower(), company.lower()).ratio()
+        if similarity > 0.3:
+            results.append((int(similarity * 100), company))
+    results.sort(key=lambda item: item[0], reverse=True)
+    return results[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模糊匹配回归测试')
+    parser.add_argument('--size', type=int, default=3000)
+    parser.add_argument('--queries', type=int, default=1500, help='查询流长度（去重后约三百个查询）')
+    parser.add_argument('--limit', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--budget', type=int, default=200, help='限定预算检查使用的候选预算（取小值以触发预算用完）')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = build_vocabulary(IntelligentCompanyGenerator())
+    names = generate_catalogue(args.size, vocabulary, rng)
+    # 打乱后加入，使ID顺序与名称顺序无关
+    rng.shuffle(names)
+    queries = sorted(set(generate_query_stream(names, args.queries, vocabulary, rng)))
+
+    service = CompanyAutocompleteService(catalogue_path=None)
+    service.add_companies(names, persist=False)
+    # 删除部分企业，覆盖已删除ID的处理
+    for company in names[::50]:
+        service.remove_company(company, persist=False)
+
+    print(f"🧪 {len(names)} 家企业, {len(queries)} 个查询")
+    mismatches = 0
+    budget_errors = 0
+    for query in queries:
+        exclude = set(rng.sample(names, 5))
+        ranked = full_scan_top_k(service, query, exclude, service._company_count())
+        expected = ranked[:args.limit]
+        actual = service._fuzzy_top_k(query, exclude, args.limit, budget=None)
+        if actual != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ '{query}'\n   全量扫描: {expected}\n   剪枝结果: {actual}")
+
+        # 候选预算用完时返回已找到的结果：分数须真实，且按分数降序
+        scores = {company: score for score, company in ranked}
+        limited = service._fuzzy_top_k(query, exclude, args.limit, budget=args.budget)
+        if (any(scores.get(company) != score for score, company in limited)
+                or [score for score, _ in limited] != sorted((score for score, _ in limited), reverse=True)):
+            budget_errors += 1
+            if budget_errors <= 5:
+                print(f"❌ '{query}' 限定预算的结果有误: {limited}")
+
+    gate_errors = 0
+    fuzzy_calls = []
+    service._fuzzy_top_k = lambda query, *args, **kwargs: fuzzy_calls.append(query) or []
+    for query in queries:
+        fuzzy_calls.clear()
+        service.autocomplete(query, args.limit)
+        # 精确和关键词匹配已补足结果时本就不做模糊匹配，这里只检查不该执行时没有执行
+        if fuzzy_calls and (len(query.strip()) < 3 or service.complete_prefix(query.strip(), args.limit)):
+            gate_errors += 1
+            if gate_errors <= 5:
+                print(f"❌ '{query}' 有前缀补全或查询过短，不应执行模糊匹配")
+    del service._fuzzy_top_k
+
+    if mismatches:
+        print(f"❌ {mismatches}/{len(queries)} 个查询结果与全量扫描不一致")
+    if budget_errors:
+        print(f"❌ {budget_errors}/{len(queries)} 个查询在限定预算时结果有误")
+    if gate_errors:
+        print(f"❌ {gate_errors}/{len(queries)} 个查询的模糊匹配触发条件有误")
+    if mismatches or budget_errors or gate_errors:
+        sys.exit(1)
+    print("✅ 全部查询的分数及排序与全量扫描一致，限定预算的结果有效，模糊匹配只在没有前缀补全时执行")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游标分页回归测试
+在 /api/history 和 /api/admin/deleted-records 上沿next_cursor翻到最后一页、再沿prev_cursor翻回第一页，
+检查顺序与按 (排序时间, ID) 倒序一致（含时间相同的记录），不重不漏，往返的各页一致；
+翻页途中新增记录不影响之后的页；无效游标返回400。
+
+用法:
+    python test_keyset_pagination.py
+"""
+
+import os
+import sys
+import json
+import base64
+import atexit
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_keyset_pagination_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+
+from app import app, db, CustomerRating, update_rating_rollup
+
+PER_PAGE = 4
+BASE_TIME = datetime(2024, 5, 1, 9, 0, 0)
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def new_rating(index, created_at):
+    return CustomerRating(
+        customer_name=f'分页测试{index}有限公司', customer_type='direct', submitter_name='测试',
+        submitter_department='市场部', industry_score=10, business_type_score=10, influence_score=10,
+        customer_type_score=10, logistics_scale_score=10, credit_score=10, profit_estimate_score=10,
+        total_score=70, grade='B', rating_details='{}', created_at=created_at
+    )
+
+
+def add_ratings(count):
+    """写入评级：每三条的创建时间相同；每四条中一条标记删除，删除时间两两相同"""
+    with app.app_context():
+        for index in range(count):
+            rating = new_rating(index, BASE_TIME + timedelta(minutes=index // 3))
+            if index % 4 == 1:
+                rating.is_deleted = True
+                rating.deleted_at = BASE_TIME + timedelta(days=1, minutes=index // 8)
+            db.session.add(rating)
+            if not rating.is_deleted:
+                update_rating_rollup(rating, 1)
+        db.session.commit()
+
+
+def expected_order(deleted):
+    sort_column = CustomerRating.deleted_at if deleted else CustomerRating.created_at
+    with app.app_context():
+        rows = CustomerRating.query.filter(CustomerRating.is_deleted == deleted).order_by(
+            sort_column.desc(), CustomerRating.id.desc()).all()
+        return [row.id for row in rows]
+
+
+def get_page(client, url, key, cursor=None):
+    params = {'per_page': PER_PAGE}
+    if cursor:
+        params['cursor'] = cursor
+    data = client.get(url, query_string=params).get_json()['data']
+    return [item['id'] for item in data[key]], data['next_cursor'], data['prev_cursor']
+
+
+def walk(client, url, key, deleted, label):
+    expected = expected_order(deleted)
+    pages, cursors = [], []
+    ids, next_cursor, prev_cursor = get_page(client, url, key)
+    check(prev_cursor is None, f'{label}：第一页没有上一页游标')
+    pages.append(ids)
+    cursors.append(prev_cursor)
+    while next_cursor:
+        ids, next_cursor, prev_cursor = get_page(client, url, key, next_cursor)
+        pages.append(ids)
+        cursors.append(prev_cursor)
+    flattened = [rating_id for page in pages for rating_id in page]
+    check(flattened == expected, f'{label}：沿下一页游标翻完，顺序与(时间, ID)倒序一致、不重不漏（{len(flattened)}条）')
+    check(all(len(page) == PER_PAGE for page in pages[:-1]), f'{label}：除最后一页外每页{PER_PAGE}条')
+
+    # 从最后一页沿上一页游标翻回第一页
+    back = [pages[-1]]
+    prev_cursor = cursors[-1]
+    while prev_cursor:
+        ids, _, prev_cursor = get_page(client, url, key, prev_cursor)
+        back.append(ids)
+    check(back[::-1] == pages, f'{label}：沿上一页游标翻回第一页，各页与向后翻页一致')
+    return pages
+
+
+def main():
+    add_ratings(30)
+    client = app.test_client()
+    history = walk(client, '/api/history', 'ratings', False, '评级历史')
+    walk(client, '/api/admin/deleted-records', 'records', True, '待审批删除')
+
+    # 翻页途中新增最新的记录，已取得的游标之后的页不变
+    _, cursor, _ = get_page(client, '/api/history', 'ratings')
+    with app.app_context():
+        db.session.add(new_rating(99, BASE_TIME + timedelta(days=30)))
+        db.session.commit()
+    ids, _, _ = get_page(client, '/api/history', 'ratings', cursor)
+    check(ids == history[1], '翻页途中新增记录不影响之后的页')
+
+    bad_direction = base64.urlsafe_b64encode(
+        json.dumps(['sideways', BASE_TIME.isoformat(), 1]).encode('utf-8')).decode('ascii').rstrip('=')
+    for label, cursor in (('非base64', '!!!'), ('非JSON', 'bm90LWpzb24'), ('方向错误', bad_direction),
+                          ('截断', cursor[:-6])):
+        for url in ('/api/history', '/api/admin/deleted-records'):
+            response = client.get(url, query_string={'cursor': cursor})
+            body = response.get_json()
+            check(response.status_code == 400 and body['success'] is False, f'{url} 无效游标（{label}）返回400')
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 游标分页检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+令牌桶限流回归测试
+检查令牌桶表在MySQL上建为双精度列，并在数据库中存取一轮后核对令牌补充是否精确
+（单精度列会把Unix时间戳舍入到约128秒，补充结果随之整段跳变）。
+
+用法:
+    python test_rate_limit.py                                         # 使用临时SQLite数据库
+    TEST_DATABASE_URL=mysql+pymysql://... python test_rate_limit.py   # 在指定的测试库上运行
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+from unittest import mock
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_rate_limit_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import CreateTable
+
+import app as app_module
+from app import app, db, RateLimitBucket, SharedRateLimitStore
+from external_data_service import TokenBucketRateLimiter
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def acquire_at(store, timestamp, name, capacity):
+    """在指定时刻从共享存储取一个令牌"""
+    with mock.patch.object(app_module.time, 'time', return_value=timestamp):
+        return store.try_acquire(name, capacity, capacity / 60.0)
+
+
+def load_bucket(name):
+    with app.app_context():
+        db.session.expire_all()
+        bucket = db.session.get(RateLimitBucket, name)
+        result = (bucket.tokens, bucket.updated_at)
+        db.session.rollback()
+        return result
+
+
+def test_mysql_column_types():
+    ddl = str(CreateTable(RateLimitBucket.__table__).compile(dialect=mysql.dialect()))
+    check('tokens DOUBLE' in ddl and 'updated_at DOUBLE' in ddl, 'MySQL上令牌数与更新时间为DOUBLE列')
+
+
+def test_shared_refill_round_trip():
+    store = SharedRateLimitStore()
+    name = 'test_source'
+    capacity = 10  # 每6秒补充一个令牌
+    start = 1760000000.123456
+
+    with app.app_context():
+        db.session.merge(RateLimitBucket(name=name, tokens=0.5, updated_at=start))
+        db.session.commit()
+    tokens, updated_at = load_bucket(name)
+    check(updated_at == start, f'更新时间存取后不变（{updated_at!r}）')
+
+    # 3秒补充0.5个令牌，恰好凑满1个
+    check(acquire_at(store, start + 3.0, name, capacity), '3秒后补满1个令牌，取令牌成功')
+    tokens, updated_at = load_bucket(name)
+    check(abs(tokens) < 1e-9 and updated_at == start + 3.0, f'取走后剩余0个令牌（{tokens!r}, {updated_at!r}）')
+
+    # 不足1个令牌时不扣减，也不推进更新时间
+    check(not acquire_at(store, start + 8.9, name, capacity), '5.9秒后不足1个令牌，取令牌失败')
+    tokens, updated_at = load_bucket(name)
+    check(abs(tokens) < 1e-9 and updated_at == start + 3.0, '取令牌失败时桶状态不变')
+
+    check(acquire_at(store, start + 9.0, name, capacity), '6秒后补满1个令牌，取令牌成功')
+
+    # 长时间未调用，补充不超过容量
+    check(acquire_at(store, start + 3600.0, name, capacity), '长时间未调用后取令牌成功')
+    tokens, _ = load_bucket(name)
+    check(abs(tokens - (capacity - 1)) < 1e-9, f'补充不超过桶容量（剩余 {tokens!r}）')
+
+
+def test_local_refill():
+    limiter = TokenBucketRateLimiter({'local_source': 6})  # 每10秒补充一个令牌
+    with mock.patch('external_data_service.time.monotonic', return_value=1000.0):
+        acquired = sum(limiter.try_acquire('local_source') for _ in range(8))
+    check(acquired == 6, f'进程内令牌桶初始可取容量个令牌（{acquired}）')
+    with mock.patch('external_data_service.time.monotonic', return_value=1009.9):
+        check(not limiter.try_acquire('local_source'), '进程内令牌桶9.9秒后不足1个令牌')
+    with mock.patch('external_data_service.time.monotonic', return_value=1010.0):
+        check(limiter.try_acquire('local_source'), '进程内令牌桶10秒后补满1个令牌')
+
+
+def main():
+    print(f"🧪 数据库: {app.config['SQLALCHEMY_DATABASE_URI']}")
+    test_mysql_column_types()
+    test_shared_refill_round_trip()
+    test_local_refill()
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 令牌桶限流检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评级变更日志回归测试
+模拟升级前已有评级记录（没有变更日志）的数据库，两个“副本”同时执行迁移，
+检查每条评级只回填一条create（已标记删除的只回填一条delete），已由接口记录过的评级不重复回填，
+且按变更日志同步的部门使用次数与数据库中未删除记录的统计一致。
+
+用法:
+    python test_rating_change_log.py
+"""
+
+import os
+import sys
+import time
+import atexit
+import shutil
+import tempfile
+import threading
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_rating_change_log_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+
+import app as app_module
+from app import (app, db, CustomerRating, RatingChange, SchemaMigration, log_rating_change,
+                 run_schema_migrations, sync_company_catalog)
+from department_autocomplete_service import department_service
+
+DEPARTMENTS = ['市场部', '销售部', '研发部']
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def new_rating(index):
+    return CustomerRating(
+        customer_name=f'测试企业{index}有限公司', customer_type='direct', submitter_name='测试',
+        submitter_department=DEPARTMENTS[index % len(DEPARTMENTS)],
+        industry_score=10, business_type_score=10, influence_score=10, customer_type_score=10,
+        logistics_scale_score=10, credit_score=10, profit_estimate_score=10, total_score=70, grade='B',
+        rating_details='{}'
+    )
+
+
+def prepare_pre_upgrade_data(count):
+    """写入没有变更日志的评级记录（升级前的数据），并撤销迁移3的记录"""
+    with app.app_context():
+        ratings = [new_rating(index) for index in range(count)]
+        for rating in ratings[::7]:
+            rating.is_deleted = True
+        db.session.add_all(ratings)
+        db.session.flush()
+        # 升级后由接口提交的评级，已有create记录
+        submitted = new_rating(count)
+        db.session.add(submitted)
+        db.session.flush()
+        log_rating_change(submitted, 'create')
+        SchemaMigration.query.filter_by(version=3).delete()
+        db.session.commit()
+
+
+def run_replicas(replica_count):
+    """多个线程同时执行迁移，模拟多副本同时启动"""
+    # 放慢回填，扩大多副本同时执行的时间窗口
+    slowed = []
+    for version, name, migrate, claim in app_module.SCHEMA_MIGRATIONS:
+        if version == 3:
+            def migrate_slowly(migrate=migrate):
+                time.sleep(0.5)
+                migrate()
+            slowed.append((version, name, migrate_slowly, claim))
+        else:
+            slowed.append((version, name, migrate, claim))
+    original = list(app_module.SCHEMA_MIGRATIONS)
+    app_module.SCHEMA_MIGRATIONS[:] = slowed
+
+    barrier = threading.Barrier(replica_count)
+    errors = []
+
+    def replica():
+        with app.app_context():
+            try:
+                barrier.wait()
+                run_schema_migrations()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=replica) for _ in range(replica_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    app_module.SCHEMA_MIGRATIONS[:] = original
+    return errors
+
+
+def duplicated_events(action):
+    with app.app_context():
+        return db.session.query(RatingChange.rating_id).filter(RatingChange.action == action).group_by(
+            RatingChange.rating_id).having(db.func.count(RatingChange.id) > 1).count()
+
+
+def main():
+    prepare_pre_upgrade_data(200)
+    errors = run_replicas(2)
+    check(not errors, f'两个副本同时迁移均未出错（{errors}）')
+
+    with app.app_context():
+        ratings = CustomerRating.query.count()
+        deleted = CustomerRating.query.filter(CustomerRating.is_deleted == True).count()
+        creates = RatingChange.query.filter_by(action='create').count()
+        deletes = RatingChange.query.filter_by(action='delete').count()
+        recorded = SchemaMigration.query.filter_by(version=3).count()
+    check(creates == ratings and duplicated_events('create') == 0, f'每条评级一条create（{creates}/{ratings}）')
+    check(deletes == deleted and duplicated_events('delete') == 0, f'每条已删除评级一条delete（{deletes}/{deleted}）')
+    check(recorded == 1, '迁移3只记录一次')
+
+    # 迁移记录丢失后重新执行，已有记录的评级跳过
+    with app.app_context():
+        SchemaMigration.query.filter_by(version=3).delete()
+        db.session.commit()
+        run_schema_migrations()
+        check(RatingChange.query.count() == creates + deletes, '重新执行迁移不重复回填')
+
+    # 按变更日志同步的部门使用次数与数据库统计一致
+    with app.app_context():
+        sync_company_catalog(force=True)
+        expected = dict(db.session.query(
+            CustomerRating.submitter_department, db.func.count(CustomerRating.id)
+        ).filter(CustomerRating.is_deleted == False).group_by(CustomerRating.submitter_department).all())
+    actual = {name: count for name, count in department_service.search('部', limit=20) if name in expected}
+    check(actual == expected, f'部门使用次数与数据库一致（{actual}）')
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 评级变更日志检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
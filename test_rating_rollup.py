@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评级每日汇总回归测试
+通过接口并发提交评级，再标记删除、拒绝删除、审批通过删除，检查每日汇总表与
+直接对评级表分组统计的结果一致（同一汇总键的并发累加不丢失、不冲突），
+统计接口（含按天、按部门分组及起始时间不在零点的范围）与评级表统计一致，
+由评级表重建汇总表的结果与增量维护的结果相同。
+
+用法:
+    python test_rating_rollup.py                                         # 使用临时SQLite数据库（写入串行）
+    TEST_DATABASE_URL=mysql+pymysql://... python test_rating_rollup.py   # 在MySQL测试库上检查并发累加
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_rating_rollup_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+
+from app import app, db, CustomerRating, RatingDailyRollup, update_rating_rollup, backfill_rating_rollup
+
+DEPARTMENTS = ['市场部', '销售部']
+SCORES = [10, 6, 3]
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def payload(index):
+    score = SCORES[index % len(SCORES)]
+    return {
+        'customer_name': f'汇总测试{index}有限公司', 'customer_type': 'direct', 'submitter_name': '测试',
+        'submitter_department': DEPARTMENTS[index % len(DEPARTMENTS)], 'industry_score': score,
+        'business_type_score': score, 'influence_score': score, 'logistics_scale_score': score,
+        'credit_score': score, 'profit_estimate_score': score
+    }
+
+
+def submit_concurrently(thread_count, per_thread):
+    """多个线程同时提交，同一汇总键（当天、同等级、同部门）被并发累加"""
+    barrier = threading.Barrier(thread_count)
+    ids, errors = [], []
+
+    def worker(offset):
+        client = app.test_client()
+        barrier.wait()
+        for index in range(offset, offset + per_thread):
+            response = client.post('/api/calculate', json=payload(index)).get_json()
+            if response.get('success'):
+                ids.append(response['data']['id'])
+            else:
+                errors.append(response.get('error'))
+
+    threads = [threading.Thread(target=worker, args=(i * per_thread,)) for i in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(ids), errors
+
+
+def add_past_ratings():
+    """写入前几天的评级，与接口相同地维护汇总"""
+    now = datetime.utcnow()
+    for index, days in enumerate((1, 1, 3, 40)):
+        data = payload(index)
+        rating = CustomerRating(
+            customer_name=data['customer_name'], customer_type='direct', submitter_name='测试',
+            submitter_department=data['submitter_department'], industry_score=10, business_type_score=10,
+            influence_score=10, customer_type_score=10, logistics_scale_score=10, credit_score=10,
+            profit_estimate_score=10, total_score=70, grade='B', rating_details='{}',
+            created_at=now - timedelta(days=days)
+        )
+        db.session.add(rating)
+        update_rating_rollup(rating, 1)
+    db.session.commit()
+
+
+def rollup_rows():
+    return {(str(row.day), row.grade, row.customer_type, row.submitter_department): row.rating_count
+            for row in RatingDailyRollup.query.all() if row.rating_count}
+
+
+def raw_rows():
+    day = db.func.date(CustomerRating.created_at)
+    rows = db.session.query(
+        day, CustomerRating.grade, CustomerRating.customer_type, CustomerRating.submitter_department,
+        db.func.count(CustomerRating.id)
+    ).filter(CustomerRating.is_deleted == False).group_by(
+        day, CustomerRating.grade, CustomerRating.customer_type, CustomerRating.submitter_department
+    ).all()
+    return {(str(d), grade, customer_type, department): count for d, grade, customer_type, department, count in rows}
+
+
+def raw_grade_counts(since=None):
+    query = db.session.query(CustomerRating.grade, db.func.count(CustomerRating.id)).filter(
+        CustomerRating.is_deleted == False)
+    if since is not None:
+        query = query.filter(CustomerRating.created_at >= since)
+    return dict(query.group_by(CustomerRating.grade).all())
+
+
+def statistics(client, **params):
+    return client.get('/api/statistics', query_string=params).get_json()['data']
+
+
+def check_statistics(client, label):
+    grade_fields = {'A+': 'aplus_count', 'A': 'a_count', 'B': 'b_count', 'C': 'c_count', 'D': 'd_count'}
+    with app.app_context():
+        expected_all = raw_grade_counts()
+        # 与统计接口相同地取“近一个月”的起点（本地时间，起点不在零点）
+        expected_month = raw_grade_counts(datetime.now() - timedelta(days=30))
+    data = statistics(client, time_range='all', breakdown='department')
+    check(all(data[field] == expected_all.get(grade, 0) for grade, field in grade_fields.items())
+          and data['total'] == sum(expected_all.values()), f'{label}：全部时间的等级分布与评级表一致')
+    by_department = {group['key']: group['total'] for group in data['breakdown']}
+    with app.app_context():
+        expected_departments = dict(db.session.query(
+            CustomerRating.submitter_department, db.func.count(CustomerRating.id)
+        ).filter(CustomerRating.is_deleted == False).group_by(CustomerRating.submitter_department).all())
+    check(by_department == expected_departments, f'{label}：按部门分组与评级表一致（{by_department}）')
+    data = statistics(client, time_range='1month', breakdown='day')
+    check(data['total'] == sum(expected_month.values())
+          and sum(group['total'] for group in data['breakdown']) == data['total'],
+          f'{label}：近一个月（起点不在零点）与评级表一致（{data["total"]}）')
+
+
+def main():
+    ids, errors = submit_concurrently(thread_count=4, per_thread=6)
+    check(not errors and len(ids) == 24, f'并发提交全部成功（{len(ids)}条，错误 {errors[:1]}）')
+    with app.app_context():
+        add_past_ratings()
+        check(rollup_rows() == raw_rows(), '并发提交后汇总表与评级表分组统计一致')
+    client = app.test_client()
+    check_statistics(client, '提交后')
+
+    client.delete(f'/api/rating/{ids[0]}', json={'reason': '测试'})
+    client.delete(f'/api/rating/{ids[0]}', json={'reason': '重复标记'})
+    client.delete(f'/api/rating/{ids[1]}', json={'reason': '测试'})
+    client.delete(f'/api/rating/{ids[2]}', json={'reason': '测试'})
+    with app.app_context():
+        check(rollup_rows() == raw_rows(), '标记删除（含重复标记）后汇总表一致')
+    client.post(f'/api/admin/reject-delete/{ids[1]}', json={'reason': '测试'})
+    client.post(f'/api/admin/approve-delete/{ids[2]}', json={})
+    with app.app_context():
+        check(rollup_rows() == raw_rows(), '拒绝删除、审批通过删除后汇总表一致')
+    check_statistics(client, '删除审批后')
+
+    with app.app_context():
+        incremental = rollup_rows()
+        backfill_rating_rollup()
+        check(rollup_rows() == incremental, '由评级表重建的汇总表与增量维护的结果相同')
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 评级每日汇总检查全部通过")
+
+
+if __name__ == '__main__':
+    main()
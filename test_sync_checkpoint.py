@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享变更日志检查点回归测试
+检查保存的评级变更检查点在“重启”后能恢复企业热度和部门使用次数，且只回放检查点之后的评级变更，
+恢复结果与从头回放一致；版本不比已有检查点新时不覆盖；
+共享名录变更日志压缩后只保留每家企业最新的变更，回放结果不变。
+
+用法:
+    python test_sync_checkpoint.py
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+# 须在导入app之前指定数据库，避免写入开发数据库
+_workdir = tempfile.mkdtemp(prefix='test_sync_checkpoint_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ['EXPORT_SPOOL_DIR'] = os.path.join(_workdir, 'exports')
+os.environ['CATALOG_SYNC_INTERVAL'] = '0'
+
+import app as app_module
+from app import (app, db, CompanyCatalogChange, RatingChange, SyncCheckpoint, sync_company_catalog,
+                 _save_sync_checkpoint, _compact_catalog_changes)
+from company_autocomplete_service import autocomplete_service, CompanyAutocompleteService
+from department_autocomplete_service import department_service
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def submit(client, company, department):
+    payload = {
+        'customer_name': company, 'customer_type': 'direct', 'submitter_name': '测试',
+        'submitter_department': department, 'industry_score': 10, 'business_type_score': 10,
+        'influence_score': 10, 'logistics_scale_score': 10, 'credit_score': 10, 'profit_estimate_score': 10
+    }
+    return client.post('/api/calculate', json=payload).get_json()['data']['id']
+
+
+def snapshot():
+    """当前的企业热度和部门使用次数（热度随时间连续衰减，比较时允许微小误差）"""
+    companies = ('华为技术有限公司', '小米科技有限责任公司', '腾讯科技(深圳)有限公司')
+    return {company: autocomplete_service.popularity(company) for company in companies}, department_service.counts()
+
+
+def same_state(actual, expected):
+    popularity, departments = actual
+    return departments == expected[1] and all(
+        abs(popularity[company] - value) <= 1e-6 * max(value, 1.0) for company, value in expected[0].items()
+    )
+
+
+def restart():
+    """模拟副本重启：清空内存中的热度、部门使用次数和评级变更版本后重新同步，返回回放的记录数"""
+    app_module._catalog_streams['popularity'].update(version=0, gap_since=None)
+    app_module._catalog_sync_state['checkpoint_restored'] = False
+    autocomplete_service.restore_popularity(0.0, {})
+    department_service.reset({})
+    with app.app_context():
+        return sync_company_catalog(force=True, allow_gaps=True)
+
+
+def test_rating_checkpoint(client):
+    ids = [submit(client, company, department) for company, department in (
+        ('华为技术有限公司', '市场部'), ('华为技术有限公司', '销售部'), ('小米科技有限责任公司', '市场部'),
+        ('腾讯科技(深圳)有限公司', '研发部'))]
+    client.delete(f'/api/rating/{ids[3]}', json={'reason': '测试'})
+
+    with app.app_context():
+        check(_save_sync_checkpoint(), '保存检查点')
+        checkpoint_version = db.session.get(SyncCheckpoint, 'popularity').version
+        latest = db.session.query(db.func.max(RatingChange.id)).scalar()
+        check(checkpoint_version == latest, f'检查点版本为已应用的最新变更（{checkpoint_version}/{latest}）')
+        check(not _save_sync_checkpoint(), '版本未变化时不重复保存')
+
+    # 检查点之后的新评级
+    submit(client, '华为技术有限公司', '研发部')
+    expected = snapshot()
+
+    applied = restart()
+    check(applied == 1, f'重启后只回放检查点之后的评级变更（{applied}条）')
+    check(same_state(snapshot(), expected), f'从检查点恢复的热度和部门使用次数与重启前一致（{snapshot()}）')
+
+    # 没有检查点时从头回放，结果相同
+    with app.app_context():
+        SyncCheckpoint.query.delete()
+        db.session.commit()
+    applied = restart()
+    check(applied == len(ids) + 2, f'没有检查点时回放全部评级变更（{applied}条）')
+    check(same_state(snapshot(), expected), '从头回放的结果与从检查点恢复一致')
+
+    # 较旧的版本不覆盖已有检查点
+    with app.app_context():
+        check(_save_sync_checkpoint(), '重新保存检查点')
+        stream = app_module._catalog_streams['popularity']
+        current = stream['version']
+        stream['version'] = current - 1
+        check(not _save_sync_checkpoint(), '版本比已有检查点旧时不覆盖')
+        stream['version'] = current
+        check(db.session.get(SyncCheckpoint, 'popularity').version == current, '检查点版本保持最新')
+
+
+def test_catalog_compaction():
+    old = datetime.utcnow() - timedelta(seconds=app_module.CATALOG_COMPACT_AGE * 2)
+    changes = [
+        ('add', '压缩测试一有限公司', old), ('remove', '压缩测试一有限公司', old), ('add', '压缩测试一有限公司', old),
+        ('add', '压缩测试二有限公司', old), ('remove', '压缩测试二有限公司', old),
+        # 近期的变更暂不压缩
+        ('add', '压缩测试三有限公司', datetime.utcnow()), ('remove', '压缩测试三有限公司', datetime.utcnow()),
+    ]
+    with app.app_context():
+        db.session.add_all(CompanyCatalogChange(action=action, company_name=name, created_at=created_at)
+                           for action, name, created_at in changes)
+        db.session.commit()
+        sync_company_catalog(force=True)
+        removed = _compact_catalog_changes()
+        check(removed == 3, f'删除被后续变更取代的旧记录（{removed}条）')
+        rows = CompanyCatalogChange.query.order_by(CompanyCatalogChange.id).all()
+
+    names = {name for _, name, _ in changes}
+    replayed = CompanyAutocompleteService(catalogue_path=None)
+    replayed.apply_changes([('-' if row.action == 'remove' else '+', row.company_name) for row in rows])
+    check(all(replayed.has_company(name) == autocomplete_service.has_company(name) for name in names),
+          '压缩后的变更日志回放结果与压缩前一致')
+
+
+def main():
+    client = app.test_client()
+    test_rating_checkpoint(client)
+    test_catalog_compaction()
+
+    if failures:
+        print(f"❌ {len(failures)} 项检查未通过")
+        sys.exit(1)
+    print("✅ 变更日志检查点检查全部通过")
+
+
+if __name__ == '__main__':
+    main()